@@ -15,6 +15,9 @@
 
 from __future__ import print_function
 
+import base64
+import gzip
+import hashlib
 import os
 import json
 from pathlib import Path
@@ -31,6 +34,28 @@ input_var = "PAPERMILL_INPUT"
 output_var = "PAPERMILL_OUTPUT"
 params_var = "PAPERMILL_PARAMS"
 
+# Post-processing of the output notebook, set by the job's environment (see build_processing_args).
+# If the output notebook's name ends in ".gz", it is written gzip compressed.
+# Rich outputs larger than this many bytes are moved out of the notebook into files beside it.
+externalize_var = "PAPERMILL_OUTPUT_EXTERNALIZE"
+# If set, a JSON summary of the run is written beside the notebook.
+summary_var = "PAPERMILL_OUTPUT_SUMMARY"
+
+# Outputs stored base64 encoded in the notebook, which are decoded when they are moved out.
+BINARY_MIME_TYPES = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "application/pdf": ".pdf",
+}
+TEXT_MIME_TYPES = {
+    "text/html": ".html",
+    "image/svg+xml": ".svg",
+    "text/latex": ".tex",
+    "text/markdown": ".md",
+    "application/javascript": ".js",
+}
+
 ## Local testing -
 
 
@@ -45,7 +70,202 @@ PAPERMILL_PARAMS = {
 ROOT_PATH = Path(__file__).parent
 
 
+def load_params(params_path):
+    """Download a parameter file from S3 and return its contents.
+
+    Files ending in ".gz" or ".zst" are decompressed with gzip or zstd first.
+    """
+    params_file = os.path.basename(params_path)
+
+    print("Downloading params file {}".format(params_path))
+    o = urlparse(params_path)
+    bucket = o.netloc
+    key = o.path[1:]
+
+    s3 = boto3.resource("s3")
+    local_path = "/tmp/" + params_file
+    try:
+        s3.Bucket(bucket).download_file(key, local_path)
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] == "404":
+            print("The params {} does not exist.".format(params_path))
+        raise
+    print("Download complete")
+
+    with open(local_path, "rb") as f:
+        data = f.read()
+    if params_file.endswith(".gz"):
+        data = gzip.decompress(data)
+    elif params_file.endswith(".zst"):
+        import zstandard
+
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return json.loads(data)
+
+
+def clean_params(params):
+    """Return a copy of the parameters that is safe to print, with the authorization token masked"""
+    params_clean = dict(params)
+    if params_clean.get("authorizationToken"):
+        params_clean["authorizationToken"] = "*" * len(
+            params_clean["authorizationToken"]
+        )
+    return params_clean
+
+
+def output_stem(output_notebook):
+    """The output notebook's path without the ".ipynb" or ".ipynb.gz" extension"""
+    stem = output_notebook
+    for ext in [".gz", ".ipynb"]:
+        if stem.endswith(ext):
+            stem = stem[: -len(ext)]
+    return stem
+
+
+def externalize_outputs(nb, output_notebook, max_bytes):
+    """Move rich outputs (images, HTML and so on) larger than `max_bytes` out of the notebook, in place.
+
+    Each one is written to "<notebook>.outputs/<sha256><ext>" beside the output notebook, so SageMaker uploads
+    it with the notebook and identical outputs are only stored once. The output keeps a text/plain
+    placeholder and records where its data went in its metadata under "sagemaker_run_notebook". The widget
+    state in the notebook's metadata is moved out the same way.
+
+    Returns:
+      The number of outputs moved.
+    """
+    output_dir = os.path.dirname(output_notebook)
+    outputs_dir = os.path.basename(output_stem(output_notebook)) + ".outputs"
+
+    def store(data, ext):
+        name = hashlib.sha256(data).hexdigest()[:32] + ext
+        path = os.path.join(output_dir, outputs_dir, name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        return outputs_dir + "/" + name
+
+    moved = 0
+    for cell in nb.get("cells", []):
+        for output in cell.get("outputs", []):
+            data = output.get("data", {})
+            for mime in list(data):
+                if mime == "text/plain":
+                    continue
+                value = data[mime]
+                if isinstance(value, list):
+                    value = "".join(value)
+                if mime in BINARY_MIME_TYPES:
+                    # base64 is a third larger than the data it encodes
+                    if len(value) * 3 // 4 <= max_bytes:
+                        continue
+                    encoded = base64.b64decode(value)
+                    ext = BINARY_MIME_TYPES[mime]
+                else:
+                    if not isinstance(value, str):
+                        value = json.dumps(value)
+                    encoded = value.encode("utf-8")
+                    ext = TEXT_MIME_TYPES.get(mime, ".json")
+                size = len(encoded)
+                if size <= max_bytes:
+                    continue
+                path = store(encoded, ext)
+                del data[mime]
+                data.setdefault(
+                    "text/plain",
+                    "[{} output of {} bytes in {}]".format(mime, size, path),
+                )
+                metadata = output.setdefault("metadata", {})
+                metadata.setdefault("sagemaker_run_notebook", {}).setdefault(
+                    "external", {}
+                )[mime] = path
+                moved += 1
+
+    metadata = nb.setdefault("metadata", {})
+    widgets = metadata.get("widgets")
+    if widgets:
+        value = json.dumps(widgets).encode("utf-8")
+        if len(value) > max_bytes:
+            del metadata["widgets"]
+            metadata.setdefault("sagemaker_run_notebook", {})["widgets"] = store(
+                value, ".json"
+            )
+            moved += 1
+    if moved:
+        metadata.setdefault("sagemaker_run_notebook", {})["external_outputs"] = moved
+    return moved
+
+
+def run_summary(nb, status, error=None):
+    """Return a compact description of a run from the papermill metadata of its output notebook: the status,
+    the time each code cell took and the parameters the notebook ran with"""
+    papermill_metadata = nb.get("metadata", {}).get("papermill", {})
+    cells = []
+    for i, cell in enumerate(nb.get("cells", [])):
+        if cell.get("cell_type") != "code":
+            continue
+        cell_metadata = cell.get("metadata", {}).get("papermill", {})
+        cells.append(
+            {
+                "index": i,
+                "execution_count": cell.get("execution_count"),
+                "status": cell_metadata.get("status"),
+                "start": cell_metadata.get("start_time"),
+                "end": cell_metadata.get("end_time"),
+                "duration": cell_metadata.get("duration"),
+                "exception": cell_metadata.get("exception", False),
+            }
+        )
+    return {
+        "status": status,
+        "error": error,
+        "start": papermill_metadata.get("start_time"),
+        "end": papermill_metadata.get("end_time"),
+        "duration": papermill_metadata.get("duration"),
+        "parameters": clean_params(papermill_metadata.get("parameters", {})),
+        "cells": cells,
+    }
+
+
+def process_output(papermill_output, output_notebook, status, error=None):
+    """Post-process the notebook papermill wrote to `papermill_output` into `output_notebook`.
+
+    Depending on the job's environment, this moves large outputs out of the notebook (see
+    :meth:`externalize_outputs`), writes "<notebook>.summary.json" and gzip compresses the notebook.
+    """
+    max_bytes = os.getenv(externalize_var)
+    summary = os.getenv(summary_var)
+    if not max_bytes and not summary and papermill_output == output_notebook:
+        return
+
+    with open(papermill_output, "rb") as f:
+        nb = json.load(f)
+
+    moved = 0
+    if max_bytes:
+        moved = externalize_outputs(nb, output_notebook, int(max_bytes))
+        if moved:
+            print("Moved {} outputs out of the notebook".format(moved))
+
+    if summary:
+        summary_file = output_stem(output_notebook) + ".summary.json"
+        with open(summary_file, "w") as f:
+            json.dump(run_summary(nb, status, error), f, separators=(",", ":"))
+        print("Summary was written to {}".format(summary_file))
+
+    if papermill_output != output_notebook:
+        with gzip.open(output_notebook, "wt", encoding="utf-8") as f:
+            json.dump(nb, f, indent=1, ensure_ascii=False)
+            f.write("\n")
+        os.remove(papermill_output)
+    elif moved:
+        with open(output_notebook, "w", encoding="utf-8") as f:
+            json.dump(nb, f, indent=1, ensure_ascii=False)
+            f.write("\n")
+
+
 def run_notebook():
+    papermill_output = None
     try:
         if not os.getenv(input_var):
             from dotenv import load_dotenv
@@ -54,6 +274,10 @@ def run_notebook():
 
         notebook_path = os.environ[input_var]
         output_notebook = os.environ[output_var]
+        # papermill writes the notebook uncompressed, then process_output compresses it
+        papermill_output = output_notebook
+        if output_notebook.endswith(".gz"):
+            papermill_output = output_notebook[: -len(".gz")]
 
         if not os.getenv(params_var):
             params = PAPERMILL_PARAMS
@@ -80,44 +304,27 @@ def run_notebook():
                 raise
             print("Download complete")
 
-        if params.get("S3_PATH"):
-            params_path = params.get("S3_PATH")
-            params_file = os.path.basename(params_path)
-
-            print("Downloading params file {}".format(params_path))
-            o = urlparse(params_path)
-            bucket = o.netloc
-            key = o.path[1:]
-
-            s3 = boto3.resource("s3")
-            try:
-                s3.Bucket(bucket).download_file(key, "/tmp/" + params_file)
-                params_dir = "/tmp"
-            except botocore.exceptions.ClientError as e:
-                if e.response["Error"]["Code"] == "404":
-                    print("The params {} does not exist.".format(params_path))
-                raise
-            print("Download complete")
-
-            os.chdir(params_dir)
-            params = json.loads(open(params_file).read())
+        if params.get("S3_PATH") or params.get("S3_BASE_PATH"):
+            # A batch can share one base file of parameters, overlaid with the run's own parameters
+            loaded = {}
+            if params.get("S3_BASE_PATH"):
+                loaded.update(load_params(params["S3_BASE_PATH"]))
+            if params.get("S3_PATH"):
+                loaded.update(load_params(params["S3_PATH"]))
+            params = loaded
 
         os.chdir(notebook_dir)
 
         print("Executing {} with output to {}".format(notebook_file, output_notebook))
 
-        params_clean = params.copy()
-        if params_clean.get("authorizationToken"):
-            params_clean["authorizationToken"] = "*" * len(
-                params_clean["authorizationToken"]
-            )
-        print(f"Notebook params = {json.dumps(params_clean, indent=2)}")
+        print(f"Notebook params = {json.dumps(clean_params(params), indent=2)}")
         print(params)
 
         papermill.execute_notebook(
-            notebook_file, output_notebook, params, kernel_name="python3"
+            notebook_file, papermill_output, params, kernel_name="python3"
         )
         print("Execution complete")
+        process_output(papermill_output, output_notebook, "Completed")
 
     except Exception as e:
 
@@ -129,6 +336,13 @@ def run_notebook():
         trc_data = trc.splitlines()
         print(error_message)
 
+        # papermill writes the notebook up to the failing cell, so process that too
+        if papermill_output and os.path.exists(papermill_output):
+            try:
+                process_output(papermill_output, output_notebook, "Failed", str(e))
+            except Exception as pe:
+                print(f"Error processing the output notebook: {pe}")
+
         # Write out an error file. This will be returned as the ExitMessage in the DescribeProcessingJob result.
         if not os.getenv(params_var):
             FPATH = ROOT_PATH / "error"
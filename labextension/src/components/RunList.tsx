@@ -21,7 +21,7 @@ import { ServerConnection } from '@jupyterlab/services';
 import { URLExt } from '@jupyterlab/coreutils';
 
 import { RunsModel, RunsUpdate } from '../models/RunsModel';
-import { Run, OutputNotebook, ErrorResponse } from '../server';
+import { Run, ErrorResponse } from '../server';
 import { SimpleTable, SimpleTablePage } from './SimpleTable';
 import { tableLinkClass, tableEmptyClass } from '../style/tables';
 import { openReadonlyNotebook } from '../widgets/ReadOnlyNotebook';
@@ -37,7 +37,8 @@ function openResult(jobName: string, app: JupyterFrontEnd, rendermime: IRenderMi
   return async () => {
     const settings = ServerConnection.makeSettings();
     const response = await ServerConnection.makeRequest(
-      URLExt.join(settings.baseUrl, 'sagemaker-scheduler', 'output', jobName),
+      URLExt.join(settings.baseUrl, 'sagemaker-scheduler', 'output', jobName) +
+        URLExt.objectToQueryString({ format: 'raw' }),
       { method: 'GET' },
       settings,
     );
@@ -57,12 +58,13 @@ function openResult(jobName: string, app: JupyterFrontEnd, rendermime: IRenderMi
       });
       return;
     }
-    const info = (await response.json()) as OutputNotebook;
-    const match = basenamePattern.exec(info.output_object);
-    const outputName = match[1];
+    // The raw notebook, with its S3 location in a header, saves encoding it as a string inside JSON
+    const match = basenamePattern.exec(response.headers.get('X-Output-Object'));
+    // Notebooks stored compressed arrive decompressed, so drop the ".gz"
+    const outputName = match[1].replace(/\.gz$/, '');
     const document = {
       name: outputName,
-      content: JSON.parse(info.data),
+      content: await response.json(),
     };
     openReadonlyNotebook(app, rendermime, document, outputName, jobName);
   };
@@ -105,6 +107,7 @@ export interface RunListProps {
 interface RunListState {
   runs: Run[];
   error: string;
+  more: boolean;
 }
 
 const Headers = ['Rule', 'Notebook', 'Parameters', 'Status', 'Start', 'Elapsed', '', ''];
@@ -112,7 +115,7 @@ const Headers = ['Rule', 'Notebook', 'Parameters', 'Status', 'Start', 'Elapsed',
 export class RunList extends React.Component<RunListProps, RunListState> {
   constructor(props: RunListProps) {
     super(props);
-    this.state = { runs: props.model.runs, error: null };
+    this.state = { runs: props.model.runs, error: null, more: props.model.more };
     this._app = props.app;
     this._rendermime = props.rendermime;
 
@@ -120,7 +123,7 @@ export class RunList extends React.Component<RunListProps, RunListState> {
   }
 
   private onRunsChanged(_: RunsModel, runInfo: RunsUpdate): void {
-    this.setState({ runs: runInfo.runs, error: runInfo.error });
+    this.setState({ runs: runInfo.runs, error: runInfo.error, more: !!runInfo.more });
   }
 
   componentWillUnmount(): void {
@@ -186,7 +189,16 @@ export class RunList extends React.Component<RunListProps, RunListState> {
       if (rows.length === 0) {
         content = <div className={tableEmptyClass}>No notebooks have been run</div>;
       } else {
-        content = <SimpleTable headings={Headers} rows={rows} />;
+        content = (
+          <>
+            <SimpleTable headings={Headers} rows={rows} />
+            {this.state.more && (
+              <a onClick={() => this.props.model.loadMore()} className={tableLinkClass}>
+                Load more
+              </a>
+            )}
+          </>
+        );
       }
     } else if (this.state.error) {
       content = <div className={tableEmptyClass}>Error retrieving execution history: {this.state.error}</div>;
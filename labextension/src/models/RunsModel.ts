@@ -19,13 +19,22 @@ import { IDisposable } from '@lumino/disposable';
 import { Poll } from '@lumino/polling';
 import { ISignal, Signal } from '@lumino/signaling';
 
-import { ListRunsResponse, Run, ErrorResponse } from '../server';
+import { ListRunsResponse, Run, RunsStreamEvent, ErrorResponse } from '../server';
 
 export interface RunsUpdate {
   runs: Run[] | null;
   error: string;
+  more?: boolean;
 }
 
+// The number of runs to fetch at first and with each loadMore
+const PAGE_SIZE = 20;
+
+/**
+ * The runs shown in the panel. While the panel is active, the model follows the server's stream of run
+ * changes (server-sent events) and only polls if the stream isn't available. Polls ask for the changes
+ * since the last response, and older runs are fetched a page at a time with loadMore.
+ */
 export class RunsModel implements IDisposable {
   constructor() {
     this._active = false;
@@ -34,7 +43,7 @@ export class RunsModel implements IDisposable {
     const interval = 10 * 1000; // TODO: make this a setting
 
     const poll = new Poll({
-      factory: () => this.refresh(),
+      factory: () => (this._stream ? Promise.resolve() : this.refresh()),
       frequency: {
         interval: interval,
         backoff: true,
@@ -48,51 +57,174 @@ export class RunsModel implements IDisposable {
   setActive(active: boolean): void {
     this._active = active;
     if (active) {
-      this.refresh();
+      if (!this.openStream()) {
+        this.refresh();
+      }
+    } else {
+      this.closeStream();
     }
   }
 
-  async refresh(): Promise<void> {
-    this.getRuns().then((result: RunsUpdate) => {
-      if (result) {
-        this._runs = result.runs;
-        this._runsChanged.emit(result);
-      }
+  /**
+   * Start following the runs stream. Returns false if the stream can't be used, so the model should poll.
+   */
+  private openStream(): boolean {
+    if (this._stream) {
+      return true;
+    }
+    if (this._streamFailed || typeof EventSource === 'undefined') {
+      return false;
+    }
+    const settings = ServerConnection.makeSettings();
+    const query: { [key: string]: string } = { limit: String(PAGE_SIZE) };
+    if (settings.token) {
+      query.token = settings.token;
+    }
+    const url =
+      URLExt.join(settings.baseUrl, 'sagemaker-scheduler', 'runs', 'stream') + URLExt.objectToQueryString(query);
+    const stream = new EventSource(url, { withCredentials: true });
+    stream.addEventListener('reset', (event: Event) => {
+      const data = JSON.parse((event as MessageEvent).data) as RunsStreamEvent;
+      this._runs = data.runs;
+      this._more = !!data.more;
+      this.emitRuns(null);
+    });
+    stream.addEventListener('delta', (event: Event) => {
+      this.applyDelta(JSON.parse((event as MessageEvent).data) as RunsStreamEvent);
+      this.emitRuns(null);
+    });
+    stream.addEventListener('failure', (event: Event) => {
+      const data = JSON.parse((event as MessageEvent).data) as { message: string };
+      this.emitRuns(data.message);
     });
+    stream.onerror = (): void => {
+      // The browser reconnects by itself after network errors. If the stream is closed, the server
+      // refused it, so fall back to polling.
+      if (stream.readyState === EventSource.CLOSED) {
+        this._stream = null;
+        this._streamFailed = true;
+        this.refresh();
+      }
+    };
+    this._stream = stream;
+    return true;
+  }
+
+  private closeStream(): void {
+    if (this._stream) {
+      this._stream.close();
+      this._stream = null;
+    }
   }
 
-  private async getRuns(): Promise<RunsUpdate> {
-    if (this._active && !this._refreshing) {
-      this._refreshing = true;
-      try {
-        const settings = ServerConnection.makeSettings();
-        const response = await ServerConnection.makeRequest(
-          URLExt.join(settings.baseUrl, 'sagemaker-scheduler', 'runs'),
-          { method: 'GET' },
-          settings,
-        );
-
-        if (!response.ok) {
-          const error = (await response.json()) as ErrorResponse;
-          if (error.error) {
-            return { runs: null, error: error.error.message };
-          } else {
-            return { runs: null, error: JSON.stringify(error) };
-          }
+  /**
+   * Apply the new, changed and removed runs from a "delta" event. The runs named in "added" are the newest
+   * and go at the top. Changes to other runs the model doesn't hold are older than the loaded pages, so
+   * they are left for loadMore.
+   */
+  private applyDelta(delta: RunsStreamEvent): void {
+    const removed = new Set(delta.removed || []);
+    const changed = new Map(delta.runs.map((run): [string, Run] => [run.Job, run]));
+    const runs = (this._runs || [])
+      .filter((run) => !removed.has(run.Job))
+      .map((run) => {
+        const update = changed.get(run.Job);
+        if (update) {
+          changed.delete(run.Job);
+          return update;
         }
+        return run;
+      });
+    const added = delta.added ? new Set(delta.added) : null;
+    const newest = Array.from(changed.values()).filter((run) => !added || added.has(run.Job));
+    this._runs = newest.concat(runs);
+  }
+
+  private emitRuns(error: string): void {
+    this._runsChanged.emit({ runs: this._runs, error: error, more: this._more });
+  }
 
-        const data = (await response.json()) as ListRunsResponse;
-        return { runs: data.runs, error: null };
-      } finally {
-        this._refreshing = false;
+  /**
+   * Poll for the runs. After the first response, this only asks for the changes since its version, and
+   * an unchanged list costs a 304 response.
+   */
+  async refresh(): Promise<void> {
+    if (!this._active || this._refreshing) {
+      return;
+    }
+    this._refreshing = true;
+    try {
+      const query: { [key: string]: string } = {};
+      if (this._runs && this._version !== null) {
+        query.since = String(this._version);
+      } else {
+        query.limit = String(PAGE_SIZE);
+      }
+      const headers: { [key: string]: string } = {};
+      if (this._etag) {
+        headers['If-None-Match'] = this._etag;
+      }
+      const response = await this.fetchRuns(query, headers);
+      if (response.status === 304) {
+        return;
+      }
+      if (!response.ok) {
+        this._runsChanged.emit({ runs: null, error: await errorMessage(response) });
+        return;
       }
+
+      const data = (await response.json()) as ListRunsResponse;
+      if (query.since === undefined || data.reset) {
+        this._runs = data.runs;
+        this._more = !!data.more;
+      } else {
+        this.applyDelta({ version: data.version, runs: data.runs, added: data.added, removed: data.removed });
+      }
+      this._version = data.version === undefined ? null : data.version;
+      this._etag = response.headers.get('ETag');
+      this.emitRuns(null);
+    } finally {
+      this._refreshing = false;
+    }
+  }
+
+  /**
+   * Fetch the next page of older runs and add them to the end of the list.
+   */
+  async loadMore(): Promise<void> {
+    const offset = this._runs ? this._runs.length : 0;
+    const response = await this.fetchRuns({ offset: String(offset), limit: String(PAGE_SIZE) }, {});
+    if (!response.ok) {
+      this.emitRuns(await errorMessage(response));
+      return;
     }
+    const data = (await response.json()) as ListRunsResponse;
+    const known = new Set((this._runs || []).map((run) => run.Job));
+    this._runs = (this._runs || []).concat(data.runs.filter((run) => !known.has(run.Job)));
+    this._more = !!data.more;
+    this.emitRuns(null);
+  }
+
+  private fetchRuns(query: { [key: string]: string }, headers: { [key: string]: string }): Promise<Response> {
+    const settings = ServerConnection.makeSettings();
+    return ServerConnection.makeRequest(
+      URLExt.join(settings.baseUrl, 'sagemaker-scheduler', 'runs') + URLExt.objectToQueryString(query),
+      { method: 'GET', headers: headers },
+      settings,
+    );
   }
 
   get runs(): Run[] {
     return this._runs;
   }
 
+  /**
+   * Whether there may be older runs to fetch with loadMore.
+   */
+  get more(): boolean {
+    return this._more;
+  }
+
   /**
    * A signal emitted when the current list of runs changes.
    */
@@ -115,6 +247,7 @@ export class RunsModel implements IDisposable {
       return;
     }
     this._isDisposed = true;
+    this.closeStream();
     if (this._poll) {
       this._poll.dispose();
     }
@@ -122,10 +255,20 @@ export class RunsModel implements IDisposable {
   }
 
   private _runs: Run[];
+  private _more = false;
+  private _version: number = null;
+  private _etag: string = null;
   private _isDisposed = false;
   private _runsChanged = new Signal<RunsModel, RunsUpdate>(this);
 
   private _poll: Poll;
+  private _stream: EventSource = null;
+  private _streamFailed = false;
   private _refreshing: boolean;
   private _active: boolean;
 }
+
+async function errorMessage(response: Response): Promise<string> {
+  const error = (await response.json()) as ErrorResponse;
+  return error.error ? error.error.message : JSON.stringify(error);
+}
@@ -46,6 +46,25 @@ export interface ErrorResponse {
 
 export interface ListRunsResponse {
   runs: Run[];
+  version?: number;
+  total?: number;
+  offset?: number;
+  limit?: number | null;
+  added?: string[];
+  removed?: string[];
+  reset?: boolean;
+  more?: boolean;
+}
+
+/**
+ * The data of the "reset" and "delta" events from the runs stream
+ */
+export interface RunsStreamEvent {
+  version: number;
+  runs: Run[];
+  added?: string[];
+  removed?: string[];
+  more?: boolean;
 }
 
 export interface RunResponse {
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+Measure the per-invocation latency of the RunNotebook Lambda handler against a local stub of the
+SageMaker and STS endpoints, with and without the warm container state (session, clients and account ID).
+
+    python lambda_test/bench_lambda.py -n 200
+"""
+
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ACCOUNT = "123456789012"
+REGION = "ap-southeast-2"
+
+STS_RESPONSE = f"""<GetCallerIdentityResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
+  <GetCallerIdentityResult>
+    <Arn>arn:aws:iam::{ACCOUNT}:user/bench</Arn>
+    <UserId>AIDABENCH</UserId>
+    <Account>{ACCOUNT}</Account>
+  </GetCallerIdentityResult>
+  <ResponseMetadata><RequestId>bench</RequestId></ResponseMetadata>
+</GetCallerIdentityResponse>"""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers CreateProcessingJob (JSON protocol) and GetCallerIdentity (query protocol)"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        target = self.headers.get("X-Amz-Target", "")
+        if target == "SageMaker.CreateProcessingJob":
+            job_name = json.loads(body)["ProcessingJobName"]
+            arn = f"arn:aws:sagemaker:{REGION}:{ACCOUNT}:processing-job/{job_name}"
+            self.reply(
+                "application/x-amz-json-1.1", json.dumps({"ProcessingJobArn": arn})
+            )
+        elif b"Action=GetCallerIdentity" in body:
+            self.reply("text/xml", STS_RESPONSE)
+        else:
+            self.send_error(400, f"Unexpected request {target or body[:50]}")
+
+    def reply(self, content_type, text):
+        data = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["AWS_ENDPOINT_URL_SAGEMAKER"] = endpoint
+    os.environ["AWS_ENDPOINT_URL_STS"] = endpoint
+    os.environ["AWS_DEFAULT_REGION"] = REGION
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    return server
+
+
+def event(i):
+    return {
+        "image": "sagemaker-run-notebook",
+        "input_path": "s3://bench-bucket/papermill_input/notebook.ipynb",
+        "output_prefix": "s3://bench-bucket/papermill_output",
+        "notebook": "notebook.ipynb",
+        "parameters": {"job_id": f"workflow-bench-{i}", "n": i},
+        "role": "BasicExecuteNotebookRole-ap-southeast-2",
+        "instance_type": "ml.m5.large",
+    }
+
+
+def bench(lambda_function, n, warm):
+    timings = []
+    lambda_function.reset_state()
+    for i in range(n):
+        if not warm:
+            lambda_function.reset_state()
+        start = time.perf_counter()
+        lambda_function.lambda_handler(event(i), None)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(
+        f"{name:6} n={len(timings):<5} mean={statistics.mean(timings):8.2f}ms "
+        f"p50={statistics.median(timings):8.2f}ms p95={p95:8.2f}ms"
+    )
+
+
+def main(args):
+    server = start_stub()
+    # Import after the environment is set up so the module sees the stub endpoints
+    from sagemaker_run_notebook import lambda_function
+
+    try:
+        bench(lambda_function, 5, warm=True)  # let imports and connection pools settle
+        report("cold", bench(lambda_function, args.n, warm=False))
+        report("warm", bench(lambda_function, args.n, warm=True))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n", type=int, default=100, help="Number of invocations to time"
+    )
+    args = parser.parse_args()
+    main(args)
@@ -10,6 +10,7 @@ import argparse
 from multiprocessing import Event
 import os
 import sagemaker_run_notebook as run
+from sagemaker_run_notebook.utils import get_account
 from relevanceai import Client
 import json
 
@@ -130,7 +131,7 @@ def handler(event, context={}):
     WORKFLOW_SUFFIX = {w["_id"]: w["suffix"] for w in WORKFLOWS if w.get("suffix")}
 
     WORKFLOW_NAME = body.get("workflow_name")
-    account_id = boto3.client("sts").get_caller_identity().get("Account")
+    account_id = get_account(boto3.session.Session(region_name=region))
 
     NOTEBOOK_PATH = f"s3://relevanceai-workflows-{account_id}-{region}/{environment}/{WORKFLOW_SUFFIX[WORKFLOW_NAME]}"
 
@@ -164,12 +165,16 @@ def handler(event, context={}):
 
             ## ProcessingName Cleaning
             dataset_id = body["dataset_id"]
-            body[
-                "job_id"
-            ] = f"workflow-{environment}-{dataset_id}-{int(datetime.now().timestamp())}"
-            JOB_ID_L = body["job_id"].replace("_", "-").split("-")
-            WORKFLOW_DATASET_ID = "-".join(JOB_ID_L[2:-1])[:30]
-            JOB_ID = "-".join([JOB_ID_L[0], WORKFLOW_DATASET_ID, JOB_ID_L[-1]])
+            # Reuse the caller's job_id unchanged on a retry, so the submission is recognized as the same run
+            if body.get("job_id"):
+                JOB_ID = body["job_id"]
+            else:
+                timestamp = int(datetime.now().timestamp())
+                generated = f"workflow-{environment}-{dataset_id}-{timestamp}"
+                JOB_ID_L = generated.replace("_", "-").split("-")
+                WORKFLOW_DATASET_ID = "-".join(JOB_ID_L[2:-1])[:30]
+                JOB_ID = "-".join([JOB_ID_L[0], WORKFLOW_DATASET_ID, JOB_ID_L[-1]])
+                body["job_id"] = JOB_ID
 
             print(f"Invoking Sagemaker processing job {JOB_ID} with {EXECUTION_ROLE}")
             # print(NOTEBOOK_PATH)
@@ -184,6 +189,7 @@ def handler(event, context={}):
                 role=EXECUTION_ROLE,
                 parameters={**{"job_id": JOB_ID}, **params},
                 upload_parameters=True,
+                mode="async",
             )
             if sm_job:
                 response_code = 200
@@ -13,7 +13,12 @@
 
 __all__ = [
     "invoke",
+    "invoke_many",
+    "confirm_run",
     "wait_for_complete",
+    "as_completed",
+    "wait_for_all",
+    "poll_stats",
     "stop_run",
     "list_runs",
     "describe_run",
@@ -25,9 +30,12 @@ __all__ = [
     "describe_schedules",
     "upload_notebook",
     "upload_fileobj",
+    "StreamingUpload",
     "download_notebook",
     "download_all",
+    "download_outputs",
     "InvokeException",
+    "DownloadException",
     "NotebookRunTracker",
 ]
 from sagemaker_run_notebook.run_notebook import (
@@ -39,19 +47,31 @@ from sagemaker_run_notebook.run_notebook import (
     describe_schedules,
     list_schedules,
     invoke,
+    invoke_many,
+    confirm_run,
+    SUBMIT_MODES,
     run_notebook,
     upload_notebook,
     upload_fileobj,
+    StreamingUpload,
     download_notebook,
     download_all,
+    download_outputs,
     wait_for_complete,
     list_runs,
     describe_run,
     describe_runs,
     stop_run,
     InvokeException,
+    DownloadException,
     NotebookRunTracker,
 )
+from sagemaker_run_notebook.waiter import (
+    as_completed,
+    as_completed_async,
+    wait_for_all,
+)
+from sagemaker_run_notebook.polling import poll_stats
 
 from sagemaker_run_notebook.server_extension._version import __version__
 
@@ -19,11 +19,13 @@ import textwrap
 import time
 
 import boto3
+import botocore.exceptions
 
 import sagemaker_run_notebook as run
 import sagemaker_run_notebook.create_infrastructure as infra
 import sagemaker_run_notebook.container_build as container_build
 import sagemaker_run_notebook.emr as emr
+import sagemaker_run_notebook.utils as utils
 
 
 def xform_param(arg):
@@ -65,6 +67,24 @@ def base_extras(extras):
     return proc
 
 
+def load_batch(fname, params):
+    "Read a JSON lines file of parameter dicts, each one layered over the -p parameters"
+    with open(fname, mode="r") as f:
+        return [{**params, **json.loads(line)} for line in f if line.strip()]
+
+
+def output_options(args):
+    """The output post-processing options given on the command line, or None"""
+    options = {}
+    if args.gzip_output:
+        options["gzip"] = True
+    if args.externalize_outputs:
+        options["externalize"] = args.externalize_outputs
+    if args.summary:
+        options["summary"] = True
+    return options or None
+
+
 def run_notebook(args):
     params = process_params(args.p)
     if args.notebook.startswith("s3://"):
@@ -78,6 +98,9 @@ def run_notebook(args):
         extra_fns.append(base_extras(load_extra(args.extra)))
     if args.emr:
         extra_fns.append(emr.add_emr_cluster(args.emr))
+    if args.batch:
+        run_batch(args, params, input_path, notebook, extra_fns)
+        return
     try:
         job_name = run.invoke(
             image=args.image,
@@ -88,8 +111,10 @@ def run_notebook(args):
             role=args.role,
             instance_type=args.instance,
             extra_fns=extra_fns,
+            mode=args.mode,
+            output_options=output_options(args),
         )
-    except run.InvokeException as ie:
+    except (run.InvokeException, botocore.exceptions.ClientError) as ie:
         print(f"Error starting run: {str(ie)}")
         return
     except FileNotFoundError as fe:
@@ -98,6 +123,8 @@ def run_notebook(args):
     print(f"Started processing job {job_name}")
     if args.no_wait:
         return
+    if args.mode == "async":
+        run.confirm_run(job_name)
     status, failure = run.wait_for_complete(job_name)
     print(f"Run finished with status {status}")
     if failure:
@@ -106,6 +133,35 @@ def run_notebook(args):
         run.download_notebook(job_name, args.output_dir)
 
 
+def run_batch(args, params, input_path, notebook, extra_fns):
+    try:
+        batch = load_batch(args.batch, params or {})
+        results = run.invoke_many(
+            batch,
+            image=args.image,
+            input_path=input_path,
+            output_prefix=args.output_prefix,
+            notebook=notebook,
+            role=args.role,
+            instance_type=args.instance,
+            extra_fns=extra_fns,
+            mode=args.mode,
+            max_workers=args.max_workers,
+            output_options=output_options(args),
+        )
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(str(e))
+        return
+    failed = 0
+    for r in results:
+        if r["error"]:
+            failed += 1
+            print(f"Error starting run {r['job_name']}: {r['error']}")
+        else:
+            print(f"Started processing job {r['job_name']}")
+    print(f"Started {len(results) - failed} of {len(results)} runs")
+
+
 def local_notebook(args):
     params = process_params(args.p)
     notebook_dir = os.path.dirname(args.notebook)
@@ -117,16 +173,9 @@ def local_notebook(args):
 
     session = boto3.session.Session()
     region = session.region_name
-    account = session.client("sts").get_caller_identity()["Account"]
-    image = args.image
-    if not image:
-        if not environment:
-            environment = "sandbox"
-        image = f"sagemaker-run-notebook"
-    if "/" not in image:
-        image = f"{account}.dkr.ecr.{region}.amazonaws.com/{image}"
-    if ":" not in image:
-        image = image + f":{environment}-latest"
+    image = utils.resolve_image(
+        args.image or "sagemaker-run-notebook", session, tag="sandbox-latest"
+    )
 
     base_cmd = ["docker", "run", "--rm", "-td" if args.no_wait else "-ti"]
     mnts = [
@@ -178,7 +227,23 @@ def build_output_params(desc):
 
 
 def list_runs(args):
-    runs = run.describe_runs(n=args.max, notebook=args.notebook, rule=args.rule)
+    runs = run.describe_runs(
+        n=args.max,
+        notebook=args.notebook,
+        rule=args.rule,
+        status=args.status,
+        created_after=args.since,
+        full=not args.brief,
+    )
+    if args.brief:
+        print("Date                 Status     Job")
+        for r in runs:
+            print(f"{r['Created']:%Y-%m-%d %H:%M:%S}  {r['Status']:10} {r['Job']}  ")
+            failure = r["Failure"] if r["Status"] == "Failed" else None
+            for l in textwrap.wrap(failure or "", 60):
+                print(f"{'':32}{l}")
+        return
+
     print(
         "Date                 Rule                 Notebook              Parameters           Status     Job"
     )
@@ -337,6 +402,37 @@ def cli_argparser():
         help="Launch the notebook run but don't wait for it to complete",
         action="store_true",
     )
+    run_parser.add_argument(
+        "--mode",
+        help="Start the run through the Lambda function or by calling SageMaker directly (default: lambda)",
+        choices=run.SUBMIT_MODES,
+        default="lambda",
+    )
+    run_parser.add_argument(
+        "--batch",
+        help="A JSON lines file with one dict of parameters per run. Starts one run per line without waiting (default: None)",
+    )
+    run_parser.add_argument(
+        "--max-workers",
+        help="Maximum number of runs to start concurrently with --batch (default: 8)",
+        type=int,
+        default=8,
+    )
+    run_parser.add_argument(
+        "--gzip-output",
+        help="Write the output notebook gzip compressed, as <name>.ipynb.gz",
+        action="store_true",
+    )
+    run_parser.add_argument(
+        "--externalize-outputs",
+        help="Move images and other rich outputs larger than this many bytes out of the output notebook into files beside it (default: None)",
+        type=int,
+    )
+    run_parser.add_argument(
+        "--summary",
+        help="Write a JSON summary of the run (status, cell timings and parameters) beside the output notebook",
+        action="store_true",
+    )
     run_parser.set_defaults(func=run_notebook)
 
     download_parser = subparsers.add_parser(
@@ -376,6 +472,20 @@ def cli_argparser():
     listrun_parser.add_argument(
         "--max", help="Maximum number of runs to show", type=int, default=9999999
     )
+    listrun_parser.add_argument(
+        "--status",
+        help="List only runs with this status",
+        choices=["InProgress", "Completed", "Failed", "Stopping", "Stopped"],
+    )
+    listrun_parser.add_argument(
+        "--since",
+        help="List only runs created after this time (for example 2022-06-01 or 2022-06-01T12:00:00Z)",
+    )
+    listrun_parser.add_argument(
+        "--brief",
+        help="Show only the date, status and job of each run, which doesn't need to describe each job",
+        action="store_true",
+    )
     listrun_parser.set_defaults(func=list_runs)
 
     schedule_parser = subparsers.add_parser(
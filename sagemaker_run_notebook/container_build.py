@@ -25,6 +25,7 @@ import boto3
 import botocore.config
 from botocore.exceptions import ClientError
 
+import sagemaker_run_notebook.polling as polling
 import sagemaker_run_notebook.utils as utils
 
 default_base = "python:3.7-slim-buster"
@@ -35,9 +36,7 @@ def create_project(repo_name, role, zipfile, base_image=default_base):
     client = session.client("codebuild")
 
     region = session.region_name
-    sts = session.client("sts")
-    identity = sts.get_caller_identity()
-    account = identity["Account"]
+    account = utils.get_account(session)
     args = {
         "name": f"create-sagemaker-container-{repo_name}",
         "description": f"Build the container {repo_name} for running notebooks in SageMaker",
@@ -80,9 +79,20 @@ def start_build(repo_name):
     return response["build"]["id"]
 
 
-def wait_for_build(id, poll_seconds=10):
+def wait_for_build(id, poll_seconds=None):
+    """Wait for a CodeBuild build to finish.
+
+    Unless `poll_seconds` is given, polls adaptively based on how long earlier builds of the same project
+    took (see :class:`polling.PollScheduler`).
+    """
     session = boto3.session.Session()
     client = session.client("codebuild")
+    key = "build:{}".format(id.split(":")[0])
+    scheduler = None
+    if poll_seconds is None:
+        scheduler = polling.PollScheduler(
+            expected=polling.expected_duration(key), name="wait_for_build"
+        )
     status = client.batch_get_builds(ids=[id])
     first = True
     while status["builds"][0]["buildStatus"] == "IN_PROGRESS":
@@ -90,9 +100,14 @@ def wait_for_build(id, poll_seconds=10):
             print(".", end="")
             sys.stdout.flush()
         first = False
-        time.sleep(poll_seconds)
+        if scheduler is None:
+            time.sleep(poll_seconds)
+        else:
+            scheduler.sleep()
         status = client.batch_get_builds(ids=[id])
     print()
+    if scheduler is not None:
+        scheduler.finish(key)
     print(f"Build complete, status = {status['builds'][0]['buildStatus']}")
     print(f"Logs at {status['builds'][0]['logs']['deepLink']}")
 
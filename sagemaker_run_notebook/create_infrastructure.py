@@ -18,6 +18,8 @@ from typing_extensions import Literal
 import botocore.exceptions
 import boto3
 
+from sagemaker_run_notebook import polling
+
 cfn_template_file = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), "cloudformation.yml"
 )
@@ -32,9 +34,16 @@ def ensure_session(session=None, region: Literal["ap-southeast-2", "us-east-1"]
     return session
 
 
-def wait_for_infrastructure(stack_id, progress=True, sleep_time=10, session=None):
+def wait_for_infrastructure(stack_id, progress=True, sleep_time=None, session=None):
+    """Wait for a CloudFormation stack operation to finish.
+
+    Unless `sleep_time` is given, polls adaptively based on how long the same operation on the stack took
+    before (see :class:`polling.PollScheduler`).
+    """
     session = ensure_session(session)
     client = session.client("cloudformation")
+    scheduler = None
+    key = None
     done = False
     while not done:
         if progress:
@@ -44,10 +53,20 @@ def wait_for_infrastructure(stack_id, progress=True, sleep_time=10, session=None
         status = desc["StackStatus"]
         if "IN_PROGRESS" not in status:
             done = True
-        else:
+        elif sleep_time is not None:
             time.sleep(sleep_time)
+        else:
+            if scheduler is None:
+                key = "stack:{}:{}".format(desc["StackName"], status.split("_")[0])
+                scheduler = polling.PollScheduler(
+                    expected=polling.expected_duration(key),
+                    name="wait_for_infrastructure",
+                )
+            scheduler.sleep()
     if progress:
         print()
+    if scheduler is not None:
+        scheduler.finish(key)
     return status, desc.get("StackStatusReason")
 
 
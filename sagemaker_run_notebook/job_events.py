@@ -0,0 +1,540 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Learn about processing job status changes from EventBridge instead of polling DescribeProcessingJob.
+
+SageMaker sends a "SageMaker Processing Job State Change" event to EventBridge each time a job changes
+status. :meth:`create_event_topic` sets up, once per account and region, a rule that delivers the events for
+notebook runs to an SNS topic. Each consumer (a Jupyter server, a CLI waiter) subscribes a queue of its own
+to the topic, so every consumer gets every event; consumers sharing one queue would take each other's
+messages. An event source reads the events and publishes them to a :class:`JobEvents`, which wakes anything
+waiting for the job, updates the local description cache and calls its subscribers (such as a
+:class:`run_notebook.NotebookRunTracker`). For example::
+
+    topic_arn = job_events.create_event_topic()
+    events = job_events.JobEvents()
+    source = job_events.SqsEventSource.subscribe(events, topic_arn).start()
+    run.wait_for_complete(job_name, events=events)
+    source.stop()  # deletes the queue
+
+:class:`FileEventSource` reads events that something else (such as a webhook) appends to a file, and
+:class:`ReplayEventSource` publishes a fixed list of events, which stands in for EventBridge in tests.
+"""
+
+import abc
+import datetime
+import json
+import logging
+import threading
+import time
+import uuid
+
+import botocore
+from dateutil.tz import tzlocal
+
+from . import retry
+from .run_cache import run_cache, TERMINAL_STATES
+from .utils import ensure_session
+
+STATE_CHANGE = "SageMaker Processing Job State Change"
+
+EVENT_PATTERN = {
+    "source": ["aws.sagemaker"],
+    "detail-type": [STATE_CHANGE],
+    "detail": {"ProcessingJobName": [{"prefix": "workflow-"}]},
+}
+
+# The default name of the topic and rule made by create_event_topic, and the prefix of the consumers' queues.
+EVENTS_NAME = "RunNotebook-JobEvents"
+
+# How often, in seconds, to describe a job anyway in case its events were lost.
+FALLBACK_INTERVAL = 300
+
+# The fields of DescribeProcessingJob that a description needs (see run_notebook.run_description)
+DESCRIPTION_FIELDS = [
+    "ProcessingJobName",
+    "ProcessingJobStatus",
+    "CreationTime",
+    "Environment",
+    "ProcessingInputs",
+    "ProcessingOutputConfig",
+    "AppSpecification",
+    "ProcessingResources",
+    "RoleArn",
+]
+
+
+def job_event_detail(event):
+    """Return the processing job description from a state change event, or None if it isn't one.
+
+    The event can be a dict or its JSON encoding. Times, which events carry as milliseconds since the
+    epoch, are converted to datetimes like those from DescribeProcessingJob.
+    """
+    if isinstance(event, (str, bytes)):
+        event = json.loads(event)
+    if event.get("detail-type") != STATE_CHANGE:
+        return None
+    detail = dict(event["detail"])
+    for k, v in detail.items():
+        if k.endswith("Time") and isinstance(v, (int, float)):
+            detail[k] = datetime.datetime.fromtimestamp(v / 1000, tz=tzlocal())
+    return detail
+
+
+class JobEvents:
+    """Collects processing job state changes and lets callers wait for them.
+
+    Args:
+        cache (bool): If True, put complete descriptions from the events in the local description cache
+                      (see :mod:`run_cache`) (default: True).
+        fallback_interval (float): How often, in seconds, waiters should check a job themselves in case its
+                                   events were lost (default: FALLBACK_INTERVAL).
+    """
+
+    def __init__(self, cache=True, fallback_interval=FALLBACK_INTERVAL):
+        self.cache = cache
+        self.fallback_interval = fallback_interval
+        self.condition = threading.Condition()
+        self.latest = {}
+        self.subscribers = []
+        self.received = 0
+
+    def publish(self, event):
+        """Record a state change event. Returns the job description from it, or None if it was ignored."""
+        detail = job_event_detail(event)
+        if detail is None:
+            return None
+        if isinstance(event, (str, bytes)):
+            event = json.loads(event)
+        job_name = detail["ProcessingJobName"]
+        with self.condition:
+            previous = self.latest.get(job_name)
+            if (
+                previous is not None
+                and previous["ProcessingJobStatus"] in TERMINAL_STATES
+                and detail["ProcessingJobStatus"] not in TERMINAL_STATES
+            ):
+                # Events can arrive out of order, but a finished job never starts again
+                return None
+            self.latest[job_name] = detail
+            self.received += 1
+            self.condition.notify_all()
+            subscribers = list(self.subscribers)
+
+        store = run_cache() if self.cache else None
+        if store is not None and all(k in detail for k in DESCRIPTION_FIELDS):
+            key = "{}:{}:{}".format(event.get("account"), event.get("region"), job_name)
+            store.put(key, detail)
+
+        for subscriber in subscribers:
+            subscriber(detail)
+        return detail
+
+    def subscribe(self, fn):
+        """Call `fn` with the job description from each state change event, on the thread that publishes it"""
+        with self.condition:
+            self.subscribers.append(fn)
+
+    def unsubscribe(self, fn):
+        with self.condition:
+            self.subscribers.remove(fn)
+
+    def status(self, job_name):
+        """Return the last status heard for the job, or None"""
+        with self.condition:
+            detail = self.latest.get(job_name)
+        return detail and detail["ProcessingJobStatus"]
+
+    def wait(self, job_name, timeout=None, done=lambda status: status != "InProgress"):
+        """Wait until an event shows that the job is done.
+
+        Args:
+            job_name (str): The processing job to wait for (required).
+            timeout (float): The maximum number of seconds to wait, or None to wait forever (default: None).
+            done (function): Decides from the status whether the job is done (default: not "InProgress").
+
+        Returns:
+            The job description from the event, or None if the timeout passed first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                detail = self.latest.get(job_name)
+                if detail is not None and done(detail["ProcessingJobStatus"]):
+                    return detail
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+
+class EventSource(abc.ABC):
+    """Reads state change events from somewhere and publishes them to a :class:`JobEvents`.
+
+    Subclasses implement :meth:`receive`. Call :meth:`poll_once` to read what is waiting, or :meth:`start`
+    to keep reading on a background thread.
+    """
+
+    def __init__(self, events, log=None):
+        self.events = events
+        self.log = log or logging.getLogger(__name__)
+        self.thread = None
+        self.stopping = threading.Event()
+
+    @abc.abstractmethod
+    def receive(self):
+        """Return the events that are waiting, waiting a short while for some to arrive"""
+
+    def poll_once(self):
+        """Publish the events that are waiting and return how many there were"""
+        received = self.receive()
+        for event in received:
+            self.events.publish(event)
+        return len(received)
+
+    def _run(self):
+        delay = 1
+        while not self.stopping.is_set():
+            try:
+                self.poll_once()
+                delay = 1
+            except Exception as e:
+                self.log.warning(f"Error reading job events: {e}")
+                self.stopping.wait(delay)
+                delay = min(60, delay * 2)
+
+    def start(self):
+        """Read events on a background thread until :meth:`stop` is called"""
+        if self.thread is None or not self.thread.is_alive():
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+
+class SqsEventSource(EventSource):
+    """Reads the events delivered to an SQS queue (see :meth:`create_event_queue`). The queue must be this
+    source's own, as each message is only received by one reader.
+
+    Args:
+        events (JobEvents): Where to publish the events (required).
+        queue_url (str): The URL of the queue (required).
+        wait_time (int): How long each receive waits for messages, in seconds, up to 20 (default: 20).
+        session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
+        topic_arn (str): If not None, the topic the queue is subscribed to, and :meth:`stop` deletes the queue
+                         and its subscription (default: None).
+    """
+
+    def __init__(
+        self, events, queue_url, wait_time=20, session=None, log=None, topic_arn=None
+    ):
+        super().__init__(events, log)
+        self.queue_url = queue_url
+        self.wait_time = wait_time
+        self.session = ensure_session(session)
+        self.client = self.session.client("sqs")
+        self.topic_arn = topic_arn
+
+    @classmethod
+    def subscribe(cls, events, topic_arn, session=None, log=None, **kwargs):
+        """Create a queue for this process, subscribe it to the events topic (see :meth:`create_event_topic`)
+        and return a source reading it. Stopping the source deletes the queue."""
+        queue_url = create_event_queue(topic_arn, session=session)
+        return cls(
+            events, queue_url, session=session, log=log, topic_arn=topic_arn, **kwargs
+        )
+
+    def stop(self, timeout=None):
+        super().stop(timeout)
+        if self.topic_arn is not None:
+            delete_event_queue(self.queue_url, self.topic_arn, session=self.session)
+            self.topic_arn = None
+
+    def receive(self):
+        result = self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=10,
+            WaitTimeSeconds=self.wait_time,
+        )
+        messages = result.get("Messages", [])
+        received = []
+        for message in messages:
+            try:
+                received.append(json.loads(message["Body"]))
+            except ValueError:
+                self.log.warning(
+                    f"Ignoring a message that isn't JSON: {message['Body']}"
+                )
+        if messages:
+            # The events are only published after this returns, but a lost event is covered by the
+            # waiters' fallback describes, so there's no need to hold on to the messages.
+            self.client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]}
+                    for i, m in enumerate(messages)
+                ],
+            )
+        return received
+
+
+class FileEventSource(EventSource):
+    """Reads events from a file with one JSON encoded event per line, as they are appended to it.
+
+    Args:
+        events (JobEvents): Where to publish the events (required).
+        path (str): The file to read (required).
+        interval (float): How long to wait for more lines when the end of the file is reached (default: 1).
+    """
+
+    def __init__(self, events, path, interval=1, log=None):
+        super().__init__(events, log)
+        self.path = path
+        self.interval = interval
+        self.position = 0
+
+    def receive(self):
+        try:
+            with open(self.path, "r") as f:
+                f.seek(self.position)
+                lines = []
+                for line in iter(f.readline, ""):
+                    if not line.endswith("\n"):
+                        break  # the rest of the line hasn't been written yet
+                    lines.append(line)
+                    self.position = f.tell()
+        except FileNotFoundError:
+            lines = []
+        received = [json.loads(line) for line in lines if line.strip()]
+        if not received:
+            self.stopping.wait(self.interval)
+        return received
+
+
+class ReplayEventSource(EventSource):
+    """Publishes a fixed list of events, standing in for EventBridge in tests and demos.
+
+    Args:
+        events (JobEvents): Where to publish the events (required).
+        replay (list): The events to publish, in order (required).
+        interval (float): The number of seconds between events when running on a thread (default: 0).
+    """
+
+    def __init__(self, events, replay, interval=0, log=None):
+        super().__init__(events, log)
+        self.replay = list(replay)
+        self.interval = interval
+
+    def receive(self):
+        if not self.replay:
+            self.stopping.set()
+            return []
+        if self.interval:
+            self.stopping.wait(self.interval)
+        return [self.replay.pop(0)]
+
+
+def state_change_event(desc, account="123456789012", region="us-east-1"):
+    """Build the state change event that SageMaker would send for a DescribeProcessingJob result, for replays"""
+    detail = {}
+    for k, v in desc.items():
+        if isinstance(v, datetime.datetime):
+            v = int(v.timestamp() * 1000)
+        detail[k] = v
+    return {
+        "version": "0",
+        "detail-type": STATE_CHANGE,
+        "source": "aws.sagemaker",
+        "account": account,
+        "region": region,
+        "resources": [desc.get("ProcessingJobArn", "")],
+        "detail": detail,
+    }
+
+
+def create_event_topic(topic_name=EVENTS_NAME, rule_name=None, session=None):
+    """Create an SNS topic and an EventBridge rule that sends it the state change events of notebook runs.
+
+    This is done once per account and region; each consumer then subscribes its own queue to the topic (see
+    :meth:`create_event_queue`). Running it again with the same names returns the existing topic.
+
+    Args:
+        topic_name (str): The name of the topic (default: EVENTS_NAME).
+        rule_name (str): The name of the rule (default: the topic name).
+        session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
+
+    Returns:
+        The ARN of the topic.
+    """
+    session = ensure_session(session)
+    rule_name = rule_name or topic_name
+    sns = retry.client(session, "sns")
+    events = retry.client(session, "events")
+
+    topic_arn = retry.call("CreateTopic", sns.create_topic, Name=topic_name)["TopicArn"]
+    rule_arn = retry.call(
+        "PutRule",
+        events.put_rule,
+        Name=rule_name,
+        EventPattern=json.dumps(EVENT_PATTERN),
+        State="ENABLED",
+        Description="Send notebook run state changes to the topic " + topic_name,
+    )["RuleArn"]
+
+    policy = {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {"Service": "events.amazonaws.com"},
+                "Action": "sns:Publish",
+                "Resource": topic_arn,
+                "Condition": {"ArnEquals": {"aws:SourceArn": rule_arn}},
+            }
+        ],
+    }
+    retry.call(
+        "SetTopicAttributes",
+        sns.set_topic_attributes,
+        TopicArn=topic_arn,
+        AttributeName="Policy",
+        AttributeValue=json.dumps(policy),
+    )
+    retry.call(
+        "PutTargets",
+        events.put_targets,
+        Rule=rule_name,
+        Targets=[{"Id": "Default", "Arn": topic_arn}],
+    )
+    return topic_arn
+
+
+def create_event_queue(topic_arn, queue_name=None, session=None):
+    """Create an SQS queue for one consumer and subscribe it to the events topic made by
+    :meth:`create_event_topic`. The messages are the events themselves (raw message delivery).
+
+    Args:
+        topic_arn (str): The ARN of the topic (required).
+        queue_name (str): The name of the queue (default: EVENTS_NAME followed by a random suffix).
+        session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
+
+    Returns:
+        The URL of the queue, for :class:`SqsEventSource`.
+    """
+    session = ensure_session(session)
+    queue_name = queue_name or "{}-{}".format(EVENTS_NAME, uuid.uuid4().hex[:12])
+    sqs = retry.client(session, "sqs")
+    sns = retry.client(session, "sns")
+
+    queue_url = retry.call(
+        "CreateQueue",
+        sqs.create_queue,
+        QueueName=queue_name,
+        Attributes={"MessageRetentionPeriod": "3600"},
+    )["QueueUrl"]
+    queue_arn = retry.call(
+        "GetQueueAttributes",
+        sqs.get_queue_attributes,
+        QueueUrl=queue_url,
+        AttributeNames=["QueueArn"],
+    )["Attributes"]["QueueArn"]
+
+    policy = {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {"Service": "sns.amazonaws.com"},
+                "Action": "sqs:SendMessage",
+                "Resource": queue_arn,
+                "Condition": {"ArnEquals": {"aws:SourceArn": topic_arn}},
+            }
+        ],
+    }
+    retry.call(
+        "SetQueueAttributes",
+        sqs.set_queue_attributes,
+        QueueUrl=queue_url,
+        Attributes={"Policy": json.dumps(policy)},
+    )
+    retry.call(
+        "Subscribe",
+        sns.subscribe,
+        TopicArn=topic_arn,
+        Protocol="sqs",
+        Endpoint=queue_arn,
+        Attributes={"RawMessageDelivery": "true"},
+    )
+    return queue_url
+
+
+def delete_event_queue(queue_url, topic_arn=None, session=None):
+    """Delete a consumer's queue made by :meth:`create_event_queue`, and its subscription to the topic"""
+    session = ensure_session(session)
+    sqs = retry.client(session, "sqs")
+    sns = retry.client(session, "sns")
+    try:
+        queue_arn = retry.call(
+            "GetQueueAttributes",
+            sqs.get_queue_attributes,
+            QueueUrl=queue_url,
+            AttributeNames=["QueueArn"],
+        )["Attributes"]["QueueArn"]
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] != "AWS.SimpleQueueService.NonExistentQueue":
+            raise
+        return
+    if topic_arn is not None:
+        next_token = None
+        while True:
+            args = {"NextToken": next_token} if next_token else {}
+            page = retry.call(
+                "ListSubscriptionsByTopic",
+                sns.list_subscriptions_by_topic,
+                TopicArn=topic_arn,
+                **args,
+            )
+            for subscription in page["Subscriptions"]:
+                if subscription["Endpoint"] == queue_arn:
+                    retry.call(
+                        "Unsubscribe",
+                        sns.unsubscribe,
+                        SubscriptionArn=subscription["SubscriptionArn"],
+                    )
+            next_token = page.get("NextToken")
+            if not next_token:
+                break
+    retry.call("DeleteQueue", sqs.delete_queue, QueueUrl=queue_url)
+
+
+def delete_event_topic(topic_name=EVENTS_NAME, rule_name=None, session=None):
+    """Delete the topic and rule made by :meth:`create_event_topic`"""
+    session = ensure_session(session)
+    rule_name = rule_name or topic_name
+    sns = retry.client(session, "sns")
+    events = retry.client(session, "events")
+    try:
+        retry.call(
+            "RemoveTargets", events.remove_targets, Rule=rule_name, Ids=["Default"]
+        )
+        retry.call("DeleteRule", events.delete_rule, Name=rule_name)
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] != "ResourceNotFoundException":
+            raise
+    # CreateTopic returns the ARN of an existing topic, and deleting a topic deletes its subscriptions
+    topic_arn = retry.call("CreateTopic", sns.create_topic, Name=topic_name)["TopicArn"]
+    retry.call("DeleteTopic", sns.delete_topic, TopicArn=topic_arn)
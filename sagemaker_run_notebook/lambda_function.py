@@ -1,8 +1,20 @@
+import hashlib
 import json
+import logging
 import os
 import re
 import time
 import boto3
+import botocore
+from botocore.config import Config
+
+logger = logging.getLogger(__name__)
+
+# The environment variable of the processing job that records the hash of the run's parameters
+PARAMS_HASH_VAR = "PAPERMILL_PARAMS_HASH"
+
+# The post-processing of the output notebook that a run can ask the container for (see build_processing_args)
+OUTPUT_OPTIONS = ["gzip", "externalize", "summary"]
 
 
 def execute_notebook(
@@ -17,11 +29,13 @@ def execute_notebook(
     instance_type,
     rule_name,
     extra_args,
+    params_hash=None,
+    output_options=None,
 ):
-    session = ensure_session()
+    session = get_session()
     region = session.region_name
 
-    account = session.client("sts").get_caller_identity()["Account"]
+    account = get_account(session)
     if not image:
         if not environment:
             environment = "sandbox"
@@ -36,6 +50,98 @@ def execute_notebook(
     if "/" not in role:
         role = f"arn:aws:iam::{account}:role/{role}"
 
+    api_args = build_processing_args(
+        image=image,
+        input_path=input_path,
+        output_prefix=output_prefix,
+        notebook=notebook,
+        parameters=parameters,
+        role=role,
+        instance_type=instance_type,
+        rule_name=rule_name,
+        extra_args=extra_args,
+        region=os.environ.get("AWS_DEFAULT_REGION"),
+        params_hash=params_hash,
+        output_options=output_options,
+    )
+
+    return start_processing_job(get_client("sagemaker"), api_args)
+
+
+def parameters_hash(parameters):
+    """Return a hash of a run's parameters, used to recognize the same run being submitted again"""
+    encoded = json.dumps(parameters, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def start_processing_job(client, api_args):
+    """Create the processing job described by `api_args` and return its name.
+
+    Submitting a run again is safe: if a job with the same name already exists and was started with the same
+    parameters hash, its name is returned instead of starting another job. A job with the same name and
+    different parameters raises a ValueError, as does one that doesn't record a parameters hash (it was
+    started before they were recorded, or by something else), since it can't be shown to be the same run.
+    """
+    job_name = api_args["ProcessingJobName"]
+    try:
+        result = client.create_processing_job(**api_args)
+    except botocore.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ResourceInUse":
+            raise
+        desc = client.describe_processing_job(ProcessingJobName=job_name)
+        existing_hash = desc.get("Environment", {}).get(PARAMS_HASH_VAR)
+        if existing_hash is None:
+            raise ValueError(
+                f"Processing job {job_name} already exists without a parameters hash, so it may be a different run"
+            )
+        if existing_hash != api_args["Environment"][PARAMS_HASH_VAR]:
+            raise ValueError(
+                f"Processing job {job_name} already exists with different parameters"
+            )
+        logger.info("Processing job %s already exists, not starting it again", job_name)
+        return job_name
+    job_arn = result["ProcessingJobArn"]
+    job = re.sub("^.*/", "", job_arn)
+    return job
+
+
+def build_processing_args(
+    *,
+    image,
+    input_path,
+    output_prefix,
+    notebook,
+    parameters,
+    role,
+    instance_type,
+    rule_name=None,
+    extra_args=None,
+    region=None,
+    params_hash=None,
+    output_options=None,
+):
+    """Build the arguments to SageMaker CreateProcessingJob for a notebook run.
+
+    This is shared by the Lambda function and the direct submission mode of `invoke` so that both start
+    identical jobs. The image and role must already be a full URI and ARN. The processing job is named
+    after parameters["job_id"], which is not passed on to the notebook.
+
+    The job's environment records `params_hash` (by default the hash of `parameters`) so that a repeated
+    submission can be recognized (see `start_processing_job`).
+
+    `output_options` asks the container to post-process the output notebook before SageMaker uploads it:
+    "gzip" (bool) compresses it (the output's name then ends in ".ipynb.gz"), "externalize" (int) moves
+    rich outputs larger than that many bytes into files beside it and "summary" (bool) writes a JSON
+    summary of the run beside it. These need a container image that understands them.
+    """
+    output_options = output_options or {}
+    unknown = set(output_options) - set(OUTPUT_OPTIONS)
+    if unknown:
+        raise ValueError(
+            "Unknown output options: {}".format(", ".join(sorted(unknown)))
+        )
+    if params_hash is None:
+        params_hash = parameters_hash(parameters)
     if output_prefix is None:
         output_prefix = os.path.dirname(input_path)
 
@@ -52,9 +158,12 @@ def execute_notebook(
     #     + timestamp
     # )
     job_name = parameters["job_id"]
+    parameters = {k: v for k, v in parameters.items() if k != "job_id"}
     input_directory = "/opt/ml/processing/input/"
     local_input = input_directory + os.path.basename(input_path)
     result = "{}-{}{}".format(nb_name, timestamp, nb_ext)
+    if output_options.get("gzip"):
+        result += ".gz"
     local_output = "/opt/ml/processing/output/"
 
     api_args = {
@@ -104,22 +213,23 @@ def execute_notebook(
     if extra_args is not None:
         api_args = merge_extra(api_args, extra_args)
 
-    parameters.pop("job_id", None)
-
     api_args["Environment"]["PAPERMILL_INPUT"] = local_input
     api_args["Environment"]["PAPERMILL_OUTPUT"] = local_output + result
-    if os.environ.get("AWS_DEFAULT_REGION") != None:
-        api_args["Environment"]["AWS_DEFAULT_REGION"] = os.environ["AWS_DEFAULT_REGION"]
+    if region != None:
+        api_args["Environment"]["AWS_DEFAULT_REGION"] = region
     api_args["Environment"]["PAPERMILL_PARAMS"] = json.dumps(parameters)
     api_args["Environment"]["PAPERMILL_NOTEBOOK_NAME"] = base
+    api_args["Environment"][PARAMS_HASH_VAR] = params_hash
     if rule_name is not None:
         api_args["Environment"]["AWS_EVENTBRIDGE_RULE"] = rule_name
+    if output_options.get("externalize"):
+        api_args["Environment"]["PAPERMILL_OUTPUT_EXTERNALIZE"] = str(
+            int(output_options["externalize"])
+        )
+    if output_options.get("summary"):
+        api_args["Environment"]["PAPERMILL_OUTPUT_SUMMARY"] = "1"
 
-    client = boto3.client("sagemaker")
-    result = client.create_processing_job(**api_args)
-    job_arn = result["ProcessingJobArn"]
-    job = re.sub("^.*/", "", job_arn)
-    return job
+    return api_args
 
 
 def merge_extra(orig, extra):
@@ -148,6 +258,65 @@ def merge_extra(orig, extra):
     return result
 
 
+# How long a cached account ID stays valid, in seconds.
+IDENTITY_TTL = 15 * 60
+
+# The session, clients and account ID live as long as the Lambda container so that warm invocations
+# don't pay to create them again.
+_session = None
+_clients = {}
+_accounts = {}
+
+# This file is deployed on its own, so rather than the package's retry module it uses botocore's adaptive
+# retries: jittered exponential backoff, a retry quota and client side rate limiting when throttled.
+RETRY_CONFIG = Config(retries={"mode": "adaptive", "max_attempts": 8})
+
+
+def get_session():
+    """Return the session for this Lambda container, creating it on first use"""
+    global _session
+    if _session is None:
+        _session = ensure_session()
+    return _session
+
+
+def get_client(name):
+    """Return the boto3 client for the service from this Lambda container, creating it on first use"""
+    client = _clients.get(name)
+    if client is None:
+        client = get_session().client(name, config=RETRY_CONFIG)
+        _clients[name] = client
+    return client
+
+
+def reset_state():
+    """Forget the session, clients and account ID, as if this were a new Lambda container"""
+    global _session
+    _session = None
+    _clients.clear()
+    _accounts.clear()
+
+
+def get_account(session):
+    """Return the account ID for the session, cached by credentials and region"""
+    credentials = session.get_credentials()
+    key = (
+        credentials.access_key if credentials is not None else None,
+        session.region_name,
+    )
+    now = time.time()
+    entry = _accounts.get(key)
+    if entry is None or entry[0] <= now:
+        if session is _session:
+            sts = get_client("sts")
+        else:
+            sts = session.client("sts")
+        account = sts.get_caller_identity()["Account"]
+        entry = (now + IDENTITY_TTL, account)
+        _accounts[key] = entry
+    return entry[1]
+
+
 def ensure_session(session=None, region: str = None):
     """If session is None, create a default session and return it. Otherwise return the session passed in"""
     if session is None:
@@ -169,5 +338,7 @@ def lambda_handler(event, context):
         instance_type=event.get("instance_type", "ml.m5.large"),
         rule_name=event.get("rule_name"),
         extra_args=event.get("extra_args"),
+        params_hash=event.get("params_hash"),
+        output_options=event.get("output_options"),
     )
     return {"job_name": job}
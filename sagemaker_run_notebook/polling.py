@@ -0,0 +1,189 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Poll for something to finish at intervals that depend on how long it is expected to take.
+
+When the expected duration is known (from earlier runs), a :class:`PollScheduler` polls rarely at the start,
+halving the time left until the expected finish with each wait. It then polls often around the expected
+finish and backs off once the wait has run well past it. When the duration isn't known,
+the interval starts at `min_interval` and grows geometrically.
+
+Finished waits record their duration locally (see :meth:`record_duration`), so that the next wait for the
+same kind of thing can use it, and add to the counts reported by :meth:`poll_stats`.
+"""
+
+import json
+import math
+import os
+import statistics
+import threading
+import time
+
+from .utils import cache_dir
+
+# The interval that waits used before they were adaptive, used to report the polls saved.
+FIXED_INTERVAL = 10
+
+# The number of durations to remember for each key.
+HISTORY_SIZE = 20
+
+_stats = {}
+_stats_lock = threading.Lock()
+_durations_lock = threading.Lock()
+
+
+class PollScheduler:
+    """Decides how long to wait before each poll.
+
+    Args:
+        expected (float): The expected duration in seconds from the start of the wait, or None if unknown.
+        min_interval (float): The shortest wait between polls in seconds (default: 5).
+        max_interval (float): The longest wait between polls in seconds (default: 300).
+        backoff (float): How fast the interval grows when the duration is unknown (default: 1.5).
+        name (str): The name to report the polls under in :meth:`poll_stats` (default: "poll").
+        clock (function): The clock to measure the wait with (default: time.monotonic).
+    """
+
+    def __init__(
+        self,
+        expected=None,
+        min_interval=5,
+        max_interval=300,
+        backoff=1.5,
+        name="poll",
+        clock=time.monotonic,
+    ):
+        self.expected = expected
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.name = name
+        self.clock = clock
+        self.start = clock()
+        self.polls = 0
+
+    def interval(self, elapsed, polls):
+        """The number of seconds to wait after poll number `polls`, `elapsed` seconds into the wait"""
+        if not self.expected:
+            interval = self.min_interval * self.backoff ** max(0, polls - 1)
+        else:
+            # Around the expected finish, poll at 1% of the expected duration
+            near = self.expected / 100
+            if elapsed < 0.9 * self.expected:
+                # Wait half of the time left until shortly before the expected finish
+                interval = (0.9 * self.expected - elapsed) / 2
+            elif elapsed < 1.1 * self.expected:
+                interval = near
+            else:
+                # Overdue, so probably a much longer run than usual
+                interval = max(near, (elapsed - 1.1 * self.expected) / 4)
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def elapsed(self):
+        return self.clock() - self.start
+
+    def next_interval(self):
+        """Count a poll and return how long to wait before the next one"""
+        self.polls += 1
+        return self.interval(self.elapsed(), self.polls)
+
+    def sleep(self):
+        """Count a poll and wait until the next one"""
+        time.sleep(self.next_interval())
+
+    def planned_polls(self, duration):
+        """The number of polls this schedule makes for a wait of `duration` seconds"""
+        elapsed = 0
+        polls = 1
+        while elapsed < duration:
+            elapsed += self.interval(elapsed, polls)
+            polls += 1
+        return polls
+
+    def finish(self, key=None):
+        """Record the finished wait in :meth:`poll_stats` and, if `key` is given, its duration for the next wait"""
+        duration = self.elapsed()
+        polls = self.polls + 1  # the poll that saw it finish
+        with _stats_lock:
+            s = _stats.setdefault(
+                self.name,
+                dict(
+                    waits=0,
+                    polls=0,
+                    expected_polls=0,
+                    fixed_interval_polls=0,
+                    expected_seconds=0,
+                    actual_seconds=0,
+                ),
+            )
+            s["waits"] += 1
+            s["polls"] += polls
+            s["fixed_interval_polls"] += 1 + math.ceil(duration / FIXED_INTERVAL)
+            s["actual_seconds"] += duration
+            if self.expected:
+                s["expected_polls"] += self.planned_polls(self.expected)
+                s["expected_seconds"] += self.expected
+        if key is not None:
+            record_duration(key, duration)
+
+
+def poll_stats():
+    """Return the poll counts of the finished waits by name.
+
+    For each name, "polls" is the number of polls made and "expected_polls" the number the schedules planned
+    for the expected durations. "fixed_interval_polls" is what polling every FIXED_INTERVAL seconds would
+    have taken. "expected_seconds" and "actual_seconds" are the total expected and actual wait times.
+    """
+    with _stats_lock:
+        return {name: dict(s) for name, s in _stats.items()}
+
+
+def reset_poll_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _durations_path():
+    return os.path.join(cache_dir(), "durations.json")
+
+
+def _load_durations():
+    try:
+        with open(_durations_path(), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_duration(key, seconds):
+    """Remember how long a wait for `key` (such as "build:<project>") took"""
+    with _durations_lock:
+        durations = _load_durations()
+        history = durations.get(key, [])[-(HISTORY_SIZE - 1) :]
+        history.append(seconds)
+        durations[key] = history
+        tmp = f"{_durations_path()}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(durations, f)
+            os.replace(tmp, _durations_path())
+        except OSError:
+            pass
+
+
+def expected_duration(key):
+    """Return the median recorded duration for `key` in seconds, or None if there is none"""
+    with _durations_lock:
+        history = _load_durations().get(key)
+    if not history:
+        return None
+    return statistics.median(history)
@@ -0,0 +1,203 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Retry AWS API calls that were throttled or failed transiently.
+
+Retries wait for an exponentially growing, fully jittered delay so that many clients that were throttled at
+the same moment don't all retry together. A retry budget stops a struggling service being hit by a wall of
+retries: each call adds a fraction of a token to the budget and each retry spends a whole one, so retries
+can't be more than about `budget_ratio` of the calls.
+
+The calls should be made with clients from :meth:`client`, which have botocore's own retries turned off, so
+that a throttled call isn't retried by botocore inside each of this module's attempts as well.
+"""
+
+import asyncio
+import functools
+import random
+import threading
+import time
+
+import botocore
+from botocore.config import Config
+
+THROTTLING_ERRORS = (
+    "ThrottlingException",
+    "Throttling",
+    "ThrottledException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "SlowDown",
+)
+
+RETRYABLE_ERRORS = THROTTLING_ERRORS + (
+    "InternalFailure",
+    "InternalServerError",
+    "ServiceUnavailable",
+)
+
+# The client config for calls made through this module: one attempt each, as the retries happen here.
+CLIENT_CONFIG = Config(retries={"total_max_attempts": 1})
+
+
+def client(session, service_name, config=None, **kwargs):
+    """Create a boto3 client from `session` for calls made through this module, with botocore's retries off.
+
+    Clients that are also used for calls outside this module (such as S3 transfers) should keep botocore's
+    retries and come from `session.client` instead.
+    """
+    config = CLIENT_CONFIG if config is None else config.merge(CLIENT_CONFIG)
+    return session.client(service_name, config=config, **kwargs)
+
+
+def error_code(e):
+    """Return the AWS error code of a ClientError, or None for other exceptions"""
+    if isinstance(e, botocore.exceptions.ClientError):
+        return e.response.get("Error", {}).get("Code")
+    return None
+
+
+class RetryPolicy:
+    """Calls functions, retrying retryable AWS errors with jittered exponential backoff.
+
+    Args:
+        max_attempts (int): The maximum number of attempts for one call, including the first (default: 8).
+        base_delay (float): The cap on the first retry's delay in seconds. Doubles with each retry (default: 0.25).
+        max_delay (float): The largest cap on a delay in seconds (default: 20).
+        budget_ratio (float): The tokens added to the retry budget by each call (default: 0.2).
+        budget_max (float): The size of the retry budget, which also starts full (default: 20).
+    """
+
+    def __init__(
+        self,
+        max_attempts=8,
+        base_delay=0.25,
+        max_delay=20,
+        budget_ratio=0.2,
+        budget_max=20,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self.budget = budget_max
+        self.lock = threading.Lock()
+        self._metrics = {}
+
+    def retryable(self, e):
+        if isinstance(
+            e,
+            (
+                botocore.exceptions.ConnectionError,
+                botocore.exceptions.ReadTimeoutError,
+            ),
+        ):
+            return True
+        return error_code(e) in RETRYABLE_ERRORS
+
+    def delay(self, attempt):
+        """The delay in seconds before retry number `attempt` (starting at 1)"""
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        )
+
+    def _count(self, api, key, n=1):
+        with self.lock:
+            m = self._metrics.setdefault(
+                api,
+                dict(calls=0, retries=0, throttles=0, failures=0, exhausted=0),
+            )
+            m[key] += n
+
+    def _start(self, api):
+        self._count(api, "calls")
+        with self.lock:
+            self.budget = min(self.budget_max, self.budget + self.budget_ratio)
+
+    def _should_retry(self, api, e, attempt):
+        """Record a failed attempt and return the delay before the next one, or None to give up"""
+        if not self.retryable(e):
+            self._count(api, "failures")
+            return None
+        if error_code(e) in THROTTLING_ERRORS:
+            self._count(api, "throttles")
+        with self.lock:
+            can_retry = attempt < self.max_attempts and self.budget >= 1
+            if can_retry:
+                self.budget -= 1
+        if not can_retry:
+            self._count(api, "exhausted")
+            self._count(api, "failures")
+            return None
+        self._count(api, "retries")
+        return self.delay(attempt)
+
+    def call(self, api, fn, *args, **kwargs):
+        """Call `fn(*args, **kwargs)`, retrying retryable errors. `api` names the call in the metrics."""
+        self._start(api)
+        attempt = 1
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._should_retry(api, e, attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, api, fn, *args, **kwargs):
+        """Like :meth:`call`, but makes each attempt on the event loop's default executor and waits between
+        attempts with `asyncio.sleep`, so the event loop keeps running"""
+        self._start(api)
+        loop = asyncio.get_event_loop()
+        attempt = 1
+        while True:
+            try:
+                return await loop.run_in_executor(
+                    None, functools.partial(fn, *args, **kwargs)
+                )
+            except Exception as e:
+                delay = self._should_retry(api, e, attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def metrics(self):
+        """Return a dict from API name to the counts of calls, retries, throttles, failures and exhausted retries"""
+        with self.lock:
+            return {api: dict(m) for api, m in self._metrics.items()}
+
+    def reset_metrics(self):
+        with self.lock:
+            self._metrics = {}
+
+
+default_policy = RetryPolicy()
+
+
+def call(api, fn, *args, **kwargs):
+    """Call `fn` with the default retry policy"""
+    return default_policy.call(api, fn, *args, **kwargs)
+
+
+async def call_async(api, fn, *args, **kwargs):
+    """Call `fn` with the default retry policy, waiting with `asyncio.sleep`"""
+    return await default_policy.call_async(api, fn, *args, **kwargs)
+
+
+def metrics():
+    """Return the metrics of the default retry policy"""
+    return default_policy.metrics()
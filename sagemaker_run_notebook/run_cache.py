@@ -0,0 +1,160 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""A local cache of processing job descriptions.
+
+A job that has finished never changes, so its DescribeProcessingJob result is kept until it is evicted. A job
+that is still running is only trusted for `ttl` seconds. The cache is stored in SQLite in the cache directory
+(see :meth:`utils.cache_dir`) so that it is shared by the CLI, the JupyterLab server extension and notebooks.
+The least recently used entries are evicted once there are more than `max_entries`. An entry's last use is
+only written when it is more than `touch_interval` seconds old, so most hits are just a read.
+"""
+
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import dateutil.parser
+
+from .utils import cache_dir
+
+TERMINAL_STATES = ["Completed", "Failed", "Stopped"]
+
+# How long, in seconds, the description of a job that hasn't finished is used.
+RUN_CACHE_TTL = 10
+
+# The number of job descriptions to keep.
+RUN_CACHE_SIZE = 10000
+
+# How stale, in seconds, an entry's last use can get before a hit records it again.
+TOUCH_INTERVAL = 300
+
+
+def _encode(o):
+    if isinstance(o, datetime.datetime):
+        return {"$datetime": o.isoformat()}
+    raise TypeError("Object of type {} is not JSON serializable".format(type(o)))
+
+
+def _decode(d):
+    if len(d) == 1 and "$datetime" in d:
+        return dateutil.parser.isoparse(d["$datetime"])
+    return d
+
+
+class RunCache:
+    """Stores processing job descriptions in SQLite.
+
+    Args:
+        path (str): The SQLite database file, or ":memory:" (default: "runs.sqlite" in the cache directory).
+        ttl (float): The number of seconds to use the description of a job that hasn't finished (default: RUN_CACHE_TTL).
+        max_entries (int): The number of descriptions to keep (default: RUN_CACHE_SIZE).
+        touch_interval (float): The number of seconds between updates of an entry's last use (default: TOUCH_INTERVAL).
+    """
+
+    def __init__(
+        self,
+        path=None,
+        ttl=RUN_CACHE_TTL,
+        max_entries=RUN_CACHE_SIZE,
+        touch_interval=TOUCH_INTERVAL,
+    ):
+        self.path = path or os.path.join(cache_dir(), "runs.sqlite")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.puts = 0
+        self.hits = 0
+        self.misses = 0
+        with self.lock, self.conn:
+            self.conn.execute(
+                """CREATE TABLE IF NOT EXISTS runs (
+                    key TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    fetched REAL NOT NULL,
+                    used REAL NOT NULL)"""
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS runs_used ON runs (used)")
+
+    def get(self, key):
+        """Return the cached description for `key`, or None if there isn't a usable one"""
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT status, description, fetched, used FROM runs WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or (
+                row[0] not in TERMINAL_STATES and row[2] + self.ttl <= now
+            ):
+                self.misses += 1
+                return None
+            if row[3] + self.touch_interval <= now:
+                self.conn.execute("UPDATE runs SET used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[1], object_hook=_decode)
+
+    def put(self, key, description):
+        """Store a DescribeProcessingJob result"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO runs (key, status, description, fetched, used) VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    description["ProcessingJobStatus"],
+                    json.dumps(description, default=_encode),
+                    now,
+                    now,
+                ),
+            )
+            self.puts += 1
+            if self.puts % 100 == 1:
+                self._evict()
+
+    def _evict(self):
+        self.conn.execute(
+            "DELETE FROM runs WHERE key IN (SELECT key FROM runs ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM runs")
+
+    def stats(self):
+        """Return the number of entries, hits and misses"""
+        with self.lock:
+            (entries,) = self.conn.execute("SELECT COUNT(*) FROM runs").fetchone()
+            return dict(entries=entries, hits=self.hits, misses=self.misses)
+
+
+_run_cache = None
+_run_cache_lock = threading.Lock()
+
+
+def run_cache():
+    """Return the process wide :class:`RunCache`, or None if the environment variable
+    SAGEMAKER_RUN_NOTEBOOK_NO_RUN_CACHE is set"""
+    global _run_cache
+    if os.environ.get("SAGEMAKER_RUN_NOTEBOOK_NO_RUN_CACHE"):
+        return None
+    with _run_cache_lock:
+        if _run_cache is None:
+            _run_cache = RunCache()
+        return _run_cache
@@ -13,23 +13,46 @@
 """Run a notebook on demand or on a schedule using Amazon SageMaker Processing Jobs"""
 
 import asyncio
+import collections
+import concurrent.futures
+import copy
+import datetime
 import errno
+import gzip
+import hashlib
 import io
+import itertools
 import logging
 import json
 import os
 import re
+import threading
 import time
-from subprocess import Popen, PIPE, STDOUT, DEVNULL
-from shlex import split
+import uuid
 import zipfile as zip
 from urllib.parse import urlparse
 from typing_extensions import Literal
 
 import botocore
 import boto3
-
-from .utils import default_bucket, get_execution_role
+from boto3.s3.transfer import TransferConfig
+
+from . import polling, retry
+from .run_cache import run_cache
+from .run_store import RunStore
+from .lambda_function import (
+    build_processing_args,
+    parameters_hash,
+    start_processing_job,
+)
+from .utils import (
+    cache_dir,
+    default_bucket,
+    get_account,
+    get_execution_role,
+    resolve_image,
+    resolve_role,
+)
 
 abbrev_image_pat = re.compile(
     r"(?P<account>\d+).dkr.ecr.(?P<region>[^.]+).amazonaws.com/(?P<image>[^:/]+)(?P<tag>:[^:]+)?"
@@ -60,51 +83,241 @@ def abbreviate_role(role):
         return role
 
 
+class UploadIndex:
+    """A local record of the notebooks that have already been uploaded, keyed by the SHA-256 digest of their
+    contents, so that uploading the same notebook again doesn't need another PUT to S3.
+
+    The index is kept in memory and saved as JSON in the cache directory (see :meth:`utils.cache_dir`). An
+    entry can outlive its object (deleted by a lifecycle rule or by hand), so check that it still exists
+    before using it (see :meth:`indexed_upload`).
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), "uploads.json")
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, bucket, digest):
+        with self.lock:
+            return self.entries.get(f"{bucket}/{digest}")
+
+    def add(self, bucket, digest, s3path):
+        with self.lock:
+            self.entries[f"{bucket}/{digest}"] = s3path
+            self._save()
+
+    def remove(self, bucket, digest):
+        with self.lock:
+            if self.entries.pop(f"{bucket}/{digest}", None) is not None:
+                self._save()
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            # The index is only an optimization, so carry on with the in memory copy
+            pass
+
+
+_upload_index = None
+
+
+def upload_index():
+    """Return the process wide :class:`UploadIndex`"""
+    global _upload_index
+    if _upload_index is None:
+        _upload_index = UploadIndex()
+    return _upload_index
+
+
+def s3_object_exists(s3, bucket, key):
+    """Return whether the S3 object exists, with a HEAD request. `s3` should come from :meth:`retry.client`."""
+    try:
+        retry.call("HeadObject", s3.head_object, Bucket=bucket, Key=key)
+        return True
+    except botocore.exceptions.ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NoSuchKey", "NotFound"):
+            raise
+        return False
+
+
+def indexed_upload(s3, bucket, digest):
+    """Return the S3 URI that the :class:`UploadIndex` has for `digest` if the object is still there, or None.
+    Entries whose objects have gone are removed from the index."""
+    index = upload_index()
+    s3path = index.get(bucket, digest)
+    if s3path is None:
+        return None
+    o = urlparse(s3path)
+    if s3_object_exists(s3, o.netloc, o.path[1:]):
+        return s3path
+    index.remove(bucket, digest)
+    return None
+
+
+def file_digest(fobj):
+    """Return the hex SHA-256 digest of the rest of a seekable file object, leaving it where it started"""
+    pos = fobj.tell()
+    h = hashlib.sha256()
+    for chunk in iter(lambda: fobj.read(1024 * 1024), b""):
+        h.update(chunk)
+    fobj.seek(pos)
+    return h.hexdigest()
+
+
 def upload_notebook(notebook, fname=None, session=None):
-    """Uploads a file obj to S3 in the default SageMaker Python SDK bucket for
-    this user. The resulting S3 object will be named "s3://<bucket>/papermill-input/notebook-<%Y-%m-%d-%H-%M-%S>.ipynb".
+    """Uploads a notebook file to S3 in the default SageMaker Python SDK bucket for
+    this user. If `fname` is None, the resulting S3 object will be named
+    "s3://<bucket>/papermill_input/sha256/<digest>.ipynb" after the contents of the notebook and
+    isn't uploaded again if it is already there.
 
     Args:
-      fpath (str):
+      notebook (str):
         The filepath of the notebook you want to upload. (Required)
       fname (str):
-        The filename of the notebook you want to upload. (Required)
+        The filename to give the notebook in S3. (Default: None, name by content)
       session (boto3.Session):
         A boto3 session to use. Will create a default session if not supplied. (Default: None)
 
     Returns:
       The resulting object name in S3 in URI format.
     """
-    if not fname:
-        fname = "notebook-{}.ipynb".format(
-            time.strftime("%Y-%m-%d-%H-%M-%S", time.gmtime())
-        )
-
     ## Uploading notebook
     with open(notebook, "rb") as f:
         return upload_fileobj(f, fname, session)
 
 
-def upload_json(json_data, fname, session=None):
+PARAMETER_COMPRESSIONS = [None, "gzip", "zstd"]
+
+
+def encode_json(json_data, compression=None):
+    """Serialize `json_data` as JSON, compressed if `compression` is "gzip" or "zstd".
+
+    zstd needs the `zstandard` package (`pip install sagemaker-run-notebook[zstd]`).
+
+    Returns:
+      A tuple of the encoded bytes and the file suffix to use: ".json", ".json.gz" or ".json.zst".
+    """
+    body = json.dumps(json_data).encode("utf-8")
+    if compression is None:
+        return body, ".json"
+    if compression == "gzip":
+        return gzip.compress(body, mtime=0), ".json.gz"
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError(
+                "zstd compression needs the zstandard package (pip install zstandard)"
+            )
+        return zstandard.ZstdCompressor().compress(body), ".json.zst"
+    raise ValueError(
+        "Unknown compression {}, use one of {}".format(
+            compression, PARAMETER_COMPRESSIONS
+        )
+    )
+
+
+def upload_json(json_data, fname, session=None, client=None, compression=None):
+    """Upload `json_data` as "s3://<bucket>/papermill_input/<fname>" in the default bucket.
+
+    If `compression` is "gzip" or "zstd", the ".json" ending of `fname` is replaced by ".json.gz" or ".json.zst".
+    The container decompresses parameter files based on that suffix.
+
+    Returns:
+      The resulting object name in S3 in URI format.
+    """
     session = ensure_session(session)
-    s3 = session.client("s3")
+    s3 = client or session.client("s3")
+    body, suffix = encode_json(json_data, compression)
+    if fname.endswith(".json"):
+        fname = fname[: -len(".json")]
+    fname = fname + suffix
     key = "papermill_input/" + fname
     bucket = default_bucket(session)
     s3path = "s3://{}/{}".format(bucket, key)
     print(f"Uploading {fname} to {s3path}")
-    s3.put_object(Body=json.dumps(json_data), Bucket=bucket, Key=key)
+    s3.put_object(Body=body, Bucket=bucket, Key=key)
+    return s3path
+
+
+def params_file_name(job_id, params_hash):
+    """The name of the uploaded parameters of a run. It includes the parameters hash, so a retry of a job_id
+    with different parameters can't overwrite the parameters of the job already started with it."""
+    return "{}-{}.json".format(job_id, params_hash[:16])
+
+
+def upload_shared_json(json_data, session=None, client=None, compression=None):
+    """Upload `json_data` named by the SHA-256 digest of its encoding as
+    "s3://<bucket>/papermill_input/params/sha256/<digest>.json[.gz|.zst]", unless the :class:`UploadIndex`
+    shows that it has been uploaded already and it is still there.
+
+    This is used for the parameters shared by a batch of runs (see :meth:`invoke_many`).
+
+    Returns:
+      The resulting object name in S3 in URI format.
+    """
+    session = ensure_session(session)
+    s3 = client or session.client("s3")
+    bucket = default_bucket(session)
+    body, suffix = encode_json(json_data, compression)
+    digest = hashlib.sha256(body).hexdigest()
+    s3path = indexed_upload(retry.client(session, "s3"), bucket, digest)
+    if s3path:
+        return s3path
+    key = "papermill_input/params/sha256/{}{}".format(digest, suffix)
+    s3path = "s3://{}/{}".format(bucket, key)
+    print(f"Uploading shared parameters to {s3path}")
+    s3.put_object(Body=body, Bucket=bucket, Key=key)
+    upload_index().add(bucket, digest, s3path)
     return s3path
 
 
-def upload_fileobj(fobj, fname, session=None):
+def split_parameters(parameters_list):
+    """Split the parameters of a batch of runs into the parameters they all share and what is left for each.
+
+    A key is shared if every run has it with the same value. "job_id" is never shared.
+
+    Returns:
+      A tuple of the shared dict and a list with the remaining dict for each run.
+    """
+    if not parameters_list:
+        return {}, []
+    first = parameters_list[0]
+    shared = {}
+    for k, v in first.items():
+        if k == "job_id":
+            continue
+        encoded = json.dumps(v, sort_keys=True)
+        if all(
+            k in p and json.dumps(p[k], sort_keys=True) == encoded
+            for p in parameters_list[1:]
+        ):
+            shared[k] = v
+    rest = [{k: v for k, v in p.items() if k not in shared} for p in parameters_list]
+    return shared, rest
+
+
+def upload_fileobj(fobj, fname=None, session=None):
     """Uploads a file object to S3 in the default SageMaker Python SDK bucket for
-    this user. The resulting S3 object will be named "s3://<bucket>/papermill-input/<fname>".
+    this user. The resulting S3 object will be named "s3://<bucket>/papermill_input/<fname>".
+
+    If `fname` is None, the object is named by the SHA-256 digest of its contents as
+    "s3://<bucket>/papermill_input/sha256/<digest>.ipynb". Digests that have been uploaded before
+    (as recorded in the local :class:`UploadIndex` and still in S3, or found in S3) are not uploaded again.
 
     Args:
       fobj (fileobj):
-        A file object (as returned from open) that is reading from the notebook you want to upload. (Required)
-      fobj (str):
-        The filename of the notebook you want to upload. (Required)
+        A seekable file object (as returned from open) that is reading from the notebook you want to upload. (Required)
+      fname (str):
+        The filename of the notebook you want to upload. (Default: None, name by content)
       session (boto3.Session):
         A boto3 session to use. Will create a default session if not supplied. (Default: None)
 
@@ -112,16 +325,187 @@ def upload_fileobj(fobj, fname, session=None):
       The resulting object name in S3 in URI format.
     """
 
-    session = ensure_session()
+    session = ensure_session(session)
     s3 = session.client("s3")
-    key = "papermill_input/" + fname
     bucket = default_bucket(session)
+
+    if fname:
+        key = "papermill_input/" + fname
+        s3path = "s3://{}/{}".format(bucket, key)
+        print(f"Uploading {fname} to {s3path}")
+        s3.upload_fileobj(fobj, bucket, key)
+        return s3path
+
+    digest = file_digest(fobj)
+    head = retry.client(session, "s3")
+    s3path = indexed_upload(head, bucket, digest)
+    if s3path:
+        return s3path
+
+    key = "papermill_input/sha256/{}.ipynb".format(digest)
     s3path = "s3://{}/{}".format(bucket, key)
-    print(f"Uploading {fname} to {s3path}")
-    s3.upload_fileobj(fobj, bucket, key)
+    if not s3_object_exists(head, bucket, key):
+        print(f"Uploading notebook to {s3path}")
+        s3.upload_fileobj(fobj, bucket, key)
+    upload_index().add(bucket, digest, s3path)
     return s3path
 
 
+class StreamingUpload:
+    """Uploads a notebook to S3 as it arrives, without holding all of it in memory.
+
+    Feed the data to :meth:`update`, which returns a part to upload (with :meth:`upload_part`, possibly on
+    another thread) each time `part_size` bytes have built up, and then call :meth:`complete`. The SHA-256
+    digest is computed along the way. Data that never fills a part is uploaded with a single PUT, otherwise
+    the parts are uploaded as a multipart upload to a temporary key.
+
+    If `fname` is None, the notebook is named by its digest as in :meth:`upload_fileobj`: if that digest has
+    been uploaded before, the multipart upload is aborted, otherwise the temporary object is copied to its
+    final name within S3.
+
+    Args:
+      fname (str): The filename to upload to under "papermill_input/" (default: None, name by content).
+      session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
+      part_size (int): The size of the parts of a multipart upload, at least 5 MB (default: 8 MB).
+    """
+
+    def __init__(self, fname=None, session=None, part_size=8 * 1024 * 1024):
+        session = ensure_session(session)
+        self.s3 = retry.client(session, "s3")
+        self.bucket = default_bucket(session)
+        self.fname = fname
+        self.part_size = part_size
+        if fname:
+            self.key = "papermill_input/" + fname
+        else:
+            self.key = "papermill_input/uploads/{}.ipynb".format(uuid.uuid4().hex)
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.buffer = bytearray()
+        self.next_part = 1
+        self.parts = {}
+        self.upload_id = None
+        self.lock = threading.Lock()
+
+    def update(self, data):
+        """Add data to the upload.
+
+        Returns:
+          None, or a tuple of (part number, bytes) for :meth:`upload_part` once a part is full.
+        """
+        self.hash.update(data)
+        self.size += len(data)
+        self.buffer += data
+        if len(self.buffer) < self.part_size:
+            return None
+        part = (self.next_part, bytes(self.buffer[: self.part_size]))
+        del self.buffer[: self.part_size]
+        self.next_part += 1
+        return part
+
+    def _upload_id(self):
+        with self.lock:
+            if self.upload_id is None:
+                self.upload_id = retry.call(
+                    "CreateMultipartUpload",
+                    self.s3.create_multipart_upload,
+                    Bucket=self.bucket,
+                    Key=self.key,
+                )["UploadId"]
+            return self.upload_id
+
+    def upload_part(self, part):
+        """Upload a part returned by :meth:`update`. Parts can be uploaded concurrently."""
+        number, data = part
+        response = retry.call(
+            "UploadPart",
+            self.s3.upload_part,
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id(),
+            PartNumber=number,
+            Body=data,
+        )
+        with self.lock:
+            self.parts[number] = response["ETag"]
+
+    def abort(self):
+        """Abandon the upload"""
+        if self.upload_id is not None:
+            retry.call(
+                "AbortMultipartUpload",
+                self.s3.abort_multipart_upload,
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+            )
+            self.upload_id = None
+
+    def complete(self):
+        """Finish the upload once all the parts from :meth:`update` have been uploaded.
+
+        Returns:
+          The resulting object name in S3 in URI format.
+        """
+        digest = self.hash.hexdigest()
+        key = self.key
+        if not self.fname:
+            s3path = indexed_upload(self.s3, self.bucket, digest)
+            key = "papermill_input/sha256/{}.ipynb".format(digest)
+            if s3path is None and s3_object_exists(self.s3, self.bucket, key):
+                s3path = "s3://{}/{}".format(self.bucket, key)
+            if s3path is not None:
+                self.abort()
+                upload_index().add(self.bucket, digest, s3path)
+                return s3path
+
+        if self.upload_id is None and self.next_part == 1:
+            retry.call(
+                "PutObject",
+                self.s3.put_object,
+                Bucket=self.bucket,
+                Key=key,
+                Body=bytes(self.buffer),
+            )
+        else:
+            if self.buffer:
+                self.upload_part((self.next_part, bytes(self.buffer)))
+                self.next_part += 1
+            retry.call(
+                "CompleteMultipartUpload",
+                self.s3.complete_multipart_upload,
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={
+                    "Parts": [
+                        {"PartNumber": n, "ETag": self.parts[n]}
+                        for n in sorted(self.parts)
+                    ]
+                },
+            )
+            self.upload_id = None
+            if key != self.key:
+                retry.call(
+                    "CopyObject",
+                    self.s3.copy_object,
+                    Bucket=self.bucket,
+                    Key=key,
+                    CopySource={"Bucket": self.bucket, "Key": self.key},
+                )
+                retry.call(
+                    "DeleteObject",
+                    self.s3.delete_object,
+                    Bucket=self.bucket,
+                    Key=self.key,
+                )
+        self.buffer = bytearray()
+        s3path = "s3://{}/{}".format(self.bucket, key)
+        if not self.fname:
+            upload_index().add(self.bucket, digest, s3path)
+        return s3path
+
+
 def get_output_prefix():
     """Returns an S3 prefix in the Python SDK default bucket."""
     return "s3://{}/papermill_output".format(default_bucket())
@@ -143,123 +527,255 @@ def execute_notebook(
 
     if not role:
         role = get_execution_role(session)
-    elif "/" not in role:
-        account = session.client("sts").get_caller_identity()["Account"]
-        role = "arn:aws:iam::{}:role/{}".format(account, role)
+    role = resolve_role(role, session)
+    image = resolve_image(image, session)
 
-    if "/" not in image:
-        account = session.client("sts").get_caller_identity()["Account"]
-        region = session.region_name
-        image = "{}.dkr.ecr.{}.amazonaws.com/{}:latest".format(account, region, image)
-        if ":" not in image:
-            image = image + f":{environment}-latest"
-    if notebook == None:
-        notebook = input_path
-
-    base = os.path.basename(notebook)
-    nb_name, nb_ext = os.path.splitext(base)
-    timestamp = time.strftime("%Y-%m-%d-%H-%M-%S", time.gmtime())
+    api_args = build_processing_args(
+        image=image,
+        input_path=input_path,
+        output_prefix=output_prefix,
+        notebook=notebook,
+        parameters=parameters,
+        role=role,
+        instance_type=instance_type,
+        region=os.environ.get("AWS_DEFAULT_REGION"),
+    )
+    return create_processing_job(retry.client(session, "sagemaker"), api_args)
 
-    job_name = parameters["job_id"]
 
-    input_directory = "/opt/ml/processing/input/"
-    local_input = input_directory + os.path.basename(input_path)
-    result = "{}-{}{}".format(nb_name, timestamp, nb_ext)
-    local_output = "/opt/ml/processing/output/"
+def create_processing_job(client, api_args, policy=None):
+    """Start the processing job described by `api_args` (see :meth:`build_processing_args`) and return its name.
 
-    api_args = {
-        "ProcessingInputs": [
-            {
-                "InputName": "notebook",
-                "S3Input": {
-                    "S3Uri": input_path,
-                    "LocalPath": input_directory,
-                    "S3DataType": "S3Prefix",
-                    "S3InputMode": "File",
-                    "S3DataDistributionType": "FullyReplicated",
-                },
-            },
-        ],
-        "ProcessingOutputConfig": {
-            "Outputs": [
-                {
-                    "OutputName": "result",
-                    "S3Output": {
-                        "S3Uri": output_prefix,
-                        "LocalPath": local_output,
-                        "S3UploadMode": "EndOfJob",
-                    },
-                },
-            ],
-        },
-        "ProcessingJobName": job_name,
-        "ProcessingResources": {
-            "ClusterConfig": {
-                "InstanceCount": 1,
-                "InstanceType": instance_type,
-                "VolumeSizeInGB": 40,
-            }
-        },
-        "StoppingCondition": {"MaxRuntimeInSeconds": 7200},
-        "AppSpecification": {
-            "ImageUri": image,
-            "ContainerArguments": [
-                "run_notebook",
-            ],
-        },
-        "RoleArn": role,
-        "Environment": {},
-    }
+    If the job already exists with the same parameters, its name is returned (see :meth:`start_processing_job`).
+    The call is retried with `policy`, a :class:`retry.RetryPolicy` (default: the default policy).
+    """
+    policy = policy or retry.default_policy
+    return policy.call("CreateProcessingJob", start_processing_job, client, api_args)
 
-    api_args["Environment"]["PAPERMILL_INPUT"] = local_input
-    api_args["Environment"]["PAPERMILL_OUTPUT"] = local_output + result
-    if os.environ.get("AWS_DEFAULT_REGION") != None:
-        api_args["Environment"]["AWS_DEFAULT_REGION"] = os.environ["AWS_DEFAULT_REGION"]
-    api_args["Environment"]["PAPERMILL_PARAMS"] = json.dumps(parameters)
-    api_args["Environment"]["PAPERMILL_NOTEBOOK_NAME"] = notebook
-
-    client = boto3.client("sagemaker")
-    result = client.create_processing_job(**api_args)
-    job_arn = result["ProcessingJobArn"]
-    job = re.sub("^.*/", "", job_arn)
-    return job
 
+def expected_run_duration(notebook, rule=None, session=None, history=5, scan=20):
+    """Estimate how long a run of a notebook takes from creation to end, in seconds.
+
+    Uses the durations recorded by earlier waits (see :meth:`polling.record_duration`) or, if there are none,
+    the median of up to `history` of the notebook's (and rule's) runs among the `scan` most recently
+    completed runs in the account. That is one ListProcessingJobs call and at most `scan` (cached)
+    descriptions; with `scan=0` only the recorded durations are used.
 
-def wait_for_complete(job_name, progress=True, sleep_time=10, session=None):
+    Returns:
+      The expected duration in seconds, or None if there are no earlier runs.
+    """
+    key = "notebook:{}:{}".format(notebook, rule or "")
+    expected = polling.expected_duration(key)
+    if expected is not None or scan <= 0:
+        return expected
+    session = ensure_session(session)
+    client = retry.client(session, "sagemaker")
+    page = retry.call(
+        "ListProcessingJobs",
+        client.list_processing_jobs,
+        NameContains="workflow-",
+        StatusEquals="Completed",
+        MaxResults=min(scan, 100),
+    )
+    durations = []
+    for item in page["ProcessingJobSummaries"]:
+        if not item["ProcessingJobName"].startswith("workflow-"):
+            continue
+        d = describe_run(item["ProcessingJobName"], session=session, client=client)
+        if d["Notebook"] != notebook or d["Rule"] != (rule or ""):
+            continue
+        if d["End"] is not None:
+            durations.append((d["End"] - d["Created"]).total_seconds())
+        if len(durations) >= history:
+            break
+    for duration in durations:
+        polling.record_duration(key, duration)
+    return polling.expected_duration(key) if durations else None
+
+
+def wait_for_complete(
+    job_name, progress=True, sleep_time=None, session=None, events=None
+):
     """Wait for a notebook execution job to complete.
 
+    Unless `sleep_time` is given, the time between polls depends on how long earlier waited for runs of
+    the same notebook took (see :meth:`expected_run_duration` and :class:`polling.PollScheduler`): polls
+    are rare at first, frequent around the expected end and back off if the job runs long. Without
+    earlier durations, polls back off geometrically.
+
     Args:
       job_name (str):
         The name of the SageMaker Processing Job executing the notebook. (Required)
       progress (boolean):
         If True, print a period after every poll attempt. (Default: True)
       sleep_time (int):
-        The number of seconds between polls. (Default: 10)
+        If not None, poll every `sleep_time` seconds rather than adaptively. (Default: None)
       session (boto3.Session):
         A boto3 session to use. Will create a default session if not supplied. (Default: None)
+      events (job_events.JobEvents):
+        If not None, wait for the job's state change events instead of polling. The job is still described
+        every `events.fallback_interval` seconds in case events are lost. (Default: None)
 
     Returns:
       A tuple with the job status and the failure message if any.
     """
 
     session = ensure_session(session)
-    client = session.client("sagemaker")
+    client = retry.client(session, "sagemaker")
+    scheduler = None
     done = False
     while not done:
         if progress:
             print(".", end="")
-        desc = client.describe_processing_job(ProcessingJobName=job_name)
+        desc = retry.call(
+            "DescribeProcessingJob",
+            client.describe_processing_job,
+            ProcessingJobName=job_name,
+        )
         status = desc["ProcessingJobStatus"]
         if status != "InProgress":
             done = True
-        else:
+        elif events is not None:
+            detail = events.wait(job_name, timeout=events.fallback_interval)
+            if detail is not None:
+                desc = detail
+                status = desc["ProcessingJobStatus"]
+                done = True
+        elif sleep_time is not None:
             time.sleep(sleep_time)
+        else:
+            if scheduler is None:
+                scheduler = polling.PollScheduler(
+                    expected=_remaining_run_time(desc, session),
+                    name="wait_for_complete",
+                )
+            scheduler.sleep()
     if progress:
         print()
+    if scheduler is not None:
+        scheduler.finish()
+    _record_run_duration(desc)
     return status, desc.get("FailureReason")
 
 
-def download_notebook(job_name, output=".", session=None):
+def _run_environment(desc):
+    env = desc.get("Environment") or {}
+    return env.get("PAPERMILL_NOTEBOOK_NAME", ""), env.get("AWS_EVENTBRIDGE_RULE", "")
+
+
+def _remaining_run_time(desc, session):
+    """The expected number of seconds until a running job ends, or None if it isn't known"""
+    notebook, rule = _run_environment(desc)
+    if not notebook:
+        return None
+    # Only the durations recorded by earlier waits, so picking a poll interval makes no extra calls
+    expected = expected_run_duration(notebook, rule or None, session=session, scan=0)
+    if expected is None:
+        return None
+    created = desc["CreationTime"]
+    age = datetime.datetime.now(created.tzinfo) - created
+    return max(1, expected - age.total_seconds())
+
+
+def _record_run_duration(desc):
+    notebook, rule = _run_environment(desc)
+    if (
+        notebook
+        and desc["ProcessingJobStatus"] == "Completed"
+        and desc.get("CreationTime") is not None
+        and desc.get("ProcessingEndTime") is not None
+    ):
+        duration = desc["ProcessingEndTime"] - desc["CreationTime"]
+        polling.record_duration(
+            "notebook:{}:{}".format(notebook, rule), duration.total_seconds()
+        )
+
+
+# Output notebooks larger than this are downloaded in parts with concurrent ranged GETs.
+DOWNLOAD_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10,
+)
+
+
+class DownloadException(OSError):
+    pass
+
+
+def file_mismatch(filename, head):
+    """Compare a local file with the HeadObject result for an S3 object.
+
+    Returns:
+      None if the file has the object's size and, when the object's ETag is its MD5, the same MD5. Otherwise
+      a description of the difference.
+    """
+    size = os.path.getsize(filename)
+    if size != head["ContentLength"]:
+        return "{} bytes but expected {}".format(size, head["ContentLength"])
+    etag = head.get("ETag", "").strip('"')
+    # Multipart uploads and SSE-KMS objects don't have the MD5 as their ETag
+    if (
+        re.fullmatch(r"[0-9a-f]{32}", etag)
+        and head.get("ServerSideEncryption") != "aws:kms"
+    ):
+        md5 = hashlib.md5()
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                md5.update(chunk)
+        if md5.hexdigest() != etag:
+            return "the MD5 doesn't match the ETag"
+    return None
+
+
+def download_object(
+    s3, bucket, key, filename, config=DOWNLOAD_CONFIG, skip_existing=False
+):
+    """Download an S3 object to a local file and check that it arrived intact.
+
+    The object is written to a temporary file next to `filename`, which is only replaced once the size (and
+    the MD5, when the ETag is one) matches the object (see :meth:`file_mismatch`).
+
+    Args:
+      s3: The S3 client to use (required).
+      bucket (str): The bucket of the object (required).
+      key (str): The key of the object (required).
+      filename (str): The file to write (required).
+      config (boto3.s3.transfer.TransferConfig): How to split up large downloads (default: DOWNLOAD_CONFIG).
+      skip_existing (bool): If True, don't download the object if `filename` already matches it (default: False).
+
+    Returns:
+      The number of bytes downloaded, or None if the download was skipped.
+
+    Raises:
+      DownloadException if the file doesn't match the object.
+    """
+    head = retry.call("HeadObject", s3.head_object, Bucket=bucket, Key=key)
+    if (
+        skip_existing
+        and os.path.exists(filename)
+        and file_mismatch(filename, head) is None
+    ):
+        return None
+    extra_args = {"VersionId": head["VersionId"]} if head.get("VersionId") else None
+    tmp = "{}.{}.{}.part".format(filename, os.getpid(), threading.get_ident())
+    try:
+        s3.download_file(bucket, key, tmp, ExtraArgs=extra_args, Config=config)
+        mismatch = file_mismatch(tmp, head)
+        if mismatch is not None:
+            raise DownloadException(
+                "The download of s3://{}/{} is corrupt: {}".format(
+                    bucket, key, mismatch
+                )
+            )
+        os.replace(tmp, filename)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return head["ContentLength"]
+
+
+def download_notebook(job_name, output=".", session=None, client=None, s3=None):
     """Download the output notebook from a previously completed job.
 
     Args:
@@ -267,20 +783,26 @@ def download_notebook(job_name, output=".", session=None):
       output (str): The directory to copy the output file to. (Default: the current working directory)
       session (boto3.Session):
         A boto3 session to use. Will create a default session if not supplied. (Default: None)
+      client: The SageMaker client to describe the job with. Will create one if not supplied. (Default: None)
+      s3: The S3 client to download with. Will create one if not supplied. (Default: None)
 
     Returns:
-      The filename of the downloaded notebook.
+      The filename of the downloaded notebook. Notebooks from runs with the "gzip" output option are
+      downloaded as they are stored, as "<name>.ipynb.gz".
+
+    Raises:
+      botocore.exceptions.ClientError if the notebook can't be downloaded, DownloadException if the download
+      is incomplete.
     """
     session = ensure_session(session)
-    client = session.client("sagemaker")
-    desc = client.describe_processing_job(ProcessingJobName=job_name)
+    client = client or retry.client(session, "sagemaker")
+    s3 = s3 or session.client("s3")
+    desc = describe_job(job_name, session, client)
 
     prefix = desc["ProcessingOutputConfig"]["Outputs"][0]["S3Output"]["S3Uri"]
     notebook = os.path.basename(desc["Environment"]["PAPERMILL_OUTPUT"])
     s3path = "{}/{}".format(prefix, notebook)
 
-    print(prefix, notebook)
-
     if not os.path.exists(output):
         try:
             os.makedirs(output)
@@ -288,11 +810,12 @@ def download_notebook(job_name, output=".", session=None):
             if e.errno != errno.EEXIST:
                 raise
 
-    p1 = Popen(split("aws s3 cp {} {}/".format(s3path, output)))
-    p1.wait()
+    o = urlparse(s3path)
+    local = "{}/{}".format(output.rstrip("/"), notebook)
+    download_object(s3, o.netloc, o.path[1:], local)
 
     print(s3path, output)
-    return "{}/{}".format(output.rstrip("/"), notebook)
+    return local
 
 
 def run_notebook(
@@ -328,7 +851,7 @@ def run_notebook(
     if output_prefix is None:
         output_prefix = get_output_prefix()
 
-    s3path = upload_notebook(notebook, parameters, session)
+    s3path = upload_notebook(notebook, session=session)
 
     job_name = execute_notebook(
         image=image,
@@ -357,49 +880,184 @@ def stop_run(job_name, session=None):
        job_name (string): The name of the job to stop
        session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None)."""
     session = ensure_session(session)
-    client = session.client("sagemaker")
-    client.stop_processing_job(ProcessingJobName=job_name)
+    client = retry.client(session, "sagemaker")
+    retry.call(
+        "StopProcessingJob", client.stop_processing_job, ProcessingJobName=job_name
+    )
+
 
+def describe_runs(
+    n=0,
+    notebook=None,
+    rule=None,
+    session=None,
+    status=None,
+    created_after=None,
+    full=True,
+    max_workers=8,
+):
+    """Returns a generator of descriptions for all the notebook runs, most recent first. See :meth:`describe_run`
+    for details of the description.
 
-def describe_runs(n=0, notebook=None, rule=None, session=None):
-    """Returns a generator of descriptions for all the notebook runs. See :meth:`describe_run` for details of
-    the description.
+    The runs are listed with ListProcessingJobs. With `full=False` and no `notebook` or `rule` filter, the
+    descriptions are built from the listing alone (see :meth:`summarize_run`), so no per-job calls are made.
+    Otherwise each listed job is described in full, `max_workers` at a time, and only as the descriptions are
+    consumed, so stopping early doesn't describe the rest of the page.
 
     Args:
        n (int): The number of runs to return or all runs if 0 (default: 0)
        notebook (str): If not None, return only runs of this notebook (default: None)
        rule (str): If not None, return only runs invoked by this rule (default: None)
        session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
+       status (str): If not None, return only runs with this status, for example "InProgress" (default: None)
+       created_after (datetime or str): If not None, return only runs created after this time (default: None)
+       full (bool): If False, return only the fields in :meth:`summarize_run` when possible (default: True)
+       max_workers (int): The maximum number of jobs to describe concurrently (default: 8)
     """
     session = ensure_session(session)
-    client = session.client("sagemaker")
-    paginator = client.get_paginator("list_processing_jobs")
-    page_iterator = paginator.paginate(NameContains="workflow-")
+    client = retry.client(session, "sagemaker")
+    filtered = notebook is not None or rule is not None
+    need_full = full or filtered
+
+    filters = {"NameContains": "workflow-"}
+    if status is not None:
+        filters["StatusEquals"] = status
+    if created_after is not None:
+        filters["CreationTimeAfter"] = created_after
+
+    executor = None
+    pending = collections.deque()  # the describes started but not yet returned
+    if need_full:
+        get_account(
+            session
+        )  # look up the account for the cache keys before starting threads
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        next_token = None
+        while True:
+            args = {"NextToken": next_token} if next_token else {}
+            page = retry.call(
+                "ListProcessingJobs",
+                client.list_processing_jobs,
+                MaxResults=100,
+                **filters,
+                **args,
+            )
+            items = [
+                item
+                for item in page["ProcessingJobSummaries"]
+                if item["ProcessingJobName"].startswith("workflow-")
+            ]
+            if not need_full:
+                descriptions = map(summarize_run, items)
+            else:
+                if n > 0 and not filtered:
+                    items = items[:n]
+                descriptions = bounded_map(
+                    executor,
+                    lambda item: describe_run(
+                        item["ProcessingJobName"], session=session, client=client
+                    ),
+                    items,
+                    max_workers,
+                    pending,
+                )
+
+            for d in descriptions:
+                if notebook != None and notebook != d["Notebook"]:
+                    continue
+                if rule != None and rule != d["Rule"]:
+                    continue
+                yield d
+
+                if n > 0:
+                    n = n - 1
+                    if n == 0:
+                        return
+            next_token = page.get("NextToken")
+            if not next_token:
+                break
+    finally:
+        if executor is not None:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
 
-    for page in page_iterator:
-        for item in page["ProcessingJobSummaries"]:
-            job_name = item["ProcessingJobName"]
-            if not job_name.startswith("workflow-"):
-                continue
-            d = describe_run(job_name, session)
 
-            if notebook != None and notebook != d["Notebook"]:
-                continue
-            if rule != None and rule != d["Rule"]:
-                continue
-            yield d
+def bounded_map(executor, fn, items, window, pending):
+    """Like `executor.map`, but only starts `window` calls ahead of the results that have been taken.
 
-            if n > 0:
-                n = n - 1
-                if n == 0:
-                    return
+    The futures that have been submitted but not yet returned are kept in the deque `pending`, so that the
+    caller can cancel them if it stops early.
+    """
+    items = iter(items)
+    for item in itertools.islice(items, window):
+        pending.append(executor.submit(fn, item))
+    while pending:
+        future = pending[0]
+        result = future.result()
+        pending.popleft()
+        for item in itertools.islice(items, 1):
+            pending.append(executor.submit(fn, item))
+        yield result
+
+
+def summarize_run(summary):
+    """Describe a notebook run from its entry in ListProcessingJobs, without calling DescribeProcessingJob.
+
+    Args:
+     summary (dict): An element of "ProcessingJobSummaries" from ListProcessingJobs.
+
+    Returns:
+      A dictionary with the "Job", "Status", "Failure", "Created" and "End" keys of :meth:`describe_run`.
+    """
+    status = summary["ProcessingJobStatus"]
+    return {
+        "Job": summary["ProcessingJobName"],
+        "Status": status,
+        "Failure": summary.get("FailureReason") if status == "Failed" else None,
+        "Created": summary["CreationTime"],
+        "End": summary.get("ProcessingEndTime"),
+    }
 
 
-def describe_run(job_name, session=None):
+def describe_job(job_name, session, client, cache=True):
+    """Return the DescribeProcessingJob result for a job, from the local :class:`run_cache.RunCache` if possible.
+
+    Jobs that have finished are only described once. Jobs that are still running are described again after
+    `run_cache.RUN_CACHE_TTL` seconds. The cache is keyed by account, region and job name.
+
+    Args:
+     job_name (str): The name of the processing job (required).
+     session (boto3.Session): The session, used to find the account and region (required).
+     client: The SageMaker client to describe the job with (required).
+     cache (bool): If False, always call DescribeProcessingJob (the result is still cached) (default: True).
+    """
+    store = run_cache()
+    if store is not None:
+        key = "{}:{}:{}".format(get_account(session), session.region_name, job_name)
+        if cache:
+            desc = store.get(key)
+            if desc is not None:
+                return desc
+    desc = retry.call(
+        "DescribeProcessingJob",
+        client.describe_processing_job,
+        ProcessingJobName=job_name,
+    )
+    if store is not None:
+        store.put(key, desc)
+    return desc
+
+
+def describe_run(job_name, session=None, client=None, cache=True):
     """Describe a particular notebook run.
 
     Args:
      job_name (str): The name of the processing job that ran the notebook.
+     session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
+     client: A SageMaker client to use instead of creating one from the session (default: None).
+     cache (bool): If False, don't use a cached description (see :meth:`describe_job`) (default: True).
 
     Returns:
       A dictionary with keys for each element of the job description. For example::
@@ -421,18 +1079,17 @@ def describe_run(job_name, session=None):
        'Role': 'BasicExecuteNotebookRole-us-west-2'}
     """
     session = ensure_session(session)
-    client = session.client("sagemaker")
+    if client is None:
+        client = retry.client(session, "sagemaker")
+
+    desc = describe_job(job_name, session, client, cache)
+    return run_description(desc)
 
-    while True:
-        try:
-            desc = client.describe_processing_job(ProcessingJobName=job_name)
-            break
-        except botocore.exceptions.ClientError as e:
-            if e.response["Error"]["Code"] == "ThrottlingException":
-                time.sleep(1)
-            else:
-                raise e
 
+def run_description(desc):
+    """Build the description of a notebook run returned by :meth:`describe_run` from a DescribeProcessingJob
+    result (or the detail of a processing job state change event, see :mod:`job_events`)."""
+    job_name = desc["ProcessingJobName"]
     status = desc["ProcessingJobStatus"]
     if status == "Completed":
         output_prefix = desc["ProcessingOutputConfig"]["Outputs"][0]["S3Output"][
@@ -492,16 +1149,13 @@ class NewJobs:
             self.next_latest_seen_job = None
         while True:
             args = {"NextToken": next_token} if next_token else {}
-            while True:
-                try:
-                    await asyncio.sleep(0)
-                    result = self.client.list_processing_jobs(MaxResults=30, **args)
-                    break
-                except botocore.exceptions.ClientError as e:
-                    if e.response["Error"]["Code"] == "ThrottlingException":
-                        time.sleep(1)
-                    else:
-                        raise e
+            await asyncio.sleep(0)
+            result = await retry.call_async(
+                "ListProcessingJobs",
+                self.client.list_processing_jobs,
+                MaxResults=30,
+                **args,
+            )
             jobs = result["ProcessingJobSummaries"]
             for job in jobs:
                 if not self.next_latest_seen_job:
@@ -519,62 +1173,194 @@ class NotebookRunTracker:
     NotebookRunTracker keeps track of many recent running jobs and optimizes the number of boto calls
     you're doing to get the status by remembering previous runs and knowing that only in progress jobs can
     change status (and therefore need to be polled).
+
+    The jobs are described on a pool of `max_concurrency` threads, so an update doesn't block the event loop
+    and takes about as long as the slowest describe rather than the sum of them.
+
+    If `events` (a :class:`job_events.JobEvents`) is given, in progress jobs are updated from their state change
+    events and only described every `events.fallback_interval` seconds in case an event was lost.
+
+    The runs are held in a :class:`run_store.RunStore` of `capacity` runs (`tracker.runs`), which can be
+    indexed newest first and queried by notebook, rule and status without describing anything. Each update
+    adds at most `max_jobs` new runs, so the first one only describes the `max_jobs` newest jobs. Older runs
+    are only described when asked for, with :meth:`load_older`.
     """
 
-    # We store the list backwards from how it's viewed outside so that we can just append new jobs on
-    # the end.
-    def __init__(self, max_jobs=20, session=None, log=None):
+    def __init__(
+        self,
+        max_jobs=20,
+        session=None,
+        log=None,
+        max_concurrency=8,
+        events=None,
+        capacity=1000,
+    ):
         self.session = ensure_session(session)
-        self.client = self.session.client("sagemaker")
+        self.client = retry.client(self.session, "sagemaker")
         self.log = log or logging.getLogger(__name__)
         self.max_jobs = max_jobs
+        self.exhausted = False  # whether load_older found the oldest job
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_concurrency
+        )
 
         self.new_jobs = NewJobs(self.client)
-        self.run_list = []
+        self.runs = RunStore(capacity)
         self.in_progress = {}
 
+        self.events = None
+        self.event_updates = {}
+        self.event_lock = threading.Lock()
+        self.last_described = {}
+        if events is not None:
+            self.follow(events)
+
+    def follow(self, events):
+        """Update in progress jobs from the state change events of `events` (a :class:`job_events.JobEvents`)
+        from now on, rather than describing them on every update"""
+        self.events = events
+        events.subscribe(self.on_event)
+
+    def on_event(self, detail):
+        """Remember a job state change event to apply on the next update (called on the event source's thread)"""
+        with self.event_lock:
+            self.event_updates[detail["ProcessingJobName"]] = detail
+
     def __getitem__(self, item):
-        return self.run_list[::-1][item]
+        return self.runs[item]
 
     def __len__(self):
-        return len(self.run_list)
+        return len(self.runs)
+
+    def __iter__(self):
+        return iter(self.runs)
+
+    async def describe_all(self, job_names):
+        """Describe the jobs on the tracker's thread pool and return the descriptions in the same order"""
+        if not job_names:
+            return []
+        # The account lookup uses the session, which isn't thread safe, so do it (or hit its cache) here
+        get_account(self.session)
+        loop = asyncio.get_event_loop()
+        return await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    self.executor,
+                    lambda job_name=job_name: describe_run(
+                        job_name, session=self.session, client=self.client
+                    ),
+                )
+                for job_name in job_names
+            ]
+        )
 
     async def update_list(self):
-        list_count = 0
-        new_runs = []
+        job_names = []
         async for job in self.new_jobs.get_new():
             job_name = job["ProcessingJobName"]
             if not job_name.startswith("workflow-"):
                 continue
-            await asyncio.sleep(0)
-            self.log.debug(f"Describing new job: {job_name}")
-            desc = describe_run(job_name, session=self.session)
-            new_runs.append(desc)
+            job_names.append(job_name)
+            if len(job_names) >= self.max_jobs:
+                break
+        self.log.debug(f"Describing {len(job_names)} new jobs")
+        new_runs = await self.describe_all(job_names)
+        now = time.monotonic()
+        for desc in new_runs:
             if desc["Status"] == "InProgress" or desc["Status"] == "Stopping":
-                self.in_progress[job_name] = desc
-            list_count += 1
-            if list_count >= self.max_jobs:
+                self.in_progress[desc["Job"]] = desc
+                self.last_described[desc["Job"]] = now
+        # The jobs are listed newest first and the store is newest last
+        for desc in reversed(new_runs):
+            evicted = self.runs.add(desc)
+            if evicted is not None:
+                self.in_progress.pop(evicted["Job"], None)
+                self.last_described.pop(evicted["Job"], None)
+
+    async def load_older(self, n):
+        """Add up to `n` runs older than the oldest in the store (as long as there is room for them).
+
+        Returns:
+          The number of runs added. Fewer than `n` means the oldest job has been reached (`exhausted`) or
+          the store is full.
+        """
+        oldest = self.runs.oldest()
+        n = min(n, self.runs.capacity - len(self.runs))
+        if n <= 0 or self.exhausted or oldest is None:
+            return 0
+        job_names = []
+        next_token = None
+        while len(job_names) < n:
+            args = {"NextToken": next_token} if next_token else {}
+            page = await retry.call_async(
+                "ListProcessingJobs",
+                self.client.list_processing_jobs,
+                NameContains="workflow-",
+                # Before is exclusive, so include the oldest run's second and skip the runs already held
+                CreationTimeBefore=oldest["Created"] + datetime.timedelta(seconds=1),
+                MaxResults=100,
+                **args,
+            )
+            for job in page["ProcessingJobSummaries"]:
+                job_name = job["ProcessingJobName"]
+                if job_name.startswith("workflow-") and job_name not in self.runs:
+                    job_names.append(job_name)
+            next_token = page.get("NextToken")
+            if not next_token:
+                self.exhausted = len(job_names) <= n
                 break
-        self.run_list.extend(new_runs[::-1])
-        if len(self.run_list) > self.max_jobs:
-            trimlen = len(self.run_list) - self.max_jobs
-            for r in self.run_list[:trimlen]:
-                if r["Status"] == "InProgress" or r["Status"] == "Stopping":
-                    if r["Job"] in self.in_progress:
-                        del self.in_progress[r["Job"]]
-            self.run_list = self.run_list[trimlen:]
+        job_names = job_names[:n]
+        self.log.debug(f"Describing {len(job_names)} older jobs")
+        older_runs = await self.describe_all(job_names)
+        now = time.monotonic()
+        added = 0
+        for desc in older_runs:
+            if self.runs.add_oldest(desc):
+                added += 1
+                if desc["Status"] == "InProgress" or desc["Status"] == "Stopping":
+                    self.in_progress[desc["Job"]] = desc
+                    self.last_described[desc["Job"]] = now
+        return added
+
+    def _due(self, job, now):
+        """Whether an in progress job needs to be described, rather than waiting for its events"""
+        if self.events is None:
+            return True
+        return now - self.last_described.get(job, 0) >= self.events.fallback_interval
 
     async def update_in_progress(self):
+        with self.event_lock:
+            event_updates = self.event_updates
+            self.event_updates = {}
+        now = time.monotonic()
+        in_progress = []
+        new_descs = []
+        described = []
         for job, desc in list(self.in_progress.items()):
-            await asyncio.sleep(0)
-            self.log.debug(f"Describing in progress job: {job}")
-            new_desc = describe_run(job, session=self.session)
-            desc["Status"] = new_desc["Status"]
-            desc["Failure"] = new_desc["Failure"]
-            desc["Start"] = new_desc["Start"]
-            desc["End"] = new_desc["End"]
-            desc["Elapsed"] = new_desc["Elapsed"]
-            desc["Result"] = new_desc["Result"]
+            detail = event_updates.get(job)
+            if detail is not None and "ProcessingOutputConfig" in detail:
+                in_progress.append((job, desc))
+                new_descs.append(run_description(detail))
+            elif detail is not None or self._due(job, now):
+                # An event without the full description still means that the job changed
+                described.append((job, desc))
+        self.log.debug(f"Describing {len(described)} in progress jobs")
+        new_descs.extend(await self.describe_all([job for job, _ in described]))
+        for job, _ in described:
+            self.last_described[job] = now
+        in_progress.extend(described)
+
+        for i, (job, desc) in enumerate(in_progress):
+            new_desc = new_descs[i]
+            self.runs.update(
+                job,
+                Status=new_desc["Status"],
+                Failure=new_desc["Failure"],
+                Start=new_desc["Start"],
+                End=new_desc["End"],
+                Elapsed=new_desc["Elapsed"],
+                Result=new_desc["Result"],
+            )
 
             if not (
                 new_desc["Status"] == "InProgress" or new_desc["Status"] == "Stopping"
@@ -583,49 +1369,181 @@ class NotebookRunTracker:
                     job in self.in_progress
                 ):  # because of the asyncio it's posssible for us to race here
                     del self.in_progress[job]
+                self.last_described.pop(job, None)
 
     async def update(self):
         await self.update_list()
         await self.update_in_progress()
 
 
-def list_runs(n=0, notebook=None, rule=None, session=None):
+def list_runs(
+    n=0,
+    notebook=None,
+    rule=None,
+    session=None,
+    status=None,
+    created_after=None,
+    full=True,
+):
     """Returns a pandas data frame of the runs, with the most recent at the top.
 
+    With `full=False` (and no `notebook` or `rule` filter) the data frame only has the columns of
+    :meth:`summarize_run`, built from the job listing without describing each job.
+
     Args:
         n (int): The number of runs to return or all runs if 0 (default: 0)
         notebook (str): If not None, return only runs of this notebook (default: None)
         rule (str): If not None, return only runs invoked by this rule (default: None)
         session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
+        status (str): If not None, return only runs with this status, for example "InProgress" (default: None)
+        created_after (datetime or str): If not None, return only runs created after this time (default: None)
+        full (bool): If False, return only the columns in :meth:`summarize_run` when possible (default: True)
     """
     import pandas as pd  # pylint: disable=import-error
 
-    df = pd.DataFrame(describe_runs(n=n, notebook=notebook, rule=rule, session=session))
-    df["Parameters"] = df["Parameters"].map(expand_params)
+    df = pd.DataFrame(
+        describe_runs(
+            n=n,
+            notebook=notebook,
+            rule=rule,
+            session=session,
+            status=status,
+            created_after=created_after,
+            full=full,
+        )
+    )
+    if "Parameters" in df:
+        df["Parameters"] = df["Parameters"].map(expand_params)
     return df
 
 
-def download_all(lis, output=".", session=None):
+def download_all(
+    lis, output=".", session=None, max_workers=8, skip_existing=True, progress=False
+):
     """Download each of the output notebooks from a list previously completed jobs.
 
+    The jobs are described (using the cached descriptions, see :meth:`describe_job`) and downloaded
+    `max_workers` at a time. For the result of each download, use :meth:`download_outputs`.
+
     Args:
       lis (list, pandas.Series, or pandas.DataFrame): A list of jobs or a pandas DataFrame with a "Job" column (as returned by :meth:`list_runs`). (Required)
       output (str): The directory to copy the output files to. (Default: the current working directory)
       session (boto3.Session):
         A boto3 session to use. Will create a default session if not supplied. (Default: None)
+      max_workers (int): The number of notebooks to download at once. (Default: 8)
+      skip_existing (bool): If True, don't download notebooks that are already in `output` with the same
+        size and MD5. (Default: True)
+      progress (bool): If True, print the result of each download and the overall throughput. (Default: False)
 
     Returns:
       The list of the filenames of the downloaded notebooks.
+
+    Raises:
+      The error of the first job in `lis` whose download failed, once all the downloads have finished.
     """
-    import pandas as pd  # pylint: disable=import-error
+    results = download_outputs(
+        lis,
+        output=output,
+        session=session,
+        max_workers=max_workers,
+        skip_existing=skip_existing,
+        progress=progress,
+        raise_errors=True,
+    )
+    return [r["Output"] for r in results]
+
 
-    if isinstance(lis, pd.DataFrame):
-        lis = list(lis["Job"])
-    elif isinstance(lis, pd.Series):
-        lis = list(lis)
+def download_outputs(
+    lis,
+    output=".",
+    session=None,
+    max_workers=8,
+    skip_existing=True,
+    progress=False,
+    raise_errors=False,
+):
+    """Download the output notebooks of many jobs concurrently. Takes the same arguments as :meth:`download_all`,
+    and `raise_errors`: if True, raise the error of the first failed download once they have all finished
+    (default: False).
+
+    Returns:
+      A list with a dictionary for each job, in order, with the keys "Job", "Output" (the local file, or None
+      if the download failed), "Result" ("downloaded", "skipped" or "failed"), "Bytes" (the number
+      downloaded), "Seconds" and "Error" (why the download failed, or None).
+    """
+    if not isinstance(lis, list):
+        import pandas as pd  # pylint: disable=import-error
+
+        if isinstance(lis, pd.DataFrame):
+            lis = list(lis["Job"])
+        else:
+            lis = list(lis)
 
     session = ensure_session(session)
-    return [download_notebook(job, output, session) for job in lis]
+    client = retry.client(session, "sagemaker")
+    s3 = session.client("s3")
+    get_account(
+        session
+    )  # look up the account for the cache keys before starting threads
+    os.makedirs(output, exist_ok=True)
+    errors = {}  # job name -> the exception its download failed with
+
+    def download(job_name):
+        start = time.monotonic()
+        result = dict(Job=job_name, Output=None, Result="failed", Bytes=0, Error=None)
+        try:
+            desc = run_description(describe_job(job_name, session, client))
+            if desc["Result"] is None:
+                raise DownloadException(
+                    "Job {} has no output notebook ({})".format(
+                        job_name, desc["Status"]
+                    )
+                )
+            o = urlparse(desc["Result"])
+            local = os.path.join(output, os.path.basename(o.path))
+            size = download_object(
+                s3, o.netloc, o.path[1:], local, skip_existing=skip_existing
+            )
+            result["Output"] = local
+            result["Result"] = "skipped" if size is None else "downloaded"
+            result["Bytes"] = size or 0
+        except (botocore.exceptions.ClientError, OSError) as e:
+            result["Error"] = str(e)
+            errors[job_name] = e
+        result["Seconds"] = time.monotonic() - start
+        if progress:
+            print(
+                "{}: {}".format(
+                    job_name,
+                    result["Error"] if result["Error"] else result["Result"],
+                )
+            )
+        return result
+
+    start = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(download, lis))
+    elapsed = time.monotonic() - start
+
+    if progress:
+        counts = {
+            name: sum(r["Result"] == name for r in results)
+            for name in ["downloaded", "skipped", "failed"]
+        }
+        total = sum(r["Bytes"] for r in results)
+        print(
+            "Downloaded {downloaded}, skipped {skipped} and failed {failed} notebooks".format(
+                **counts
+            ),
+            "({:.1f} MB in {:.1f}s, {:.2f} MB/s)".format(
+                total / 1e6, elapsed, total / 1e6 / elapsed if elapsed else 0
+            ),
+        )
+    if raise_errors:
+        for r in results:
+            if r["Error"] is not None:
+                raise errors[r["Job"]]
+    return results
 
 
 def ensure_session(session=None, region: Literal["ap-southeast-2", "us-east-1"] = None):
@@ -660,9 +1578,7 @@ def create_lambda(
         created = True
         # time.sleep(30) # wait for eventual consistency, we hope
 
-    if "/" not in role:
-        account = session.client("sts").get_caller_identity()["Account"]
-        role = "arn:aws:iam::{}:role/{}".format(account, role)
+    role = resolve_role(role, session)
 
     code_bytes = zip_bytes(code_file)
 
@@ -727,7 +1643,11 @@ def create_lambda_role(name="run-notebook", session=None):
         "Statement": [
             {
                 "Effect": "Allow",
-                "Action": ["sagemaker:CreateProcessingJob", "iam:PassRole"],
+                "Action": [
+                    "sagemaker:CreateProcessingJob",
+                    "sagemaker:DescribeProcessingJob",
+                    "iam:PassRole",
+                ],
                 "Resource": "*",
             }
         ],
@@ -772,6 +1692,9 @@ def invoke(
     role=None,
     instance_type="ml.m5.large",
     extra_fns=[],
+    mode="lambda",
+    compression=None,
+    output_options=None,
     session=None,
 ):
     """Run a notebook in SageMaker Processing producing a new output notebook.
@@ -781,6 +1704,14 @@ def invoke(
     the Lambda function does without waiting for the notebook execution. To wait for the job and download the
     results, see :meth:`wait_for_complete` and :meth:`download_notebook`.
 
+    With `mode="direct"`, the processing job is created with SageMaker directly from this process instead of
+    going through the Lambda function. The job is identical, but the caller's credentials need the
+    `sagemaker:CreateProcessingJob`, `sagemaker:DescribeProcessingJob` and `iam:PassRole` permissions.
+
+    With `mode="async"`, the Lambda function is invoked asynchronously and this returns the job name (the
+    "job_id" parameter) as soon as Lambda has queued the event. Errors creating the job are then only
+    visible in the function's logs, so use :meth:`confirm_run` if you need to know that the job started.
+
     To add extra arguments to the SageMaker Processing job, you can use the `extra_fns` argument. Each element of
     that list is a function that takes a dict and returns a dict with new fields added. For example::
 
@@ -801,35 +1732,68 @@ def invoke(
                           taken as a local file to upload (default: None).
         output_prefix (str): The prefix path in S3 for where to store the output notebook
                              (default: determined based on SageMaker Python SDK).
+        upload_parameters (bool): If True, upload the parameters to S3 and pass the job only their location
+                                  (as "S3_PATH"). Use this for parameters too large for the job's environment (default: False).
         parameters (dict): The dictionary of parameters to pass to the notebook (default: {}).
         role (str): The name of a role to use to run the notebook. This can be a name local to the account or a full ARN
                     (default: calls get_execution_role() or uses "BasicExecuteNotebookRole-<region>" if there's no execution role).
         instance_type (str): The SageMaker instance to use for executing the job (default: ml.m5.large).
         extra_fns (list of functions): The list of functions to amend the extra arguments for the processing job.
+        mode (str): How to start the job, "lambda" to call the installed Lambda function, "async" to queue an
+                    event for it without waiting or "direct" to call SageMaker from this process (default: "lambda").
+        compression (str): With `upload_parameters`, compress the uploaded parameters with "gzip" or "zstd"
+                           (default: None, uncompressed).
+        output_options (dict): How the container post-processes the output notebook, for example
+                               `{"gzip": True, "externalize": 100000, "summary": True}`
+                               (see :meth:`lambda_function.build_processing_args`) (default: None).
         session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
 
     Returns:
         The name of the processing job created to run the notebook.
     """
     session = ensure_session(session, region)
+    submit = submitter(mode, session, environment)
 
-    if "/" not in image:
-        account = session.client("sts").get_caller_identity()["Account"]
-        region = session.region_name
+    args = prepare_invoke(
+        notebook=notebook,
+        image=image,
+        input_path=input_path,
+        output_prefix=output_prefix,
+        upload_parameters=upload_parameters,
+        parameters=parameters,
+        role=role,
+        instance_type=instance_type,
+        extra_fns=extra_fns,
+        compression=compression,
+        output_options=output_options,
+        session=session,
+    )
+    return submit(args)
 
-        image = "{}.dkr.ecr.{}.amazonaws.com/{}".format(account, region, image)
-        if ":" not in image:
-            image = image + ":latest"
 
-    if not role:
-        try:
-            role = get_execution_role(session)
-        except ValueError:
-            role = "BasicExecuteNotebookRole-{}".format(session.region_name)
+def prepare_invoke(
+    notebook=None,
+    image="sagemaker-run-notebook",
+    input_path=None,
+    output_prefix=None,
+    upload_parameters=False,
+    parameters={},
+    role=None,
+    instance_type="ml.m5.large",
+    extra_fns=[],
+    compression=None,
+    output_options=None,
+    session=None,
+):
+    """Do the client side work of :meth:`invoke` and return the event for the Lambda function.
+
+    This resolves the image and role, uploads the notebook (and the parameters if `upload_parameters` is True)
+    and applies the `extra_fns`. The result is a JSON serializable dict that can be passed to a function from
+    :meth:`submitter` to start the run, now or later. See :meth:`invoke` for the arguments.
+    """
+    session = ensure_session(session)
 
-    if "/" not in role:
-        account = session.client("sts").get_caller_identity()["Account"]
-        role = "arn:aws:iam::{}:role/{}".format(account, role)
+    image, role = resolve_image_and_role(image, role, session)
 
     if notebook:
         notebook_dir = os.path.dirname(notebook)
@@ -855,17 +1819,19 @@ def invoke(
             notebook = os.path.basename(notebook)
     # else:
     #     notebook = input_path
-    notebook_name = f"{parameters['job_id']}.ipynb"
-    params_name = f"{parameters['job_id']}.json"
+    params_hash = parameters_hash(parameters)
+    params_name = params_file_name(parameters["job_id"], params_hash)
 
     if upload_parameters:
         parameters = {
-            "S3_PATH": upload_json(parameters, params_name, session),
+            "S3_PATH": upload_json(
+                parameters, params_name, session, compression=compression
+            ),
             "job_id": parameters["job_id"],
         }
 
     if input_path is None:
-        input_path = upload_notebook(notebook, notebook_name, session)
+        input_path = upload_notebook(notebook, session=session)
     if output_prefix is None:
         output_prefix = get_output_prefix()
 
@@ -882,16 +1848,159 @@ def invoke(
         "role": role,
         "instance_type": instance_type,
         "extra_args": extra_args,
+        "params_hash": params_hash,
+        "output_options": output_options,
     }
 
-    client = session.client("lambda")
+    return args
+
+
+SUBMIT_MODES = ["lambda", "direct", "async"]
+
+
+def submitter(mode, session, environment="sandbox", policy=None):
+    """Return a function that starts a notebook run and returns the processing job name.
+
+    The function takes the Lambda event built by :meth:`invoke`. With `mode="lambda"` it calls the installed
+    Lambda function. With `mode="async"` it queues the event for the Lambda function without waiting for it.
+    With `mode="direct"` it builds the same request with :meth:`build_processing_args` and
+    calls SageMaker itself. The clients are created up front, so the function can be called from several threads.
+
+    Runs are idempotent on their "job_id": submitting a job_id again with the same parameters returns the
+    existing job instead of starting another one. Recent submissions are remembered locally
+    (see :meth:`recent_submission`), so repeats within `SUBMISSION_TTL` seconds don't call AWS at all.
+
+    Throttled calls are retried with `policy`, a :class:`retry.RetryPolicy` (default: the default policy).
+    Callers that back off themselves can pass `retry.RetryPolicy(max_attempts=1)` to make a single attempt.
+    """
+    if mode == "lambda" or mode == "async":
+        client = retry.client(session, "lambda")
+        wait = mode == "lambda"
+        submit = lambda args: invoke_lambda(
+            client, args, environment, wait=wait, policy=policy
+        )
+    elif mode == "direct":
+        client = retry.client(session, "sagemaker")
+        region = session.region_name
+        submit = lambda args: create_processing_job(
+            client, build_processing_args(**args, region=region), policy=policy
+        )
+    else:
+        raise ValueError(
+            "Unknown submission mode '{}', must be one of {}".format(
+                mode, ", ".join(SUBMIT_MODES)
+            )
+        )
+
+    def submit_once(args):
+        job_id = args["parameters"]["job_id"]
+        params_hash = args.get("params_hash") or parameters_hash(args["parameters"])
+        job_name = recent_submission(job_id, params_hash)
+        if job_name is None:
+            job_name = submit(args)
+            record_submission(job_id, params_hash, job_name)
+        return job_name
+
+    return submit_once
+
+
+# How long, in seconds, a submitted job_id is remembered locally.
+SUBMISSION_TTL = 10 * 60
+
+_submissions = {}
+_submissions_lock = threading.Lock()
+
+
+def recent_submission(job_id, params_hash):
+    """Return the job name if `job_id` was submitted from this process in the last `SUBMISSION_TTL` seconds.
+
+    Raises:
+        InvokeException: If `job_id` was submitted recently with different parameters.
+    """
+    with _submissions_lock:
+        entry = _submissions.get(job_id)
+        if entry is None or entry[0] <= time.time():
+            return None
+    if entry[1] != params_hash:
+        raise InvokeException(
+            "Job {} was already submitted with different parameters".format(job_id)
+        )
+    return entry[2]
+
+
+def record_submission(job_id, params_hash, job_name):
+    with _submissions_lock:
+        now = time.time()
+        for k in [k for k, v in _submissions.items() if v[0] <= now]:
+            del _submissions[k]
+        _submissions[job_id] = (now + SUBMISSION_TTL, params_hash, job_name)
+
+
+def clear_submission_cache():
+    """Forget the recent submissions, so that the next submission of each job_id checks with AWS"""
+    with _submissions_lock:
+        _submissions.clear()
+
 
-    result = client.invoke(
+def resolve_image_and_role(image, role, session, tag="latest"):
+    """Expand a bare image name and role name into a full ECR image URI and IAM role ARN.
+
+    The account lookups are cached (see :meth:`utils.get_caller_identity`), so this only calls STS and IAM
+    the first time it is used with a session's credentials.
+
+    Args:
+        image (str): The ECR image name, either local to the account or a full URI (required).
+        role (str): The name of a role local to the account, a full ARN or None to use the
+                    execution role (or "BasicExecuteNotebookRole-<region>" if there's no execution role).
+        session (boto3.Session): The boto3 session to use (required).
+        tag (str): The image tag to use if `image` doesn't have one (default: "latest").
+
+    Returns:
+        A tuple with the image URI and the role ARN.
+    """
+    image = resolve_image(image, session, tag=tag)
+
+    if not role:
+        try:
+            role = get_execution_role(session)
+        except ValueError:
+            role = "BasicExecuteNotebookRole-{}".format(session.region_name)
+
+    return image, resolve_role(role, session)
+
+
+def invoke_lambda(client, args, environment="sandbox", wait=True, policy=None):
+    """Call the installed Lambda function with the processing job arguments and return the job name.
+
+    Args:
+        client (botocore.client.Lambda): The Lambda client to make the call with (required).
+        args (dict): The event for the Lambda function, as built by :meth:`invoke` (required).
+        environment (str): The environment suffix of the Lambda function (default: "sandbox").
+        wait (bool): If True, wait for the function to create the job. If False, queue the event for the function
+                     and return the job name from the "job_id" parameter straight away (default: True).
+        policy (retry.RetryPolicy): How to retry throttled calls (default: the default policy).
+
+    Returns:
+        The name of the processing job created to run the notebook.
+    """
+    policy = policy or retry.default_policy
+    result = policy.call(
+        "Invoke",
+        client.invoke,
         FunctionName=f"{lambda_function_name}-{environment}",
-        InvocationType="RequestResponse",
+        InvocationType="RequestResponse" if wait else "Event",
         LogType="None",
         Payload=json.dumps(args).encode("utf-8"),
     )
+    if not wait:
+        if result["StatusCode"] != 202:
+            raise InvokeException(
+                "Lambda function didn't accept the event (status {})".format(
+                    result["StatusCode"]
+                )
+            )
+        return args["parameters"]["job_id"]
+
     payload = json.loads(result["Payload"].read())
     if "errorMessage" in payload:
         raise InvokeException(payload["errorMessage"])
@@ -900,6 +2009,192 @@ def invoke(
     return job
 
 
+def confirm_run(job_name, timeout=60, sleep_time=1, session=None):
+    """Wait for a processing job started with `mode="async"` to exist and return its status.
+
+    Args:
+        job_name (str): The name of the processing job, as returned by :meth:`invoke` (required).
+        timeout (int): The number of seconds to wait for the job to appear (default: 60).
+        sleep_time (int): The number of seconds between checks (default: 1).
+        session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
+
+    Returns:
+        The job status, for example "InProgress".
+
+    Raises:
+        InvokeException: If the job doesn't exist after `timeout` seconds.
+    """
+    session = ensure_session(session)
+    client = retry.client(session, "sagemaker")
+    deadline = time.time() + timeout
+    while True:
+        try:
+            desc = retry.call(
+                "DescribeProcessingJob",
+                client.describe_processing_job,
+                ProcessingJobName=job_name,
+            )
+            return desc["ProcessingJobStatus"]
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] != "ValidationException":
+                raise
+        if time.time() >= deadline:
+            raise InvokeException(
+                "Processing job {} wasn't created within {} seconds".format(
+                    job_name, timeout
+                )
+            )
+        time.sleep(sleep_time)
+
+
+def default_job_id(notebook, index=None):
+    """Build a processing job name for a run of the notebook that doesn't have a `job_id` parameter.
+
+    The name has the form "workflow-<notebook>-<timestamp>[-<index>]" so that :meth:`describe_runs` picks it up.
+    """
+    nb_name = os.path.splitext(os.path.basename(notebook or "notebook"))[0]
+    timestamp = time.strftime("%Y-%m-%d-%H-%M-%S", time.gmtime())
+    suffix = timestamp if index is None else f"{timestamp}-{index}"
+    nb_name = re.sub(r"[^-a-zA-Z0-9]", "-", nb_name)[
+        : 62 - len("workflow-") - len(suffix)
+    ]
+    return f"workflow-{nb_name}-{suffix}"
+
+
+def invoke_many(
+    parameters_list,
+    notebook=None,
+    image="sagemaker-run-notebook",
+    environment: Literal["sandbox", "development", "production"] = "sandbox",
+    region: Literal["ap-southeast-2", "us-east-1"] = "ap-southeast-2",
+    input_path=None,
+    output_prefix=None,
+    upload_parameters=False,
+    role=None,
+    instance_type="ml.m5.large",
+    extra_fns=[],
+    mode="lambda",
+    max_workers=8,
+    compression=None,
+    shared_parameters=False,
+    output_options=None,
+    session=None,
+):
+    """Run the same notebook once for each set of parameters in SageMaker Processing.
+
+    This is the batch version of :meth:`invoke`. The image, role and output prefix are resolved once and a local
+    notebook is uploaded once for the whole batch. The runs are then submitted (through the Lambda function or
+    directly, depending on `mode`) from a bounded pool of threads. A failure to submit one run is recorded in its result and doesn't stop the others.
+    For example::
+
+        results = run.invoke_many([{"n": n} for n in range(100)], notebook="powers.ipynb")
+        failed = [r for r in results if r["error"]]
+
+    Args:
+        parameters_list (iterable of dict): The parameters for each run. If a dict has a "job_id" key, it is used
+                                            as the processing job name. Otherwise a name is generated (required).
+        max_workers (int): The maximum number of runs to submit concurrently (default: 8).
+        shared_parameters (bool): With `upload_parameters`, upload the parameters that all runs share once as a
+                                  base object (passed as "S3_BASE_PATH") and only each run's own parameters
+                                  separately (as "S3_PATH"). The container merges them, so this needs a container
+                                  image that understands "S3_BASE_PATH" (default: False).
+
+        See :meth:`invoke` for the other arguments.
+
+    Returns:
+        A list with one dict per run, in the order of `parameters_list`, with the keys "job_name"
+        (the processing job name) and "error" (None if the run was started, otherwise the error message).
+    """
+    session = ensure_session(session, region)
+    submit_one = submitter(mode, session, environment)
+
+    image, role = resolve_image_and_role(image, role, session)
+
+    if input_path is None:
+        input_path = upload_notebook(notebook, session=session)
+    if notebook:
+        notebook = os.path.basename(notebook)
+    else:
+        notebook = os.path.basename(input_path)
+    if output_prefix is None:
+        output_prefix = get_output_prefix()
+
+    extra_args = {}
+    for f in extra_fns:
+        extra_args = f(extra_args)
+
+    # Clients are thread safe, sessions are not, so create everything we need up front.
+    s3 = None
+    if upload_parameters:
+        encode_json({}, compression)  # fail early on an unusable compression
+        s3 = session.client("s3")
+        default_bucket(session)
+    jobs = []
+    for i, parameters in enumerate(parameters_list):
+        parameters = dict(parameters)
+        if not parameters.get("job_id"):
+            parameters["job_id"] = default_job_id(notebook, i)
+        jobs.append(parameters)
+
+    base_path = None
+    uploads = jobs
+    if upload_parameters and shared_parameters and len(jobs) > 1:
+        shared, uploads = split_parameters(jobs)
+        if shared:
+            base_path = upload_shared_json(
+                shared, session, client=s3, compression=compression
+            )
+        else:
+            uploads = jobs
+
+    def submit(i):
+        parameters = jobs[i]
+        job_id = parameters["job_id"]
+        params_hash = parameters_hash(parameters)
+        if upload_parameters:
+            parameters = {
+                "S3_PATH": upload_json(
+                    uploads[i],
+                    params_file_name(job_id, params_hash),
+                    session,
+                    client=s3,
+                    compression=compression,
+                ),
+                "job_id": job_id,
+            }
+            if base_path:
+                parameters["S3_BASE_PATH"] = base_path
+        args = {
+            "image": image,
+            "input_path": input_path,
+            "output_prefix": output_prefix,
+            "notebook": notebook,
+            "parameters": parameters,
+            "role": role,
+            "instance_type": instance_type,
+            "extra_args": copy.deepcopy(extra_args),
+            "params_hash": params_hash,
+            "output_options": output_options,
+        }
+        return submit_one(args)
+
+    results = [None] * len(jobs)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(submit, i): i for i in range(len(jobs))}
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = dict(job_name=future.result(), error=None)
+            except (
+                InvokeException,
+                ValueError,
+                botocore.exceptions.ClientError,
+                botocore.exceptions.BotoCoreError,
+            ) as e:
+                results[i] = dict(job_name=jobs[i]["job_id"], error=str(e))
+    return results
+
+
 RULE_PREFIX = "RunNotebook-"
 
 
@@ -917,6 +2212,7 @@ def schedule(
     role=None,
     instance_type="ml.m5.large",
     extra_fns=[],
+    output_options=None,
     session=None,
 ):
     """Create a schedule for running a notebook in SageMaker Processing.
@@ -961,6 +2257,8 @@ def schedule(
                     (default: calls get_execution_role() or uses "BasicExecuteNotebookRole-<region>" if there's no execution role).
         instance_type (str): The SageMaker instance to use for executing the job (default: ml.m5.large).
         extra_fns (list of functions): The list of functions to amend the extra arguments for the processing job.
+        output_options (dict): How the container post-processes the output notebooks (see :meth:`invoke`)
+                               (default: None).
         session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
     """
     kwargs = {}
@@ -976,24 +2274,12 @@ def schedule(
     # prepend a common prefix to the rule so it's easy to find notebook rules
     prefixed_rule_name = RULE_PREFIX + rule_name
 
-    if "/" not in image:
-        account = session.client("sts").get_caller_identity()["Account"]
-        region = session.region_name
-        image = "{}.dkr.ecr.{}.amazonaws.com/{}".format(account, region, image)
-        if ":" not in image:
-            image = image + f":{environment}-latest"
-    if not role:
-        try:
-            role = get_execution_role(session)
-        except ValueError:
-            role = "BasicExecuteNotebookRole-{}".format(session.region_name)
-
-    if "/" not in role:
-        account = session.client("sts").get_caller_identity()["Account"]
-        role = "arn:aws:iam::{}:role/{}".format(account, role)
+    image, role = resolve_image_and_role(
+        image, role, session, tag=f"{environment}-latest"
+    )
 
     if input_path is None:
-        input_path = upload_notebook(notebook)
+        input_path = upload_notebook(notebook, session=session)
     if output_prefix is None:
         output_prefix = get_output_prefix()
 
@@ -1014,6 +2300,7 @@ def schedule(
         "instance_type": instance_type,
         "extra_args": extra_args,
         "rule_name": rule_name,
+        "output_options": output_options,
     }
 
     events = boto3.client("events")
@@ -1024,7 +2311,7 @@ def schedule(
         **kwargs,
     )
 
-    account = session.client("sts").get_caller_identity()["Account"]
+    account = get_account(session)
     region = session.region_name
     target_arn = "arn:aws:lambda:{}:{}:function:{}".format(
         region, account, f"{lambda_function_name}-{environment}"
@@ -1082,11 +2369,14 @@ def describe_schedules(n=0, rule_prefix=None, session=None):
     rule_prefix = RULE_PREFIX + rule_prefix
 
     session = ensure_session(session)
-    client = session.client("events")
-    paginator = client.get_paginator("list_rules")
-    page_iterator = paginator.paginate(NamePrefix=rule_prefix)
+    client = retry.client(session, "events")
+    next_token = None
 
-    for page in page_iterator:
+    while True:
+        args = {"NextToken": next_token} if next_token else {}
+        page = retry.call(
+            "ListRules", client.list_rules, NamePrefix=rule_prefix, **args
+        )
         for item in page["Rules"]:
             rule_name = item["Name"][len(RULE_PREFIX) :]
             d = describe_schedule(rule_name, item, session)
@@ -1096,6 +2386,9 @@ def describe_schedules(n=0, rule_prefix=None, session=None):
                 n = n - 1
                 if n == 0:
                     return
+        next_token = page.get("NextToken")
+        if not next_token:
+            break
 
 
 def describe_schedule(
@@ -1127,12 +2420,12 @@ def describe_schedule(
     """
     rule_name = RULE_PREFIX + rule_name
     session = ensure_session(session, region)
-    ev = session.client("events")
+    ev = retry.client(session, "events")
 
     if not rule_item:
-        rule_item = ev.describe_rule(Name=rule_name)
+        rule_item = retry.call("DescribeRule", ev.describe_rule, Name=rule_name)
 
-    targets = ev.list_targets_by_rule(Rule=rule_name)
+    targets = retry.call("ListTargetsByRule", ev.list_targets_by_rule, Rule=rule_name)
     if "Targets" in targets and len(targets["Targets"]) > 0:
         target = targets["Targets"][0]
         inp = json.loads(target["Input"])
@@ -0,0 +1,242 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""An in memory store of the most recent notebook run descriptions.
+
+The runs are kept in a ring buffer of fixed capacity, so adding a run and evicting the oldest one don't move
+anything. Each run gets a sequence number when it is added. The buffer is indexed by job name and, for
+filtering, by notebook, rule and status. For example::
+
+    store = RunStore(capacity=1000)
+    store.add(run.describe_run(job_name))
+    store[0]                                     # the newest run
+    store.query(notebook="powers.ipynb", status="Failed", offset=0, limit=50)
+
+Every change to the store bumps `store.version`, and each run remembers the version it last changed at, so
+a client that has seen version `v` can ask for just the runs that changed since (`query(since=v)`), which of
+them were added as the newest (`added_since(v)`) and the runs that were evicted since (`removed_since(v)`).
+Older runs filled in with `add_oldest` don't count as changes, since a client that holds the newest runs
+fetches older ones by position instead.
+"""
+
+import collections
+
+# The fields of a run description that are indexed, and the query arguments that filter on them.
+INDEXED_FIELDS = {"notebook": "Notebook", "rule": "Rule", "status": "Status"}
+
+
+class RunStore:
+    """Holds up to `capacity` run descriptions (see :meth:`run_notebook.describe_run`), newest first.
+
+    Args:
+        capacity (int): The number of runs to keep. Adding a run when the store is full evicts the oldest
+                        (default: 1000).
+    """
+
+    def __init__(self, capacity=1000):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.next_seq = 0  # the sequence number of the next run added
+        self.by_name = {}  # job name -> sequence number
+        self.indexes = {field: {} for field in INDEXED_FIELDS.values()}
+        self.version = 0
+        self.changed = {}  # job name -> the version it last changed at
+        self.added = {}  # job name -> the version it was added as the newest at
+        self.removed = collections.deque(maxlen=capacity)  # (version, job name)
+        self.removed_floor = 0  # removals at or before this version have been forgotten
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def __contains__(self, job_name):
+        return job_name in self.by_name
+
+    def __iter__(self):
+        for seq in range(self.next_seq - 1, self.next_seq - 1 - len(self), -1):
+            yield self.slots[seq % self.capacity]
+
+    def __getitem__(self, item):
+        """The runs by position, where 0 is the newest. Supports slices."""
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("run index out of range")
+        return self.slots[(self.next_seq - 1 - item) % self.capacity]
+
+    def _index(self, seq, desc):
+        for field, index in self.indexes.items():
+            index.setdefault(desc.get(field), set()).add(seq)
+
+    def _unindex(self, seq, desc):
+        for field, index in self.indexes.items():
+            seqs = index.get(desc.get(field))
+            if seqs is not None:
+                seqs.discard(seq)
+                if not seqs:
+                    del index[desc.get(field)]
+
+    def get(self, job_name):
+        """Return the description of the named run, or None if it isn't in the store"""
+        seq = self.by_name.get(job_name)
+        return None if seq is None else self.slots[seq % self.capacity]
+
+    def seq(self, job_name):
+        """Return the sequence number of the named run, or None if it isn't in the store"""
+        return self.by_name.get(job_name)
+
+    def add(self, desc):
+        """Add a run as the newest, or update it if it's already in the store.
+
+        Returns:
+          The description of the run evicted to make room, or None.
+        """
+        if desc["Job"] in self.by_name:
+            self.update(desc["Job"], **desc)
+            return None
+        seq = self.next_seq
+        slot = seq % self.capacity
+        evicted = self.slots[slot]
+        self.version += 1
+        if evicted is not None:
+            self._unindex(seq - self.capacity, evicted)
+            del self.by_name[evicted["Job"]]
+            del self.changed[evicted["Job"]]
+            self.added.pop(evicted["Job"], None)
+            if len(self.removed) == self.removed.maxlen:
+                self.removed_floor = self.removed[0][0]
+            self.removed.append((self.version, evicted["Job"]))
+        self.slots[slot] = desc
+        self.by_name[desc["Job"]] = seq
+        self.changed[desc["Job"]] = self.version
+        self.added[desc["Job"]] = self.version
+        self._index(seq, desc)
+        self.next_seq += 1
+        return evicted
+
+    def add_oldest(self, desc):
+        """Add a run as the oldest, if there is room for it and it isn't in the store already. This is for
+        filling in older runs; it never evicts anything. The run doesn't show up in `query(since=...)` until it
+        changes.
+
+        Returns:
+          True if the run was added.
+        """
+        if desc["Job"] in self.by_name or len(self) >= self.capacity:
+            return False
+        seq = self.next_seq - len(self) - 1
+        self.version += 1
+        self.slots[seq % self.capacity] = desc
+        self.by_name[desc["Job"]] = seq
+        self.changed[desc["Job"]] = 0
+        self._index(seq, desc)
+        return True
+
+    def oldest(self):
+        """Return the description of the oldest run, or None if the store is empty"""
+        return self[-1] if len(self) else None
+
+    def update(self, job_name, **fields):
+        """Change fields of the named run in place, keeping the indexes up to date.
+
+        Returns:
+          The updated description, or None if the run isn't in the store.
+        """
+        seq = self.by_name.get(job_name)
+        if seq is None:
+            return None
+        desc = self.slots[seq % self.capacity]
+        if all(desc.get(k) == v for k, v in fields.items()):
+            return desc
+        self._unindex(seq, desc)
+        desc.update(fields)
+        self._index(seq, desc)
+        self.version += 1
+        self.changed[job_name] = self.version
+        return desc
+
+    def _matches(self, notebook, rule, status):
+        """The sequence numbers of the runs matching the filters, or None if there are no filters"""
+        filters = dict(notebook=notebook, rule=rule, status=status)
+        candidates = [
+            self.indexes[field].get(filters[arg], set())
+            for arg, field in INDEXED_FIELDS.items()
+            if filters[arg] is not None
+        ]
+        if not candidates:
+            return None
+        candidates.sort(key=len)
+        return candidates[0].intersection(*candidates[1:])
+
+    def count(self, notebook=None, rule=None, status=None):
+        """Return the number of runs matching the filters"""
+        matches = self._matches(notebook, rule, status)
+        return len(self) if matches is None else len(matches)
+
+    def query(
+        self,
+        notebook=None,
+        rule=None,
+        status=None,
+        offset=0,
+        limit=None,
+        since=None,
+    ):
+        """Return the runs matching the filters, newest first.
+
+        Args:
+          notebook (str): If not None, return only runs of this notebook (default: None)
+          rule (str): If not None, return only runs invoked by this rule (default: None)
+          status (str): If not None, return only runs with this status (default: None)
+          offset (int): The number of matching runs to skip (default: 0)
+          limit (int): If not None, the most runs to return (default: None)
+          since (int): If not None, return only runs added or changed after this version (default: None)
+        """
+        matches = self._matches(notebook, rule, status)
+        lowest = self.next_seq - len(self)
+        if matches is None:
+            seqs = range(self.next_seq - 1, lowest - 1, -1)
+        else:
+            seqs = sorted(matches, reverse=True)
+        if since is not None:
+            seqs = [
+                s
+                for s in seqs
+                if self.changed[self.slots[s % self.capacity]["Job"]] > since
+            ]
+        end = None if limit is None else offset + limit
+        return [self.slots[s % self.capacity] for s in seqs[offset:end]]
+
+    def added_since(self, since):
+        """Return the names of the runs added as the newest after version `since` that are still in the store"""
+        return [job for job, version in self.added.items() if version > since]
+
+    def removed_since(self, since):
+        """Return the names of the runs evicted after version `since`, oldest first, or None if the store no
+        longer remembers that far back (so the client should fetch everything again)"""
+        if since < self.removed_floor:
+            return None
+        return [job for version, job in self.removed if version > since]
+
+    def clear(self):
+        self.slots = [None] * self.capacity
+        self.by_name.clear()
+        self.changed.clear()
+        self.added.clear()
+        self.removed.clear()
+        for index in self.indexes.values():
+            index.clear()
+        self.version += 1
+        self.removed_floor = self.version
@@ -15,20 +15,30 @@
 Module with all the individual handlers, which call boto commands and return the results to the frontend.
 """
 import asyncio
+import codecs
 import datetime
-import io
+import hashlib
 import json
 from json.decoder import JSONDecodeError
 import os
 from pathlib import Path
 from urllib.parse import urlparse
+import uuid
+import zlib
 
 import boto3
 import botocore.exceptions
 import sagemaker_run_notebook as run
+from sagemaker_run_notebook import polling, retry
+from sagemaker_run_notebook.server_extension.refresher import (
+    refresher_metrics,
+    runs_refresher,
+)
 
 from notebook.utils import url_path_join as ujoin, url2path
 from notebook.base.handlers import APIHandler
+from tornado.iostream import StreamClosedError
+from tornado.web import HTTPError, stream_request_body
 
 
 def convert_times(o):
@@ -132,6 +142,17 @@ class BaseHandler(APIHandler):
             self.finish("JSON parser error: '{}'".format(str(e)))
             return False
 
+    def int_argument(self, name):
+        """Return the named query argument as a non-negative int or None if it's missing. Raises ValueError
+        if it's not a non-negative int."""
+        value = self.get_query_argument(name, None)
+        if value is None or value == "":
+            return None
+        value = int(value)
+        if value < 0:
+            raise ValueError(value)
+        return value
+
     def json_response(self, response):
         """Take an object and return it to the client as a JSON formatted response"""
         self.set_header("Content-Type", "application/json")
@@ -157,30 +178,196 @@ class BaseHandler(APIHandler):
 
 
 class RunsHandler(BaseHandler):
-    _tracker = None
+    # Distinguishes the store versions (in ETags and event ids) of this server process from those of earlier
+    # ones, since the versions start again from 0 when the server restarts.
+    stream_id = uuid.uuid4().hex[:8]
 
-    @classmethod
-    def setTracker(cls, tracker):
-        cls._tracker = tracker
+    # The number of runs returned unless the client gives a limit.
+    DEFAULT_LIMIT = 20
 
     @property
-    def tracker(self):
-        if self._tracker is None:
-            self.setTracker(run.NotebookRunTracker(session=self.session, log=self.log))
-        return self._tracker
+    def refresher(self):
+        """The :class:`RunsRefresher` that keeps the runs up to date in the background"""
+        return runs_refresher(self.session, log=self.log)
 
     async def get(self):
         """
-        Handler for listing the notebook runs.
+        Handler for listing the notebook runs, newest first, from the snapshot kept by the background
+        refresher (see :class:`RunsRefresher`).
+
+        Takes the optional query arguments "status", "notebook" and "rule" to filter the runs, "offset" and
+        "limit" (default: DEFAULT_LIMIT) to page through them, and "since", the "version" from an earlier
+        response, to return only the runs that have changed since (along with the names of those that were
+        added as the newest, in "added", and of the runs that were dropped, in "removed"). Older runs are
+        loaded as the pages reach them, and "more" says whether there may be runs beyond the page.
+        Responses carry an ETag based on the version, so an unchanged list returns 304 Not Modified. A
+        "since" the store can't answer (too old, or newer than its version after a restart of the server)
+        returns all the runs with "reset" set.
         """
         try:
-            await self.tracker.update()
-            runs = list(self.tracker)
-            self.json_response({"runs": runs})
+            offset = self.int_argument("offset") or 0
+            limit = self.int_argument("limit")
+            since = self.int_argument("since")
+            if limit is None and since is None:
+                limit = self.DEFAULT_LIMIT
+        except ValueError:
+            self.error_response(
+                400,
+                "InvalidParameter",
+                "offset, limit and since must be non-negative integers",
+            )
+            return
+        filters = {
+            name: self.get_query_argument(name, None)
+            for name in ["status", "notebook", "rule"]
+        }
+
+        try:
+            store = await self.refresher.current()
+            if limit is not None:
+                await self.refresher.ensure_runs(offset + limit + 1)
         except botocore.exceptions.ClientError as e:
             self.client_error_response(e)
+            return
         except botocore.exceptions.BotoCoreError as e:
             self.botocore_error_response(e)
+            return
+
+        query = self.request.query_arguments
+        etag = '"runs-{}-{}-{}"'.format(
+            self.stream_id,
+            store.version,
+            hashlib.sha1(
+                json.dumps(sorted(query.items()), default=bytes.decode).encode()
+            ).hexdigest()[:12],
+        )
+        self.set_header("Etag", etag)
+        if self.check_etag_header():
+            self.set_status(304)
+            self.finish()
+            return
+
+        response = {"version": store.version}
+        if since is not None:
+            removed = store.removed_since(since) if since <= store.version else None
+            if removed is None:
+                # too far back or from another server process, so start again
+                since = None
+                response["reset"] = True
+                if limit is None:
+                    limit = self.DEFAULT_LIMIT
+            else:
+                response["added"] = store.added_since(since)
+                response["removed"] = removed
+        response["runs"] = store.query(
+            offset=offset, limit=limit, since=since, **filters
+        )
+        response["total"] = store.count(**filters)
+        response["offset"] = offset
+        response["limit"] = limit
+        response["more"] = limit is not None and (
+            response["total"] > offset + limit or self.refresher.can_load_older()
+        )
+        self.json_response(response)
+
+
+class RunsStreamHandler(RunsHandler):
+    """Pushes changes to the notebook runs to the client as server-sent events.
+
+    The stream starts with a "reset" event holding the newest runs (up to the "limit" query argument, default
+    KEEP_RUNS). After that, each refresh that changes anything sends a "delta" event holding the new and
+    changed runs, the names of the runs among them that are new ("added") and the names of the runs that
+    were dropped ("removed"). Each event's id holds the store version, so a client that reconnects with
+    Last-Event-ID (or the "since" query argument) only gets what it missed. If a refresh fails, a "failure"
+    event carries the message.
+    """
+
+    # The number of seconds between keep alive comments when nothing changes.
+    keepalive = 15
+
+    # The number of runs to send in a "reset" event unless the client gives a limit.
+    KEEP_RUNS = RunsHandler.DEFAULT_LIMIT
+
+    async def get(self):
+        try:
+            limit = self.int_argument("limit") or self.KEEP_RUNS
+            since = self.int_argument("since")
+            last_event_id = self.request.headers.get("Last-Event-ID")
+            if last_event_id:
+                stream_id, _, version = last_event_id.partition(":")
+                # Ids from before a restart of the server don't apply to this store
+                since = int(version) if stream_id == self.stream_id else None
+        except ValueError:
+            self.error_response(
+                400, "InvalidParameter", "limit and since must be non-negative integers"
+            )
+            return
+
+        refresher = self.refresher
+        try:
+            store = await refresher.current()
+            await refresher.ensure_runs(limit)
+        except botocore.exceptions.ClientError as e:
+            self.client_error_response(e)
+            return
+        except botocore.exceptions.BotoCoreError as e:
+            self.botocore_error_response(e)
+            return
+
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+        # Don't let proxies hold the events back
+        self.set_header("X-Accel-Buffering", "no")
+        refresher.streams += 1
+        try:
+            error = None
+            while True:
+                version = store.version
+                if since is None or since != version:
+                    self.write_delta(store, since, limit)
+                    since = version
+                if refresher.last_error != error:
+                    error = refresher.last_error
+                    if error is not None:
+                        self.write_event("failure", {"message": error})
+                self.write(": keepalive\n\n")
+                await self.flush()
+                await refresher.wait_for_change(version, self.keepalive)
+        except StreamClosedError:
+            pass
+        finally:
+            refresher.streams -= 1
+
+    def write_delta(self, store, since, limit):
+        removed = None if since is None else store.removed_since(since)
+        if removed is None or since > store.version:
+            more = len(store) > limit or self.refresher.can_load_older()
+            self.write_event(
+                "reset",
+                {
+                    "version": store.version,
+                    "runs": store.query(limit=limit),
+                    "more": more,
+                },
+                store.version,
+            )
+        else:
+            self.write_event(
+                "delta",
+                {
+                    "version": store.version,
+                    "runs": store.query(since=since),
+                    "added": store.added_since(since),
+                    "removed": removed,
+                },
+                store.version,
+            )
+
+    def write_event(self, event, data, id=None):
+        if id is not None:
+            self.write("id: {}:{}\n".format(self.stream_id, id))
+        self.write("event: {}\n".format(event))
+        self.write("data: {}\n\n".format(json.dumps(data, default=convert_times)))
 
 
 class RunHandler(BaseHandler):
@@ -203,27 +390,195 @@ class RunHandler(BaseHandler):
             self.botocore_error_response(e)
 
 
+def strip_outputs(nb, max_bytes):
+    """Remove rich outputs (such as images) larger than `max_bytes` from a notebook and truncate longer text
+    outputs, in place.
+
+    Returns:
+      The number of outputs changed.
+    """
+    changed = 0
+    for cell in nb.get("cells", []):
+        for output in cell.get("outputs", []):
+            if output.get("output_type") == "stream":
+                text = "".join(output.get("text", ""))
+                if len(text) > max_bytes:
+                    output["text"] = text[
+                        :max_bytes
+                    ] + "\n[{} characters truncated]\n".format(len(text) - max_bytes)
+                    changed += 1
+            elif "data" in output:
+                data = output["data"]
+                for mime in list(data):
+                    value = data[mime]
+                    if not isinstance(value, str):
+                        value = (
+                            "".join(value)
+                            if isinstance(value, list)
+                            else json.dumps(value)
+                        )
+                    if len(value) <= max_bytes:
+                        continue
+                    if mime == "text/plain":
+                        data[mime] = value[
+                            :max_bytes
+                        ] + "\n[{} characters truncated]".format(len(value) - max_bytes)
+                    else:
+                        del data[mime]
+                        data.setdefault(
+                            "text/plain",
+                            "[{} output of {} bytes removed]".format(mime, len(value)),
+                        )
+                    changed += 1
+    if changed:
+        nb.setdefault("metadata", {})["sagemaker_run_notebook"] = {
+            "stripped_outputs": changed,
+            "max_output_bytes": max_bytes,
+        }
+    return changed
+
+
 class OutputHandler(BaseHandler):
-    def get(self, job_name):
+    # The number of bytes read from S3 at a time.
+    chunk_size = 1024 * 1024
+
+    async def get(self, job_name):
+        """Return the output notebook of a run, streamed from S3 rather than read into memory.
+
+        By default the response is a JSON object with the keys "notebook", "output_object" and "data" (the
+        notebook as a string). With the query argument "format=raw", the response is the notebook itself,
+        with its S3 location in the X-Output-Object header, and Range requests are supported. With
+        "strip=<bytes>", rich outputs larger than that are removed and longer text outputs are truncated
+        (see :meth:`strip_outputs`), which means reading the whole notebook. Responses are gzip encoded when
+        the client accepts it.
+
+        Notebooks the container stored gzip compressed (".ipynb.gz") are sent as they are to clients that
+        accept gzip and decompressed on the way for others. Range requests aren't supported for them.
+        """
+        raw = self.get_query_argument("format", "json") == "raw"
+        try:
+            strip = self.int_argument("strip")
+        except ValueError:
+            self.error_response(
+                400, "InvalidParameter", "strip must be a non-negative integer"
+            )
+            return
+        byte_range = self.request.headers.get("Range")
+        if not raw or strip is not None:
+            byte_range = None
+
         try:
             d = run.describe_run(job_name, session=self.session)
+            if d["Result"] is None:
+                self.error_response(
+                    404, "NoOutput", f"Job {job_name} has no output notebook"
+                )
+                return
 
             s3obj = d["Result"]
             o = urlparse(s3obj)
-            bucket = o.netloc
-            key = o.path[1:]
-
-            s3 = self.session.resource("s3")
-            obj = s3.Object(bucket, key)  # pylint: disable=no-member
-            data = obj.get()["Body"].read().decode("utf-8")
-
-            response = dict(notebook=d["Notebook"], output_object=s3obj, data=data)
-
-            self.json_response(response)
+            compressed = o.path.endswith(".gz")
+            if compressed:
+                byte_range = None
+            args = dict(Bucket=o.netloc, Key=o.path[1:])
+            if byte_range:
+                args["Range"] = byte_range
+            s3 = retry.client(self.session, "s3")
+            obj = retry.call("GetObject", s3.get_object, **args)
         except botocore.exceptions.ClientError as e:
             self.client_error_response(e)
+            return
         except botocore.exceptions.BotoCoreError as e:
             self.botocore_error_response(e)
+            return
+
+        body = obj["Body"]
+        try:
+            gzipped = not byte_range and "gzip" in self.request.headers.get(
+                "Accept-Encoding", ""
+            )
+            # A compressed notebook can go to the client as it is stored
+            as_stored = not compressed or (gzipped and raw and strip is None)
+
+            if strip is not None:
+                data = await self.read(body, None)
+                if compressed:
+                    data = zlib.decompress(data, 31)
+                nb = json.loads(data)
+                strip_outputs(nb, strip)
+                chunks = self.iter_list([json.dumps(nb).encode("utf-8")])
+            else:
+                chunks = self.iter_body(body)
+                if not as_stored:
+                    chunks = self.decompress(chunks)
+
+            if gzipped:
+                self.set_header("Content-Encoding", "gzip")
+                self.set_header("Vary", "Accept-Encoding")
+            compressor = None
+            if gzipped and not (compressed and as_stored):
+                compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+            if raw:
+                self.set_header("Content-Type", "application/x-ipynb+json")
+                self.set_header("X-Output-Object", s3obj)
+                if not compressed:
+                    self.set_header("Accept-Ranges", "bytes")
+                if "ContentRange" in obj:
+                    self.set_status(206)
+                    self.set_header("Content-Range", obj["ContentRange"])
+                if compressor is None and strip is None and as_stored:
+                    self.set_header("Content-Length", obj["ContentLength"])
+            else:
+                self.set_header("Content-Type", "application/json")
+                chunks = self.json_wrapper(chunks, d["Notebook"], s3obj)
+
+            async for chunk in chunks:
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    self.write(chunk)
+                    await self.flush()
+            if compressor is not None:
+                self.write(compressor.flush())
+            self.finish()
+        except StreamClosedError:
+            pass
+        finally:
+            body.close()
+
+    async def read(self, body, size):
+        """Read from the S3 body on a worker thread, so the IOLoop isn't blocked"""
+        return await asyncio.get_event_loop().run_in_executor(None, body.read, size)
+
+    async def iter_body(self, body):
+        while True:
+            chunk = await self.read(body, self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    async def decompress(self, chunks):
+        """Decompress a gzip compressed body a chunk at a time"""
+        decompressor = zlib.decompressobj(31)
+        async for chunk in chunks:
+            yield decompressor.decompress(chunk)
+        yield decompressor.flush()
+
+    async def iter_list(self, chunks):
+        for chunk in chunks:
+            yield chunk
+
+    async def json_wrapper(self, chunks, notebook, output_object):
+        """Wrap the notebook in the JSON response object, escaping it as a string a chunk at a time"""
+        yield '{{"notebook": {}, "output_object": {}, "data": "'.format(
+            json.dumps(notebook), json.dumps(output_object)
+        ).encode("utf-8")
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        async for chunk in chunks:
+            yield json.dumps(decoder.decode(chunk))[1:-1].encode("utf-8")
+        yield json.dumps(decoder.decode(b"", final=True))[1:-1].encode("utf-8")
+        yield b'"}'
 
 
 class RulesHandler(BaseHandler):
@@ -334,16 +689,114 @@ class InvokeHandler(BaseHandler):
             self.error_response(400, "ValueError", str(ve))
 
 
+@stream_request_body
 class UploadHandler(BaseHandler):
-    def put(self):
+    """Uploads a notebook to S3 as the request body arrives (see :class:`StreamingUpload`), rather than
+    after buffering all of it. Bodies whose Content-Length is over `max_upload_size` are refused with 413.
+    Tornado cuts off chunked bodies once they pass it, answering 400 and closing the connection, which
+    aborts the upload."""
+
+    # The largest notebook accepted, unless SAGEMAKER_RUN_NOTEBOOK_MAX_UPLOAD_SIZE is set.
+    max_upload_size = int(
+        os.environ.get("SAGEMAKER_RUN_NOTEBOOK_MAX_UPLOAD_SIZE", 512 * 1024 * 1024)
+    )
+
+    # The number of parts that can be uploading to S3 while more of the body is received.
+    max_pending_parts = 2
+
+    def initialize(self):
+        super().initialize()
+        self.upload = None
+        self.pending = []
+        self.completing = False
+
+    async def prepare(self):
+        result = super().prepare()
+        if result is not None:
+            await result
+        if self._finished or self.request.method != "PUT":
+            return
+        length = self.request.headers.get("Content-Length")
+        if length is not None and int(length) > self.max_upload_size:
+            raise HTTPError(413, reason="Notebook too large")
+        self.request.connection.set_max_body_size(self.max_upload_size)
+        try:
+            self.upload = run.StreamingUpload(session=self.session)
+        except botocore.exceptions.ClientError as e:
+            self.client_error_response(e)
+        except botocore.exceptions.BotoCoreError as e:
+            self.botocore_error_response(e)
+
+    async def data_received(self, chunk):
+        if self.upload is None:
+            return
+        part = self.upload.update(chunk)
+        if part is None:
+            return
         try:
-            with io.BytesIO(self.request.body) as f:
-                s3object = run.upload_fileobj(f)
+            loop = asyncio.get_event_loop()
+            self.pending.append(
+                loop.run_in_executor(None, self.upload.upload_part, part)
+            )
+            if len(self.pending) > self.max_pending_parts:
+                await self.pending.pop(0)
+        except botocore.exceptions.ClientError as e:
+            await self.abort()
+            self.client_error_response(e)
+        except botocore.exceptions.BotoCoreError as e:
+            await self.abort()
+            self.botocore_error_response(e)
+
+    async def abort(self):
+        """Abandon the upload, if there is one, once its parts have finished uploading"""
+        upload, self.upload = self.upload, None
+        if upload is None:
+            return
+        pending, self.pending = self.pending, []
+        await asyncio.gather(*pending, return_exceptions=True)
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, upload.abort)
+        except (
+            botocore.exceptions.ClientError,
+            botocore.exceptions.BotoCoreError,
+        ) as e:
+            self.log.warning("Failed to abort the upload of %s: %s", upload.key, e)
+
+    def on_connection_close(self):
+        super().on_connection_close()
+        if not self.completing:
+            asyncio.ensure_future(self.abort())
+
+    async def put(self):
+        if self._finished:
+            return  # a part failed to upload and the error has been sent
+        try:
+            await asyncio.gather(*self.pending)
+            self.completing = True  # so a closed connection doesn't abort it
+            s3object = await asyncio.get_event_loop().run_in_executor(
+                None, self.upload.complete
+            )
+            self.upload = None
             self.json_response(dict(s3Object=s3object))
         except botocore.exceptions.ClientError as e:
             self.client_error_response(e)
         except botocore.exceptions.BotoCoreError as e:
             self.botocore_error_response(e)
+        finally:
+            await self.abort()
+
+
+class MetricsHandler(BaseHandler):
+    def get(self):
+        """Return the counts of AWS calls, retries and throttles made by this server, by API, the poll
+        counts of its waits and the timings of the background refreshes of the runs"""
+        self.json_response(
+            {
+                "retries": retry.metrics(),
+                "polls": polling.poll_stats(),
+                "refresher": refresher_metrics(),
+            }
+        )
 
 
 def setup_handlers(web_app):
@@ -355,12 +808,14 @@ def setup_handlers(web_app):
     prefix = "/sagemaker-scheduler/"
     run_handlers = [
         ("runs", RunsHandler),
+        ("runs/stream", RunsStreamHandler),
         ("run/(.+)", RunHandler),
         ("run", InvokeHandler),
         ("schedules", RulesHandler),
         ("schedule/(.+)", RuleHandler),
         ("upload", UploadHandler),
         ("output/(.+)", OutputHandler),
+        ("metrics", MetricsHandler),
     ]
 
     # add the baseurl to our paths
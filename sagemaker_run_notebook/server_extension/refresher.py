@@ -0,0 +1,244 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+"""
+Module that keeps the server's list of notebook runs up to date in the background, so that the handlers
+serve it without calling AWS themselves.
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import time
+
+from tornado.ioloop import PeriodicCallback
+
+import sagemaker_run_notebook as run
+from sagemaker_run_notebook import job_events
+
+# The default number of seconds between refreshes, unless SAGEMAKER_RUN_NOTEBOOK_REFRESH_INTERVAL is set.
+REFRESH_INTERVAL = 10
+
+# Stop refreshing when nobody has asked for the runs for this many seconds.
+IDLE_TIMEOUT = 300
+
+
+class RunsRefresher:
+    """Updates a :class:`NotebookRunTracker` every `interval` seconds on the IOLoop.
+
+    Refreshes only happen while clients are asking for the runs (see :meth:`touch`). Concurrent requests for
+    a refresh share the one in progress.
+
+    Args:
+        session (boto3.Session): The session for the tracker (required).
+        log (logging.Logger): The logger to use (default: this module's logger).
+        interval (float): The number of seconds between refreshes (default: the environment variable
+                          SAGEMAKER_RUN_NOTEBOOK_REFRESH_INTERVAL or REFRESH_INTERVAL).
+        idle_timeout (float): The number of seconds without a request after which refreshing pauses
+                              (default: IDLE_TIMEOUT).
+    """
+
+    def __init__(self, session, log=None, interval=None, idle_timeout=IDLE_TIMEOUT):
+        self.session = session
+        self.log = log or logging.getLogger(__name__)
+        if interval is None:
+            interval = float(
+                os.environ.get(
+                    "SAGEMAKER_RUN_NOTEBOOK_REFRESH_INTERVAL", REFRESH_INTERVAL
+                )
+            )
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.tracker = run.NotebookRunTracker(session=session, log=self.log)
+        self.callback = None
+        self.subscribing = None
+        self.loading = asyncio.Lock()  # one load of older runs at a time
+        self.refreshing = None
+        self.refreshed = asyncio.Event()  # set, and replaced, after each refresh
+        self.last_request = time.monotonic()
+
+        self.refreshes = 0
+        self.failures = 0
+        self.coalesced = 0
+        self.last_refresh = None  # when the last successful refresh finished
+        self.last_duration = None
+        self.total_duration = 0
+        self.max_duration = 0
+        self.last_error = None
+        self.streams = 0  # the number of clients connected to the runs stream
+
+    async def follow_job_events(self, topic_arn):
+        """Have the tracker follow the job state change events published to the SNS topic `topic_arn` (see
+        :meth:`job_events.create_event_topic`). The server subscribes a queue of its own to the topic, on the
+        default executor as it calls SNS and SQS, and deletes the queue when the process exits. Until the
+        subscription is made, or if it fails, the tracker describes the in progress jobs on each refresh."""
+        loop = asyncio.get_event_loop()
+        try:
+            events = await loop.run_in_executor(None, self._subscribe, topic_arn)
+        except Exception as e:  # pylint: disable=broad-except
+            self.log.warning(f"Subscribing to the job events failed: {e}")
+            return
+        self.tracker.follow(events)
+
+    def _subscribe(self, topic_arn):
+        events = job_events.JobEvents()
+        source = job_events.SqsEventSource.subscribe(
+            events, topic_arn, session=self.session, log=self.log
+        ).start()
+        atexit.register(source.stop)
+        return events
+
+    @property
+    def runs(self):
+        """The tracker's :class:`run_store.RunStore`"""
+        return self.tracker.runs
+
+    def start(self):
+        """Start refreshing on the current IOLoop, and following the job state change events if the
+        environment variable SAGEMAKER_RUN_NOTEBOOK_EVENTS_TOPIC names an SNS topic"""
+        if self.callback is None:
+            self.callback = PeriodicCallback(self.tick, self.interval * 1000)
+            self.callback.start()
+        topic_arn = os.environ.get("SAGEMAKER_RUN_NOTEBOOK_EVENTS_TOPIC")
+        if topic_arn and self.subscribing is None:
+            self.subscribing = asyncio.ensure_future(self.follow_job_events(topic_arn))
+
+    def stop(self):
+        if self.callback is not None:
+            self.callback.stop()
+            self.callback = None
+
+    def touch(self):
+        """Note that a client asked for the runs, so refreshing should carry on"""
+        self.last_request = time.monotonic()
+
+    def idle(self):
+        return time.monotonic() - self.last_request > self.idle_timeout
+
+    def staleness(self):
+        """The number of seconds since the last successful refresh, or None if there hasn't been one"""
+        if self.last_refresh is None:
+            return None
+        return time.monotonic() - self.last_refresh
+
+    async def tick(self):
+        if self.idle():
+            return
+        try:
+            await self.refresh()
+        except Exception:  # pylint: disable=broad-except
+            pass  # recorded in the metrics and raised to anyone waiting for it
+
+    def refresh(self):
+        """Refresh the tracker, or join the refresh in progress. Returns a future."""
+        if self.refreshing is not None:
+            self.coalesced += 1
+            return self.refreshing
+        self.refreshing = asyncio.ensure_future(self._refresh())
+        return self.refreshing
+
+    async def _refresh(self):
+        start = time.monotonic()
+        try:
+            await self.tracker.update()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            self.log.warning(f"Refreshing the notebook runs failed: {e}")
+            raise
+        else:
+            self.last_refresh = time.monotonic()
+            self.last_error = None
+        finally:
+            duration = time.monotonic() - start
+            self.refreshes += 1
+            self.last_duration = duration
+            self.total_duration += duration
+            self.max_duration = max(self.max_duration, duration)
+            self.refreshing = None
+            refreshed, self.refreshed = self.refreshed, asyncio.Event()
+            refreshed.set()
+
+    async def current(self):
+        """Return the tracker's store, first waiting for a refresh if it is more than `interval` seconds out
+        of date (for example, after being idle)"""
+        self.touch()
+        staleness = self.staleness()
+        if staleness is None or staleness > self.interval:
+            await self.refresh()
+        return self.runs
+
+    async def ensure_runs(self, n):
+        """Make sure the store holds at least `n` runs, loading older ones if there are any (see
+        :meth:`NotebookRunTracker.load_older`)"""
+        async with self.loading:
+            missing = n - len(self.runs)
+            if missing > 0 and not self.tracker.exhausted:
+                await self.tracker.load_older(missing)
+
+    def can_load_older(self):
+        """Whether there may be runs older than those in the store that it still has room for"""
+        return not self.tracker.exhausted and len(self.runs) < self.runs.capacity
+
+    async def wait_for_change(self, version, timeout):
+        """Wait until the store's version is no longer `version`, for at most `timeout` seconds"""
+        self.touch()
+        deadline = time.monotonic() + timeout
+        while self.runs.version == version:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(self.refreshed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+
+    def metrics(self):
+        """Return the counts and timings of the refreshes"""
+        return dict(
+            interval=self.interval,
+            refreshes=self.refreshes,
+            failures=self.failures,
+            coalesced=self.coalesced,
+            last_duration=self.last_duration,
+            mean_duration=self.total_duration / self.refreshes
+            if self.refreshes
+            else None,
+            max_duration=self.max_duration,
+            staleness=self.staleness(),
+            idle=self.idle(),
+            last_error=self.last_error,
+            streams=self.streams,
+            runs=len(self.runs),
+            version=self.runs.version,
+        )
+
+
+_refresher = None
+
+
+def runs_refresher(session, log=None):
+    """Return the server's :class:`RunsRefresher`, creating and starting it on the first call"""
+    global _refresher
+    if _refresher is None:
+        _refresher = RunsRefresher(session, log=log)
+        _refresher.start()
+    return _refresher
+
+
+def refresher_metrics():
+    """Return the metrics of the server's :class:`RunsRefresher`, or an empty dict if it hasn't been created"""
+    if _refresher is None:
+        return {}
+    return _refresher.metrics()
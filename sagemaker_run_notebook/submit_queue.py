@@ -0,0 +1,380 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Buffer notebook runs in a local queue and start them no faster than SageMaker allows.
+
+Bursts of :meth:`invoke` calls can run past the CreateProcessingJob rate limit or the account's quota of
+concurrent processing jobs, and then fail. A :class:`SubmissionQueue` accepts runs straight away and a drainer
+starts them under a token bucket rate limit and a maximum number of jobs in flight, putting throttled
+runs back on the queue to try again later::
+
+    import sagemaker_run_notebook.submit_queue as sq
+
+    queue = sq.SubmissionQueue(rate=2, max_in_flight=20)
+    queue.start()
+    for n in range(500):
+        queue.enqueue(notebook="powers.ipynb", parameters={"job_id": f"workflow-powers-{n}", "n": n})
+    queue.status("workflow-powers-3")
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+import botocore
+
+from . import retry
+from .run_notebook import (
+    ensure_session,
+    prepare_invoke,
+    submitter,
+    InvokeException,
+)
+
+# The states of a run in the queue
+QUEUED = "Queued"
+SUBMITTING = "Submitting"
+SUBMITTED = "Submitted"
+FAILED = "Failed"
+
+THROTTLING_ERRORS = retry.THROTTLING_ERRORS + ("ResourceLimitExceeded",)
+
+
+def is_throttling_error(e):
+    """Return True if the exception means that the run should be tried again later"""
+    if isinstance(e, botocore.exceptions.ClientError):
+        return e.response.get("Error", {}).get("Code") in THROTTLING_ERRORS
+    if isinstance(e, InvokeException):
+        return any(code in str(e) for code in THROTTLING_ERRORS)
+    return False
+
+
+class TokenBucket:
+    """A token bucket rate limiter that allows `rate` operations per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.last = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def try_take(self):
+        """Take a token if one is available. Returns 0 on success or the number of seconds until one will be."""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def put_back(self):
+        """Return a token that was taken but not used"""
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+
+class SqliteJobQueue:
+    """Stores the queued runs in SQLite, so they survive a restart of the process.
+
+    Use `path=":memory:"` for a queue that only lives as long as the object, for example in tests.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                """CREATE TABLE IF NOT EXISTS runs (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_name TEXT UNIQUE NOT NULL,
+                    request TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    not_before REAL NOT NULL DEFAULT 0,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL)"""
+            )
+            # Anything that was being submitted when the process stopped gets another try
+            self.conn.execute(
+                "UPDATE runs SET state = ? WHERE state = ?", (QUEUED, SUBMITTING)
+            )
+
+    def put(self, job_name, request):
+        """Add a run to the queue. Raises ValueError if the job name is already in the queue."""
+        now = time.time()
+        try:
+            with self.lock, self.conn:
+                self.conn.execute(
+                    "INSERT INTO runs (job_name, request, state, created, updated) VALUES (?, ?, ?, ?, ?)",
+                    (job_name, json.dumps(request), QUEUED, now, now),
+                )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"A run named {job_name} is already in the queue")
+
+    def take(self, now=None):
+        """Mark the oldest run that is ready to go as being submitted and return it, or None if there isn't one."""
+        now = time.time() if now is None else now
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT job_name, request, attempts FROM runs WHERE state = ? AND not_before <= ? ORDER BY seq LIMIT 1",
+                (QUEUED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE runs SET state = ?, attempts = attempts + 1, updated = ? WHERE job_name = ?",
+                (SUBMITTING, now, row[0]),
+            )
+        return dict(job_name=row[0], request=json.loads(row[1]), attempts=row[2] + 1)
+
+    def update(self, job_name, state, error=None, not_before=0):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE runs SET state = ?, error = ?, not_before = ?, updated = ? WHERE job_name = ?",
+                (state, error, not_before, time.time(), job_name),
+            )
+
+    def get(self, job_name):
+        """Return the queue entry for a run as a dict, or None if there is no run with that name"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT job_name, state, attempts, error, created, updated FROM runs WHERE job_name = ?",
+                (job_name,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ["Job", "State", "Attempts", "Error", "Queued", "Updated"]
+        return dict(zip(keys, row))
+
+    def counts(self):
+        """Return the number of runs in each state"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT state, COUNT(*) FROM runs GROUP BY state"
+            ).fetchall()
+        return dict(rows)
+
+
+def processing_quota(instance_type, session=None):
+    """Look up the account's quota of concurrent processing jobs for an instance type in Service Quotas.
+
+    Returns:
+        The quota as an int, or None if it can't be found.
+    """
+    session = ensure_session(session)
+    client = session.client("service-quotas")
+    name = f"{instance_type} for processing job usage"
+    try:
+        paginator = client.get_paginator("list_service_quotas")
+        for page in paginator.paginate(ServiceCode="sagemaker"):
+            for quota in page["Quotas"]:
+                if quota["QuotaName"] == name:
+                    return int(quota["Value"])
+    except botocore.exceptions.ClientError:
+        pass
+    return None
+
+
+class SubmissionQueue:
+    """A queue of notebook runs that are started at a limited rate by a background drainer.
+
+    Args:
+        store (SqliteJobQueue): Where to keep the queued runs (default: an in memory SQLite queue).
+        rate (float): The maximum number of runs to start per second (default: 1).
+        burst (int): The number of runs that can be started at once after a quiet period (default: 1).
+        max_in_flight (int): The maximum number of processing jobs in progress in the account before the
+                             drainer waits. If "quota", it's looked up with :meth:`processing_quota` for
+                             `instance_type`. None means no limit (default: None).
+        instance_type (str): The instance type used to look up the quota (default: "ml.m5.large").
+        mode (str): How runs are started, see :meth:`invoke` (default: "lambda").
+        environment (str): The environment of the Lambda function (default: "sandbox").
+        max_attempts (int): The number of throttled attempts before a run is marked as failed (default: 8).
+        in_flight_interval (float): The number of seconds between counts of the jobs in progress (default: 30).
+        submit (function): A function that starts a run from a Lambda event and returns the job name. Overrides
+                           `mode` and `environment`, which is useful for testing (default: None).
+        session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
+    """
+
+    def __init__(
+        self,
+        store=None,
+        rate=1.0,
+        burst=1,
+        max_in_flight=None,
+        instance_type="ml.m5.large",
+        mode="lambda",
+        environment="sandbox",
+        max_attempts=8,
+        in_flight_interval=30,
+        submit=None,
+        session=None,
+        log=None,
+    ):
+        self.session = ensure_session(session)
+        self.store = store if store is not None else SqliteJobQueue()
+        self.bucket = TokenBucket(rate, burst)
+        if max_in_flight == "quota":
+            max_in_flight = processing_quota(instance_type, self.session)
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.in_flight_interval = in_flight_interval
+        # The drainer backs off throttled runs itself, so each submission makes a single attempt
+        self.submit = submit or submitter(
+            mode,
+            self.session,
+            environment,
+            policy=retry.RetryPolicy(max_attempts=1),
+        )
+        self.log = log or logging.getLogger(__name__)
+
+        self.in_flight = 0
+        self.in_flight_checked = 0
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.thread = None
+
+    def enqueue(self, **kwargs):
+        """Prepare a run and add it to the queue. Takes the same arguments as :meth:`prepare_invoke`.
+
+        The notebook (and parameters, if `upload_parameters` is True) are uploaded straight away. The run
+        is started later by the drainer.
+
+        Returns:
+            The processing job name of the run.
+        """
+        args = prepare_invoke(session=self.session, **kwargs)
+        job_name = args["parameters"]["job_id"]
+        self.store.put(job_name, args)
+        self.wake_event.set()
+        return job_name
+
+    def status(self, job_name):
+        """Return the queue entry for a run: a dict with the keys "Job", "State", "Attempts", "Error",
+        "Queued" and "Updated", or None if the run isn't in the queue."""
+        return self.store.get(job_name)
+
+    def count_in_flight(self):
+        """Count the processing jobs in progress in the account"""
+        client = retry.client(self.session, "sagemaker")
+        count = 0
+        next_token = None
+        while True:
+            args = {"NextToken": next_token} if next_token else {}
+            page = retry.call(
+                "ListProcessingJobs",
+                client.list_processing_jobs,
+                StatusEquals="InProgress",
+                MaxResults=100,
+                **args,
+            )
+            count += len(page["ProcessingJobSummaries"])
+            next_token = page.get("NextToken")
+            if not next_token:
+                return count
+
+    def _room_in_flight(self):
+        if self.max_in_flight is None:
+            return True
+        now = time.monotonic()
+        if self.in_flight >= self.max_in_flight or (
+            now - self.in_flight_checked >= self.in_flight_interval
+        ):
+            self.in_flight = self.count_in_flight()
+            self.in_flight_checked = now
+        return self.in_flight < self.max_in_flight
+
+    def drain_once(self):
+        """Start the next run if the rate and in flight limits allow it.
+
+        Returns:
+            0 if a run was started or failed, None if the queue has nothing ready or else the number of
+            seconds to wait before trying again.
+        """
+        if not self._room_in_flight():
+            return self.in_flight_interval
+        wait = self.bucket.try_take()
+        if wait:
+            return wait
+
+        item = self.store.take()
+        if item is None:
+            self.bucket.put_back()
+            return None
+
+        job_name = item["job_name"]
+        try:
+            self.submit(item["request"])
+            self.store.update(job_name, SUBMITTED)
+            self.in_flight += 1
+            self.log.debug(f"Started queued run {job_name}")
+        except Exception as e:
+            if is_throttling_error(e) and item["attempts"] < self.max_attempts:
+                delay = min(300, 2 ** item["attempts"])
+                self.log.info(f"Throttled starting {job_name}, retrying in {delay}s")
+                self.store.update(
+                    job_name, QUEUED, error=str(e), not_before=time.time() + delay
+                )
+            else:
+                self.log.warning(f"Failed to start queued run {job_name}: {e}")
+                self.store.update(job_name, FAILED, error=str(e))
+        return 0
+
+    def drain(self, timeout=None):
+        """Start queued runs in this thread until the queue has nothing ready or `timeout` seconds have passed"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            wait = self.drain_once()
+            if wait is None:
+                return
+            if wait:
+                time.sleep(wait)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                wait = self.drain_once()
+            except Exception as e:  # pylint: disable=broad-except
+                # Keep draining: if the thread died, the queued runs would never be started
+                self.log.warning(f"Error draining the queue: {e}", exc_info=True)
+                wait = self.in_flight_interval
+            if wait:
+                self.wake_event.wait(wait)
+            elif wait is None:
+                # Nothing ready now, but runs put back after throttling become ready on their own
+                self.wake_event.wait(1)
+            self.wake_event.clear()
+
+    def start(self):
+        """Start the drainer in a background thread"""
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(
+                target=self._run, name="notebook-submission-queue", daemon=True
+            )
+            self.thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the background drainer. Runs still in the queue stay there."""
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
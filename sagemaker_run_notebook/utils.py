@@ -11,14 +11,25 @@
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
 
+import os
 import re
+import threading
+import time
 from typing_extensions import Literal
 import boto3
 import botocore
 
+from . import retry
+
 _default_bucket = None
 _default_bucket_name_override = None
 
+# How long a cached caller identity or execution role stays valid, in seconds
+IDENTITY_TTL = 15 * 60
+
+_identity_cache = {}
+_identity_lock = threading.Lock()
+
 # Utility functions that are copied and pasted from the SageMaker Python SDK so that we
 # don't need to include that and all its dependencies.
 def default_bucket(session=None):
@@ -39,9 +50,7 @@ def default_bucket(session=None):
 
     default_bucket = _default_bucket_name_override
     if not default_bucket:
-        account = session.client(
-            "sts", region_name=region, endpoint_url=sts_regional_endpoint(region)
-        ).get_caller_identity()["Account"]
+        account = get_account(session)
         default_bucket = "sagemaker-{}-{}".format(region, account)
 
     _create_s3_bucket_if_it_does_not_exist(
@@ -132,14 +141,105 @@ def _domain_for_region(region):
     return "c2s.ic.gov" if region == "us-iso-east-1" else "amazonaws.com"
 
 
-def get_execution_role(session):
+def _identity_key(session):
+    """The cache key for a session: its access key and region"""
+    credentials = session.get_credentials()
+    access_key = credentials.access_key if credentials is not None else None
+    return (access_key, session.region_name)
+
+
+def _cached(kind, session, fetch, ttl):
+    key = (kind,) + _identity_key(session)
+    now = time.time()
+    with _identity_lock:
+        entry = _identity_cache.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+    value = fetch()
+    with _identity_lock:
+        _identity_cache[key] = (now + ttl, value)
+    return value
+
+
+def clear_identity_cache():
+    """Forget all the cached caller identities and execution roles."""
+    with _identity_lock:
+        _identity_cache.clear()
+
+
+def get_caller_identity(session=None, ttl=IDENTITY_TTL):
+    """Return the result of STS GetCallerIdentity for the session.
+
+    The result is cached for the process, keyed by the session's credentials and region, so repeated calls
+    don't go back to STS until `ttl` seconds have passed.
+
+    Returns:
+        (dict): The identity with the keys "UserId", "Account" and "Arn".
+    """
+    session = ensure_session(session)
+    region = session.region_name
+
+    def fetch():
+        sts = retry.client(
+            session,
+            "sts",
+            region_name=region,
+            endpoint_url=sts_regional_endpoint(region),
+        )
+        identity = retry.call("GetCallerIdentity", sts.get_caller_identity)
+        return {k: identity[k] for k in ["UserId", "Account", "Arn"]}
+
+    return _cached("identity", session, fetch, ttl)
+
+
+def get_account(session=None):
+    """Return the AWS account ID for the session (cached, see :meth:`get_caller_identity`)."""
+    return get_caller_identity(session)["Account"]
+
+
+def resolve_image(image, session=None, tag="latest"):
+    """Expand an image name into a full ECR image URI in the session's account and region.
+
+    Args:
+        image (str): The image, either a repository name with an optional tag or a full URI (required).
+        session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
+        tag (str): The tag to use if `image` is a bare repository name without one (default: "latest").
+
+    Returns:
+        (str): The image URI
+    """
+    if "/" in image:
+        return image
+    session = ensure_session(session)
+    uri = "{}.dkr.ecr.{}.amazonaws.com/{}".format(
+        get_account(session), session.region_name, image
+    )
+    if ":" not in image:
+        uri = uri + ":" + tag
+    return uri
+
+
+def resolve_role(role, session=None):
+    """Expand a role name into a role ARN in the session's account. ARNs are returned unchanged."""
+    if "/" in role:
+        return role
+    return "arn:aws:iam::{}:role/{}".format(get_account(session), role)
+
+
+def get_execution_role(session, ttl=IDENTITY_TTL):
     """Return the role ARN whose credentials are used to call the API.
     Throws an exception if the current AWS identity is not a role.
 
+    The result is cached in the same way as :meth:`get_caller_identity`.
+
     Returns:
         (str): The role ARN
     """
-    assumed_role = session.client("sts").get_caller_identity()["Arn"]
+    return _cached("role", session, lambda: _get_execution_role(session), ttl)
+
+
+def _get_execution_role(session):
+    assumed_role = get_caller_identity(session)["Arn"]
     if ":user/" in assumed_role:
         user_name = assumed_role[assumed_role.rfind("/") + 1 :]
         raise ValueError(
@@ -160,7 +260,8 @@ def get_execution_role(session):
 
     # Call IAM to get the role's path
     role_name = role[role.rfind("/") + 1 :]
-    arn = session.client("iam").get_role(RoleName=role_name)["Role"]["Arn"]
+    iam = retry.client(session, "iam")
+    arn = retry.call("GetRole", iam.get_role, RoleName=role_name)["Role"]["Arn"]
 
     if ":role/" in arn:
         return arn
@@ -168,6 +269,19 @@ def get_execution_role(session):
     raise ValueError(message.format(arn))
 
 
+def cache_dir():
+    """Return the directory that holds the local caches, creating it if needed.
+
+    The directory is "~/.sagemaker-run-notebook" unless the environment variable
+    SAGEMAKER_RUN_NOTEBOOK_CACHE_DIR is set.
+    """
+    path = os.environ.get("SAGEMAKER_RUN_NOTEBOOK_CACHE_DIR") or os.path.expanduser(
+        "~/.sagemaker-run-notebook"
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
 def ensure_session(session=None, region: Literal["ap-southeast-2", "us-east-1"] = None):
     """If session is None, create a default session and return it. Otherwise return the session passed in"""
     if session is None:
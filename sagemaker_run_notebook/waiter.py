@@ -0,0 +1,386 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+"""Wait for many notebook runs at once.
+
+Rather than polling each job, :class:`JobWaiter` lists the jobs with ListProcessingJobs, which returns the
+status of up to 100 jobs per call, and only describes a job once it has finished. The polling interval
+grows while nothing finishes and drops back when something does. For example::
+
+    jobs = [r["job_name"] for r in run.invoke_many(params, notebook="powers.ipynb")]
+    for result in run.as_completed(jobs, output="results"):
+        print(result["Job"], result["Status"], result["Output"])
+"""
+
+import asyncio
+import concurrent.futures
+import datetime
+import os
+import time
+from urllib.parse import urlparse
+
+import botocore
+
+from . import retry
+from .run_notebook import describe_run, download_object, ensure_session
+from .utils import get_account
+
+TERMINAL_STATES = ["Completed", "Failed", "Stopped"]
+
+# The start of every notebook run's job name. As a name filter it matches every run in the account.
+JOB_NAME_PREFIX = "workflow-"
+
+# The status reported for a job that still doesn't exist after the waiter's `not_found_timeout`.
+NOT_FOUND = "NotFound"
+
+
+def common_prefix(names):
+    """Return the longest string that all the names start with"""
+    names = list(names)
+    if not names:
+        return ""
+    first, last = min(names), max(names)
+    i = 0
+    while i < len(first) and i < len(last) and first[i] == last[i]:
+        i += 1
+    return first[:i]
+
+
+class JobWaiter:
+    """Tracks a set of processing jobs until they finish.
+
+    Args:
+        job_names (iterable of str): The processing jobs to wait for (required).
+        output (str): If not None, download the output notebook of each completed job to this directory
+                      (default: None).
+        interval (float): The initial number of seconds between polls (default: 10).
+        max_interval (float): The longest number of seconds between polls (default: 60).
+        backoff (float): The factor the interval grows by after each poll in which no job finished (default: 1.5).
+        max_workers (int): The number of concurrent downloads and describes (default: 8).
+        not_found_timeout (float): The number of seconds to wait for a job to be created (for example after an
+                                   asynchronous submission) before reporting it with the status NOT_FOUND
+                                   (default: 300).
+        session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
+    """
+
+    def __init__(
+        self,
+        job_names,
+        output=None,
+        interval=10,
+        max_interval=60,
+        backoff=1.5,
+        max_workers=8,
+        not_found_timeout=300,
+        session=None,
+    ):
+        self.pending = set(job_names)
+        self.unseen = set(self.pending)  # the pending jobs that haven't been found yet
+        self.not_found_deadline = time.monotonic() + not_found_timeout
+        self.output = output
+        self.base_interval = interval
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.session = ensure_session(session)
+        self.client = retry.client(self.session, "sagemaker")
+        self.s3 = None
+        if output is not None:
+            self.s3 = self.session.client("s3")
+            get_account(
+                self.session
+            )  # cache it before describing from the download threads
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.created_after = None
+        self.polls = 0
+        self.api_calls = 0
+
+    def _list(self):
+        """Return the summaries of the pending jobs that ListProcessingJobs knows about, keyed by name"""
+        filters = {"NameContains": common_prefix(self.pending)}
+        if self.created_after is not None:
+            filters["CreationTimeAfter"] = self.created_after
+        found = {}
+        next_token = None
+        while True:
+            args = {"NextToken": next_token} if next_token else {}
+            page = retry.call(
+                "ListProcessingJobs",
+                self.client.list_processing_jobs,
+                MaxResults=100,
+                **filters,
+                **args,
+            )
+            self.api_calls += 1
+            for item in page["ProcessingJobSummaries"]:
+                if item["ProcessingJobName"] in self.pending:
+                    found[item["ProcessingJobName"]] = item
+            next_token = page.get("NextToken")
+            if not next_token or len(found) == len(self.pending):
+                return found
+
+    def _describe_missing(self, names):
+        """Describe jobs that the listing didn't include, returning summaries for the ones that exist"""
+
+        def describe(name):
+            try:
+                return retry.call(
+                    "DescribeProcessingJob",
+                    self.client.describe_processing_job,
+                    ProcessingJobName=name,
+                )
+            except botocore.exceptions.ClientError as e:
+                if e.response["Error"]["Code"] == "ValidationException":
+                    return None  # not created yet
+                raise
+
+        found = {}
+        for desc in self.executor.map(describe, names):
+            self.api_calls += 1
+            if desc is not None:
+                found[desc["ProcessingJobName"]] = desc
+        return found
+
+    def poll(self):
+        """Check the pending jobs once.
+
+        Returns:
+            A list of (job name, status, failure reason) for the jobs that have finished since the last poll.
+        """
+        self.polls += 1
+        if not self.pending:
+            return []
+        if self.created_after is None and len(common_prefix(self.pending)) <= len(
+            JOB_NAME_PREFIX
+        ):
+            # Listing by name would page through every notebook run in the account, so describe the jobs
+            # to learn when they were created, and bound later listings by that
+            found = self._describe_missing(sorted(self.pending))
+        else:
+            found = self._list()
+            missing = self.pending - set(found)
+            if missing:
+                found.update(self._describe_missing(sorted(missing)))
+
+        self.unseen -= set(found)
+        created = [
+            item["CreationTime"]
+            for item in found.values()
+            if item["ProcessingJobStatus"] not in TERMINAL_STATES
+        ]
+        if created:
+            # Later listings only need to go back as far as the oldest job still pending. Jobs that haven't
+            # been found yet will be created after it.
+            self.created_after = min(created) - datetime.timedelta(seconds=1)
+
+        finished = []
+        for name, item in found.items():
+            if item["ProcessingJobStatus"] in TERMINAL_STATES:
+                self.pending.discard(name)
+                finished.append(
+                    (name, item["ProcessingJobStatus"], item.get("FailureReason"))
+                )
+        if self.unseen and time.monotonic() >= self.not_found_deadline:
+            for name in sorted(self.unseen):
+                self.pending.discard(name)
+                finished.append(
+                    (name, NOT_FOUND, f"Processing job {name} was never created")
+                )
+            self.unseen.clear()
+
+        if finished:
+            self.interval = self.base_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return finished
+
+    def result(self, job_name, status, failure):
+        """Build the result for a finished job, downloading its output notebook if asked"""
+        output = None
+        error = None
+        if self.output is not None and status == "Completed":
+            try:
+                desc = describe_run(
+                    job_name, session=self.session, client=self.client, cache=False
+                )
+                if not desc["Result"]:
+                    raise OSError(f"Job {job_name} has no output notebook")
+                o = urlparse(desc["Result"])
+                os.makedirs(self.output, exist_ok=True)
+                output = os.path.join(self.output, os.path.basename(o.path))
+                download_object(self.s3, o.netloc, o.path[1:], output)
+            except (botocore.exceptions.ClientError, OSError) as e:
+                output = None
+                error = str(e)
+        return dict(
+            Job=job_name, Status=status, Failure=failure, Output=output, Error=error
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def as_completed(
+    job_names,
+    output=None,
+    interval=10,
+    max_interval=60,
+    timeout=None,
+    max_workers=8,
+    not_found_timeout=300,
+    session=None,
+):
+    """A generator that yields the result of each processing job as it finishes.
+
+    The jobs are polled together with ListProcessingJobs (see :class:`JobWaiter`). If `output` is given, the
+    output notebooks of completed jobs are downloaded concurrently and each job is yielded once its download
+    is done.
+
+    Args:
+        job_names (iterable of str): The processing jobs to wait for (required).
+        output (str): If not None, the directory to download the output notebooks to (default: None).
+        interval (float): The initial number of seconds between polls (default: 10).
+        max_interval (float): The longest number of seconds between polls (default: 60).
+        timeout (float): If not None, stop after this many seconds, raising TimeoutError (default: None).
+        max_workers (int): The number of concurrent downloads (default: 8).
+        not_found_timeout (float): The number of seconds to wait for a job to be created before yielding it
+                                   with the status "NotFound" (default: 300).
+        session (boto3.Session): The boto3 session to use. Will create a default session if not supplied (default: None).
+
+    Yields:
+        A dict for each job with the keys "Job", "Status", "Failure" (the failure reason or None),
+        "Output" (the downloaded file or None) and "Error" (why the download failed or None).
+    """
+    waiter = JobWaiter(
+        job_names,
+        output=output,
+        interval=interval,
+        max_interval=max_interval,
+        max_workers=max_workers,
+        not_found_timeout=not_found_timeout,
+        session=session,
+    )
+    deadline = None if timeout is None else time.monotonic() + timeout
+    downloads = set()
+    next_poll = time.monotonic()
+    try:
+        while waiter.pending or downloads:
+            if waiter.pending and time.monotonic() >= next_poll:
+                for name, status, failure in waiter.poll():
+                    downloads.add(
+                        waiter.executor.submit(waiter.result, name, status, failure)
+                    )
+                next_poll = time.monotonic() + waiter.interval
+
+            wait_time = None
+            if waiter.pending:
+                wait_time = max(0, next_poll - time.monotonic())
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        "{} jobs didn't finish in time".format(
+                            len(waiter.pending) + len(downloads)
+                        )
+                    )
+                wait_time = (
+                    remaining if wait_time is None else min(wait_time, remaining)
+                )
+
+            if downloads:
+                done, downloads = concurrent.futures.wait(
+                    downloads,
+                    timeout=wait_time,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for future in done:
+                    yield future.result()
+            elif waiter.pending:
+                time.sleep(wait_time)
+    finally:
+        waiter.close()
+
+
+def wait_for_all(job_names, **kwargs):
+    """Wait for all the processing jobs to finish. Takes the same arguments as :meth:`as_completed`.
+
+    Returns:
+        The list of results from :meth:`as_completed`, in the order of `job_names`.
+    """
+    job_names = list(job_names)
+    results = {r["Job"]: r for r in as_completed(job_names, **kwargs)}
+    return [results[name] for name in job_names]
+
+
+async def as_completed_async(
+    job_names,
+    output=None,
+    interval=10,
+    max_interval=60,
+    timeout=None,
+    max_workers=8,
+    not_found_timeout=300,
+    session=None,
+):
+    """An async generator version of :meth:`as_completed`, taking the same arguments.
+
+    The polls and downloads run on a thread pool and the waits use `asyncio.sleep`, so the event loop isn't
+    blocked.
+    """
+    waiter = JobWaiter(
+        job_names,
+        output=output,
+        interval=interval,
+        max_interval=max_interval,
+        max_workers=max_workers,
+        not_found_timeout=not_found_timeout,
+        session=session,
+    )
+    loop = asyncio.get_event_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    downloads = set()
+    next_poll = loop.time()
+    try:
+        while waiter.pending or downloads:
+            if waiter.pending and loop.time() >= next_poll:
+                # The poll uses the waiter's pool itself, so it runs on the loop's default executor
+                finished = await loop.run_in_executor(None, waiter.poll)
+                for name, status, failure in finished:
+                    downloads.add(
+                        loop.run_in_executor(
+                            waiter.executor, waiter.result, name, status, failure
+                        )
+                    )
+                next_poll = loop.time() + waiter.interval
+
+            wait_time = max(0, next_poll - loop.time()) if waiter.pending else None
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        "{} jobs didn't finish in time".format(
+                            len(waiter.pending) + len(downloads)
+                        )
+                    )
+                wait_time = (
+                    remaining if wait_time is None else min(wait_time, remaining)
+                )
+            if downloads:
+                done, downloads = await asyncio.wait(
+                    downloads, timeout=wait_time, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    yield future.result()
+            elif waiter.pending:
+                await asyncio.sleep(wait_time)
+    finally:
+        waiter.close()
@@ -90,7 +90,8 @@ setuptools.setup(
             "jupyterlab~=2.3",
             "python-dotenv",
             "pre-commit",
-        ]
+        ],
+        "zstd": ["zstandard"],
     },
     entry_points={
         "console_scripts": [
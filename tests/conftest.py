@@ -0,0 +1,20 @@
+import boto3
+import pytest
+
+from sagemaker_run_notebook import run_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(monkeypatch, tmp_path):
+    """Keep the local caches of each test in its own directory"""
+    path = tmp_path / "cache"
+    monkeypatch.setenv("SAGEMAKER_RUN_NOTEBOOK_CACHE_DIR", str(path))
+    monkeypatch.setattr(run_cache, "_run_cache", None)
+    return path
+
+
+@pytest.fixture
+def session():
+    return boto3.Session(
+        region_name="us-east-1", aws_access_key_id="a", aws_secret_access_key="b"
+    )
@@ -0,0 +1,88 @@
+"""A base class for testing the server extension's handlers in a tornado application"""
+
+import asyncio
+import json
+import time
+
+import boto3
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application
+
+from sagemaker_run_notebook.run_store import RunStore
+from sagemaker_run_notebook.server_extension import handlers, refresher
+
+PREFIX = "/sagemaker-scheduler/"
+
+
+class FakeTracker:
+    """Stands in for NotebookRunTracker: `runs` is the store, and `older` the runs load_older fills in"""
+
+    def __init__(self, runs, older=(), capacity=1000):
+        self.runs = RunStore(capacity)
+        for run in reversed(runs):
+            self.runs.add(run)
+        self.older = list(older)
+        self.exhausted = not self.older
+        self.updates = 0
+
+    async def update(self):
+        self.updates += 1
+
+    async def load_older(self, n):
+        while n > 0 and self.older:
+            self.runs.add_oldest(self.older.pop(0))
+            n -= 1
+        self.exhausted = not self.older
+
+
+def run_desc(n, status="Completed", notebook="powers.ipynb"):
+    return {
+        "Job": "workflow-powers-{}".format(n),
+        "Notebook": notebook,
+        "Rule": "",
+        "Status": status,
+    }
+
+
+class HandlerTestCase(AsyncHTTPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = boto3.Session(
+            region_name="us-east-1", aws_access_key_id="a", aws_secret_access_key="b"
+        )
+        handlers.BaseHandler.session = self.session
+        refresher._refresher = None
+
+    def tearDown(self):
+        refresher._refresher = None
+        super().tearDown()
+
+    def get_app(self):
+        app = Application(base_url="/", disable_check_xsrf=True)
+        handlers.setup_handlers(app)
+        return app
+
+    def use_runs(self, runs, older=(), capacity=1000):
+        """Serve `runs` (newest first) from a refresher that has just refreshed"""
+        r = refresher.RunsRefresher(self.session)
+        r.tracker = FakeTracker(runs, older, capacity)
+        r.last_refresh = time.monotonic()
+        refresher._refresher = r
+        return r
+
+    def get_json(self, path, **kwargs):
+        response = self.fetch(PREFIX + path, **kwargs)
+        return response, json.loads(response.body) if response.body else None
+
+    async def wait_until(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                raise AssertionError("timed out waiting")
+            await asyncio.sleep(0.01)
+
+
+def refreshed(r):
+    """Tell streams waiting on the refresher that the store has changed"""
+    event, r.refreshed = r.refreshed, asyncio.Event()
+    event.set()
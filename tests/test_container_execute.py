@@ -0,0 +1,222 @@
+import base64
+import gzip
+import importlib.util
+import json
+import os
+
+import pytest
+
+pytest.importorskip("papermill")
+
+# execute.py runs in the container rather than being part of the package
+spec = importlib.util.spec_from_file_location(
+    "execute",
+    os.path.join(os.path.dirname(__file__), os.pardir, "container", "execute.py"),
+)
+execute = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(execute)
+
+PNG = base64.b64encode(b"\x89PNG" + bytes(range(256)) * 4).decode("ascii")
+HTML = "<table>" + "<tr><td>1</td></tr>" * 100 + "</table>"
+
+
+def notebook():
+    return {
+        "cells": [
+            {"cell_type": "markdown", "source": "# Powers", "metadata": {}},
+            {
+                "cell_type": "code",
+                "source": "plot()",
+                "execution_count": 1,
+                "metadata": {
+                    "papermill": {
+                        "status": "completed",
+                        "start_time": "2021-03-01T12:00:00",
+                        "end_time": "2021-03-01T12:00:02",
+                        "duration": 2.0,
+                        "exception": False,
+                    }
+                },
+                "outputs": [
+                    {
+                        "output_type": "display_data",
+                        "metadata": {},
+                        "data": {"image/png": PNG, "text/plain": "<Figure>"},
+                    },
+                    {
+                        "output_type": "execute_result",
+                        "metadata": {},
+                        "data": {"text/html": [HTML[:50], HTML[50:]]},
+                    },
+                    {
+                        "output_type": "display_data",
+                        "metadata": {},
+                        "data": {"image/png": "iVBORw0KGgo="},
+                    },
+                ],
+            },
+        ],
+        "metadata": {
+            "papermill": {
+                "start_time": "2021-03-01T12:00:00",
+                "end_time": "2021-03-01T12:00:03",
+                "duration": 3.0,
+                "parameters": {"n": 2, "authorizationToken": "secret"},
+            },
+            "widgets": {"state": {"x": "y" * 200}},
+        },
+        "nbformat": 4,
+        "nbformat_minor": 4,
+    }
+
+
+def write(path, nb):
+    with open(path, "w") as f:
+        json.dump(nb, f)
+
+
+def test_output_stem():
+    assert execute.output_stem("/out/powers.ipynb") == "/out/powers"
+    assert execute.output_stem("/out/powers.ipynb.gz") == "/out/powers"
+
+
+def test_externalize_outputs(tmp_path):
+    nb = notebook()
+    output_notebook = str(tmp_path / "powers.ipynb")
+    assert execute.externalize_outputs(nb, output_notebook, 100) == 3
+
+    image, html, small = nb["cells"][1]["outputs"]
+    path = image["metadata"]["sagemaker_run_notebook"]["external"]["image/png"]
+    assert path.startswith("powers.outputs/") and path.endswith(".png")
+    assert (tmp_path / path).read_bytes() == base64.b64decode(PNG)
+    # the existing placeholder is kept
+    assert image["data"] == {"text/plain": "<Figure>"}
+
+    path = html["metadata"]["sagemaker_run_notebook"]["external"]["text/html"]
+    assert (tmp_path / path).read_text() == HTML
+    assert html["data"]["text/plain"] == "[text/html output of {} bytes in {}]".format(
+        len(HTML), path
+    )
+
+    assert small["data"] == {"image/png": "iVBORw0KGgo="}
+
+    metadata = nb["metadata"]
+    assert "widgets" not in metadata
+    path = metadata["sagemaker_run_notebook"]["widgets"]
+    assert json.loads((tmp_path / path).read_text()) == {"state": {"x": "y" * 200}}
+    assert metadata["sagemaker_run_notebook"]["external_outputs"] == 3
+
+
+def test_identical_outputs_are_stored_once(tmp_path):
+    nb = notebook()
+    nb["cells"].append(nb["cells"][1])
+    nb["cells"] = json.loads(json.dumps(nb["cells"]))
+    assert execute.externalize_outputs(nb, str(tmp_path / "powers.ipynb"), 100) == 5
+    assert len(os.listdir(tmp_path / "powers.outputs")) == 3
+
+
+def test_small_outputs_stay_in_the_notebook(tmp_path):
+    nb = notebook()
+    assert execute.externalize_outputs(nb, str(tmp_path / "powers.ipynb"), 10**6) == 0
+    assert nb == notebook()
+    assert not (tmp_path / "powers.outputs").exists()
+
+
+def test_run_summary():
+    summary = execute.run_summary(notebook(), "failed", error="ValueError")
+    assert summary["status"] == "failed" and summary["error"] == "ValueError"
+    assert summary["duration"] == 3.0
+    assert summary["parameters"] == {"n": 2, "authorizationToken": "******"}
+    assert summary["cells"] == [
+        {
+            "index": 1,
+            "execution_count": 1,
+            "status": "completed",
+            "start": "2021-03-01T12:00:00",
+            "end": "2021-03-01T12:00:02",
+            "duration": 2.0,
+            "exception": False,
+        }
+    ]
+
+
+def test_process_output_does_nothing_by_default(tmp_path, monkeypatch):
+    monkeypatch.delenv(execute.externalize_var, raising=False)
+    monkeypatch.delenv(execute.summary_var, raising=False)
+    output_notebook = str(tmp_path / "powers.ipynb")
+    write(output_notebook, notebook())
+    before = os.path.getmtime(output_notebook)
+    execute.process_output(output_notebook, output_notebook, "completed")
+    assert os.path.getmtime(output_notebook) == before
+    assert os.listdir(tmp_path) == ["powers.ipynb"]
+
+
+def test_process_output(tmp_path, monkeypatch):
+    monkeypatch.setenv(execute.externalize_var, "100")
+    monkeypatch.setenv(execute.summary_var, "1")
+    papermill_output = str(tmp_path / "powers.ipynb")
+    output_notebook = papermill_output + ".gz"
+    write(papermill_output, notebook())
+    execute.process_output(papermill_output, output_notebook, "completed")
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "powers.ipynb.gz",
+        "powers.outputs",
+        "powers.summary.json",
+    ]
+    with gzip.open(output_notebook, "rt") as f:
+        nb = json.load(f)
+    assert nb["metadata"]["sagemaker_run_notebook"]["external_outputs"] == 3
+    summary = json.loads((tmp_path / "powers.summary.json").read_text())
+    assert summary["status"] == "completed"
+
+
+def test_process_output_rewrites_the_notebook_when_outputs_move(tmp_path, monkeypatch):
+    monkeypatch.setenv(execute.externalize_var, "100")
+    monkeypatch.delenv(execute.summary_var, raising=False)
+    output_notebook = str(tmp_path / "powers.ipynb")
+    write(output_notebook, notebook())
+    execute.process_output(output_notebook, output_notebook, "completed")
+    with open(output_notebook) as f:
+        nb = json.load(f)
+    assert "widgets" not in nb["metadata"]
+
+
+class FakeBucket:
+    """Downloads `data` to wherever it's asked"""
+
+    def __init__(self, data):
+        self.data = data
+        self.keys = []
+
+    def download_file(self, key, local_path):
+        self.keys.append(key)
+        with open(local_path, "wb") as f:
+            f.write(self.data)
+
+
+class FakeResource:
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def Bucket(self, name):
+        assert name == "bucket"
+        return self.bucket
+
+
+@pytest.mark.parametrize("ext", ["", ".gz", ".zst"])
+def test_load_params(monkeypatch, ext):
+    data = json.dumps({"n": 2}).encode("utf-8")
+    if ext == ".gz":
+        data = gzip.compress(data)
+    elif ext == ".zst":
+        zstandard = pytest.importorskip("zstandard")
+        data = zstandard.ZstdCompressor().compress(data)
+    bucket = FakeBucket(data)
+    monkeypatch.setattr(execute.boto3, "resource", lambda name: FakeResource(bucket))
+    key = "papermill_params/params-test-load{}.json{}".format(os.getpid(), ext)
+    try:
+        assert execute.load_params("s3://bucket/" + key) == {"n": 2}
+    finally:
+        os.remove("/tmp/" + os.path.basename(key))
+    assert bucket.keys == [key]
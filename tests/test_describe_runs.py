@@ -0,0 +1,163 @@
+import concurrent.futures
+import datetime
+import sys
+
+import pytest
+from botocore.stub import Stubber
+from dateutil.tz import tzlocal
+
+from sagemaker_run_notebook import retry
+
+run_notebook = sys.modules["sagemaker_run_notebook.run_notebook"]
+
+START = datetime.datetime(2021, 3, 1, 12, 0, tzinfo=tzlocal())
+ARN = "arn:aws:sagemaker:us-east-1:123456789012:processing-job/"
+
+
+def summary(n, status="Completed"):
+    job_name = f"workflow-job-{n}"
+    s = {
+        "ProcessingJobName": job_name,
+        "ProcessingJobArn": ARN + job_name,
+        "ProcessingJobStatus": status,
+        "CreationTime": START - datetime.timedelta(minutes=n),
+    }
+    if status == "Failed":
+        s["FailureReason"] = "The notebook raised an exception"
+    return s
+
+
+def description(n, notebook):
+    job_name = f"workflow-job-{n}"
+    return {
+        "ProcessingJobName": job_name,
+        "ProcessingJobArn": ARN + job_name,
+        "ProcessingJobStatus": "InProgress",
+        "CreationTime": START - datetime.timedelta(minutes=n),
+        "ProcessingInputs": [
+            {
+                "InputName": "notebook",
+                "S3Input": {
+                    "S3Uri": "s3://bucket/papermill_input/" + notebook,
+                    "LocalPath": "/opt/ml/processing/input",
+                    "S3DataType": "S3Prefix",
+                    "S3InputMode": "File",
+                },
+            }
+        ],
+        "ProcessingResources": {
+            "ClusterConfig": {
+                "InstanceCount": 1,
+                "InstanceType": "ml.m5.large",
+                "VolumeSizeInGB": 30,
+            }
+        },
+        "AppSpecification": {"ImageUri": "sagemaker-run-notebook"},
+        "Environment": {"PAPERMILL_NOTEBOOK_NAME": notebook},
+        "RoleArn": "arn:aws:iam::123456789012:role/BasicExecuteNotebookRole",
+    }
+
+
+@pytest.fixture
+def sagemaker(session, monkeypatch):
+    """A stubbed SageMaker client that retry.client hands out"""
+    client = retry.client(session, "sagemaker")
+    monkeypatch.setattr(retry, "client", lambda session, name: client)
+    monkeypatch.setattr(run_notebook, "get_account", lambda session: "123456789012")
+    with Stubber(client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_summaries_need_no_describes(session, sagemaker):
+    sagemaker.add_response(
+        "list_processing_jobs",
+        {
+            "ProcessingJobSummaries": [
+                summary(0),
+                {**summary(1), "ProcessingJobName": "other-job"},
+                summary(2, status="Failed"),
+            ]
+        },
+        {
+            "NameContains": "workflow-",
+            "StatusEquals": "Failed",
+            "MaxResults": 100,
+        },
+    )
+    runs = list(
+        run_notebook.describe_runs(session=session, status="Failed", full=False)
+    )
+    assert [r["Job"] for r in runs] == ["workflow-job-0", "workflow-job-2"]
+    assert runs[0]["Failure"] is None
+    assert runs[1]["Failure"] == "The notebook raised an exception"
+    assert "Notebook" not in runs[0]
+
+
+def test_full_descriptions_are_filtered_across_pages(session, sagemaker):
+    sagemaker.add_response(
+        "list_processing_jobs",
+        {"ProcessingJobSummaries": [summary(0), summary(1)], "NextToken": "more"},
+    )
+    for n, notebook in [(0, "a.ipynb"), (1, "b.ipynb")]:
+        sagemaker.add_response(
+            "describe_processing_job",
+            description(n, notebook),
+            {"ProcessingJobName": f"workflow-job-{n}"},
+        )
+    sagemaker.add_response(
+        "list_processing_jobs",
+        {"ProcessingJobSummaries": [summary(2)]},
+        {"NameContains": "workflow-", "MaxResults": 100, "NextToken": "more"},
+    )
+    sagemaker.add_response(
+        "describe_processing_job",
+        description(2, "b.ipynb"),
+        {"ProcessingJobName": "workflow-job-2"},
+    )
+    runs = run_notebook.describe_runs(
+        session=session, notebook="b.ipynb", full=False, max_workers=1
+    )
+    assert [r["Job"] for r in runs] == ["workflow-job-1", "workflow-job-2"]
+
+
+def test_bounded_map_only_starts_a_window_ahead():
+    started = []
+
+    def fn(item):
+        started.append(item)
+        return item * 2
+
+    pending = run_notebook.collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        results = run_notebook.bounded_map(executor, fn, range(10), 2, pending)
+        assert next(results) == 0
+        # the second call and the one started to replace the first
+        assert len(pending) == 2
+        results.close()
+    assert sorted(started) == [0, 1, 2]
+
+
+def test_stopping_early_cancels_the_pending_describes(session, monkeypatch):
+    started = []
+
+    def describe_run(job_name, session=None, client=None):
+        started.append(job_name)
+        return {"Job": job_name, "Notebook": "a.ipynb", "Rule": ""}
+
+    monkeypatch.setattr(run_notebook, "describe_run", describe_run)
+    monkeypatch.setattr(run_notebook, "get_account", lambda session: "123456789012")
+    client = retry.client(session, "sagemaker")
+    monkeypatch.setattr(retry, "client", lambda session, name: client)
+    with Stubber(client) as stubber:
+        stubber.add_response(
+            "list_processing_jobs",
+            {"ProcessingJobSummaries": [summary(n) for n in range(50)]},
+        )
+        runs = run_notebook.describe_runs(
+            n=1, session=session, notebook="a.ipynb", max_workers=2
+        )
+        first = next(runs)
+        runs.close()
+    assert first["Job"] == "workflow-job-0"
+    assert len(started) <= 3
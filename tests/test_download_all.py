@@ -0,0 +1,104 @@
+import sys
+
+import botocore
+import pytest
+
+import sagemaker_run_notebook.run_notebook
+
+run_notebook = sys.modules["sagemaker_run_notebook.run_notebook"]
+
+
+def job_description(job_name, status="Completed"):
+    return {
+        "ProcessingJobName": job_name,
+        "ProcessingJobStatus": status,
+        "CreationTime": None,
+        "FailureReason": "The notebook raised an exception",
+        "ProcessingOutputConfig": {
+            "Outputs": [{"S3Output": {"S3Uri": "s3://bucket/papermill_output"}}]
+        },
+        "ProcessingInputs": [{"S3Input": {"S3Uri": "s3://bucket/papermill_input/a"}}],
+        "Environment": {"PAPERMILL_OUTPUT": "/opt/ml/processing/output/" + job_name},
+        "AppSpecification": {"ImageUri": "sagemaker-run-notebook"},
+        "ProcessingResources": {"ClusterConfig": {"InstanceType": "ml.m5.large"}},
+        "RoleArn": "arn:aws:iam::123456789012:role/BasicExecuteNotebookRole",
+    }
+
+
+class FakeJobs:
+    """Describes jobs from `descriptions` (job name to description, or the exception describing raises) and
+    records the downloads instead of making them"""
+
+    def __init__(self):
+        self.descriptions = {}
+        self.downloaded = []
+
+    def describe_job(self, job_name, session, client):
+        desc = self.descriptions[job_name]
+        if isinstance(desc, Exception):
+            raise desc
+        return desc
+
+    def download_object(self, s3, bucket, key, filename, skip_existing=False):
+        self.downloaded.append(key)
+        return 10
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    jobs = FakeJobs()
+    monkeypatch.setattr(run_notebook, "describe_job", jobs.describe_job)
+    monkeypatch.setattr(run_notebook, "download_object", jobs.download_object)
+    monkeypatch.setattr(run_notebook, "get_account", lambda session: "123456789012")
+    return jobs
+
+
+def not_found(job_name):
+    return botocore.exceptions.ClientError(
+        {
+            "Error": {
+                "Code": "ValidationException",
+                "Message": "Could not find job " + job_name,
+            }
+        },
+        "DescribeProcessingJob",
+    )
+
+
+def test_download_all_returns_the_files(session, tmp_path, jobs):
+    jobs.descriptions["workflow-a"] = job_description("workflow-a")
+    jobs.descriptions["workflow-b"] = job_description("workflow-b")
+    files = run_notebook.download_all(
+        ["workflow-a", "workflow-b"], output=str(tmp_path), session=session
+    )
+    assert files == [str(tmp_path / "workflow-a"), str(tmp_path / "workflow-b")]
+    assert sorted(jobs.downloaded) == [
+        "papermill_output/workflow-a",
+        "papermill_output/workflow-b",
+    ]
+
+
+def test_download_all_raises_the_first_failure(session, tmp_path, jobs):
+    jobs.descriptions["workflow-a"] = not_found("workflow-a")
+    jobs.descriptions["workflow-b"] = job_description("workflow-b", status="Failed")
+    jobs.descriptions["workflow-c"] = job_description("workflow-c")
+    with pytest.raises(botocore.exceptions.ClientError) as e:
+        run_notebook.download_all(
+            ["workflow-a", "workflow-b", "workflow-c"],
+            output=str(tmp_path),
+            session=session,
+        )
+    assert "workflow-a" in str(e.value)
+    # the other downloads still happen
+    assert jobs.downloaded == ["papermill_output/workflow-c"]
+
+
+def test_download_outputs_reports_each_failure(session, tmp_path, jobs):
+    jobs.descriptions["workflow-a"] = job_description("workflow-a", status="Failed")
+    jobs.descriptions["workflow-b"] = job_description("workflow-b")
+    a, b = run_notebook.download_outputs(
+        ["workflow-a", "workflow-b"], output=str(tmp_path), session=session
+    )
+    assert a["Result"] == "failed" and a["Output"] is None
+    assert "has no output notebook (Failed)" in a["Error"]
+    assert b["Result"] == "downloaded" and b["Bytes"] == 10 and b["Error"] is None
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import sys
+
+import pytest
+
+import sagemaker_run_notebook.run_notebook
+
+run_notebook = sys.modules["sagemaker_run_notebook.run_notebook"]
+
+NOTEBOOK = b'{"cells": [], "metadata": {}, "nbformat": 4, "nbformat_minor": 4}'
+
+
+class FakeS3:
+    """Serves one object, whose downloads write `body` (the object itself unless changed)"""
+
+    def __init__(self, body=NOTEBOOK, etag=None, version_id=None):
+        self.body = body
+        self.head = {
+            "ContentLength": len(NOTEBOOK),
+            "ETag": '"{}"'.format(etag or hashlib.md5(NOTEBOOK).hexdigest()),
+        }
+        if version_id:
+            self.head["VersionId"] = version_id
+        self.downloads = []
+
+    def head_object(self, Bucket, Key):
+        return self.head
+
+    def download_file(self, bucket, key, filename, ExtraArgs=None, Config=None):
+        self.downloads.append((bucket, key, ExtraArgs))
+        with open(filename, "wb") as f:
+            f.write(self.body)
+
+
+def test_downloads_and_checks_the_object(tmp_path):
+    s3 = FakeS3(version_id="v1")
+    local = str(tmp_path / "out.ipynb")
+    assert run_notebook.download_object(s3, "bucket", "key", local) == len(NOTEBOOK)
+    assert open(local, "rb").read() == NOTEBOOK
+    assert s3.downloads == [("bucket", "key", {"VersionId": "v1"})]
+    assert os.listdir(tmp_path) == ["out.ipynb"]
+
+
+def test_corrupt_downloads_leave_nothing_behind(tmp_path):
+    local = str(tmp_path / "out.ipynb")
+    body = NOTEBOOK.replace(b"4", b"5")
+    with pytest.raises(run_notebook.DownloadException, match="MD5"):
+        run_notebook.download_object(FakeS3(body), "bucket", "key", local)
+    with pytest.raises(run_notebook.DownloadException, match="bytes"):
+        run_notebook.download_object(FakeS3(NOTEBOOK[:-1]), "bucket", "key", local)
+    assert os.listdir(tmp_path) == []
+
+
+def test_multipart_etags_only_check_the_size(tmp_path):
+    local = str(tmp_path / "out.ipynb")
+    body = NOTEBOOK.replace(b"4", b"5")
+    s3 = FakeS3(body, etag="0123456789abcdef0123456789abcdef-2")
+    assert run_notebook.download_object(s3, "bucket", "key", local) == len(NOTEBOOK)
+
+
+def test_skips_matching_files(tmp_path):
+    local = tmp_path / "out.ipynb"
+    local.write_bytes(NOTEBOOK)
+    s3 = FakeS3()
+    assert (
+        run_notebook.download_object(
+            s3, "bucket", "key", str(local), skip_existing=True
+        )
+        is None
+    )
+    assert s3.downloads == []
+
+    local.write_bytes(b"{}")
+    run_notebook.download_object(s3, "bucket", "key", str(local), skip_existing=True)
+    assert local.read_bytes() == NOTEBOOK
+
+
+def test_download_notebook_finds_the_output(session, tmp_path, monkeypatch):
+    desc = {
+        "ProcessingOutputConfig": {
+            "Outputs": [{"S3Output": {"S3Uri": "s3://bucket/papermill_output"}}]
+        },
+        "Environment": {
+            "PAPERMILL_OUTPUT": "/opt/ml/processing/output/powers-2021-03-01.ipynb.gz"
+        },
+    }
+    monkeypatch.setattr(
+        run_notebook, "describe_job", lambda job_name, session, client: desc
+    )
+    s3 = FakeS3()
+    output = str(tmp_path / "outputs")
+    local = run_notebook.download_notebook(
+        "workflow-powers-1", output=output, session=session, client=object(), s3=s3
+    )
+    assert local == output + "/powers-2021-03-01.ipynb.gz"
+    assert open(local, "rb").read() == NOTEBOOK
+    assert s3.downloads[0][:2] == (
+        "bucket",
+        "papermill_output/powers-2021-03-01.ipynb.gz",
+    )
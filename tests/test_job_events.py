@@ -0,0 +1,168 @@
+import datetime
+import json
+import sys
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+from dateutil.tz import tzlocal
+
+from sagemaker_run_notebook import job_events, retry
+
+run_notebook = sys.modules["sagemaker_run_notebook.run_notebook"]
+
+START = datetime.datetime(2021, 3, 1, 12, 0, tzinfo=tzlocal())
+
+
+def description(job_name, status, minutes=0):
+    desc = {
+        "ProcessingJobName": job_name,
+        "ProcessingJobArn": "arn:aws:sagemaker:us-east-1:123456789012:processing-job/"
+        + job_name,
+        "ProcessingJobStatus": status,
+        "CreationTime": START,
+        "LastModifiedTime": START + datetime.timedelta(minutes=minutes),
+        "ProcessingResources": {
+            "ClusterConfig": {
+                "InstanceCount": 1,
+                "InstanceType": "ml.m5.large",
+                "VolumeSizeInGB": 30,
+            }
+        },
+        "AppSpecification": {"ImageUri": "notebook-runner"},
+    }
+    if status == "Failed":
+        desc["FailureReason"] = "The notebook raised an exception"
+    return desc
+
+
+def replay(job_name, final="Completed"):
+    return [
+        job_events.state_change_event(description(job_name, "InProgress")),
+        job_events.state_change_event(description(job_name, final, minutes=5)),
+    ]
+
+
+@pytest.fixture
+def session(monkeypatch, tmp_path):
+    monkeypatch.setenv("SAGEMAKER_RUN_NOTEBOOK_CACHE_DIR", str(tmp_path))
+    return boto3.Session(
+        region_name="us-east-1", aws_access_key_id="a", aws_secret_access_key="b"
+    )
+
+
+@pytest.fixture
+def sagemaker(session, monkeypatch):
+    """A stubbed SageMaker client that retry.client hands out"""
+    client = retry.client(session, "sagemaker")
+    monkeypatch.setattr(retry, "client", lambda session, name: client)
+    with Stubber(client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_event_detail_converts_times():
+    event = job_events.state_change_event(description("workflow-a", "Completed"))
+    detail = job_events.job_event_detail(json.dumps(event))
+    assert detail["ProcessingJobStatus"] == "Completed"
+    assert detail["CreationTime"] == START
+    assert job_events.job_event_detail({"detail-type": "Something else"}) is None
+
+
+def test_replay_into_job_events():
+    events = job_events.JobEvents(cache=False)
+    seen = []
+    events.subscribe(lambda detail: seen.append(detail["ProcessingJobStatus"]))
+    source = job_events.ReplayEventSource(events, replay("workflow-a"))
+    while source.poll_once():
+        pass
+
+    assert seen == ["InProgress", "Completed"]
+    assert events.status("workflow-a") == "Completed"
+    assert events.wait("workflow-a", timeout=0)["ProcessingJobStatus"] == "Completed"
+    assert events.wait("workflow-b", timeout=0) is None
+
+
+def test_finished_jobs_ignore_late_events():
+    events = job_events.JobEvents(cache=False)
+    finished, running = reversed(replay("workflow-a", final="Stopped"))
+    assert events.publish(finished) is not None
+    assert events.publish(running) is None
+    assert events.status("workflow-a") == "Stopped"
+
+
+def test_wait_wakes_on_replayed_events():
+    events = job_events.JobEvents(cache=False)
+    source = job_events.ReplayEventSource(events, replay("workflow-a"), interval=0.05)
+    source.start()
+    try:
+        detail = events.wait("workflow-a", timeout=5)
+    finally:
+        source.stop(5)
+    assert detail["ProcessingJobStatus"] == "Completed"
+
+
+def test_file_source_reads_appended_lines(tmp_path):
+    path = tmp_path / "events.jsonl"
+    events = job_events.JobEvents(cache=False)
+    source = job_events.FileEventSource(events, str(path), interval=0)
+    assert source.poll_once() == 0  # the file doesn't exist yet
+
+    first, last = replay("workflow-a")
+    encoded = json.dumps(last)
+    with open(path, "w") as f:
+        f.write(json.dumps(first) + "\n" + encoded[:10])
+    assert source.poll_once() == 1
+    assert events.status("workflow-a") == "InProgress"
+
+    with open(path, "a") as f:
+        f.write(encoded[10:] + "\n")
+    assert source.poll_once() == 1
+    assert events.status("workflow-a") == "Completed"
+
+
+def test_event_sources_must_receive():
+    with pytest.raises(TypeError):
+        job_events.EventSource(job_events.JobEvents(cache=False))
+
+
+def test_wait_for_complete_with_events(session, sagemaker):
+    events = job_events.JobEvents(cache=False)
+    for event in replay("workflow-a", final="Failed"):
+        events.publish(event)
+    sagemaker.add_response(
+        "describe_processing_job",
+        description("workflow-a", "InProgress"),
+        {"ProcessingJobName": "workflow-a"},
+    )
+    status, failure = run_notebook.wait_for_complete(
+        "workflow-a", progress=False, session=session, events=events
+    )
+    assert status == "Failed"
+    assert failure == "The notebook raised an exception"
+
+
+def test_delete_event_topic_retries_throttles(session, monkeypatch):
+    clients = {name: retry.client(session, name) for name in ["sns", "events"]}
+    monkeypatch.setattr(retry, "client", lambda session, name: clients[name])
+    topic_arn = "arn:aws:sns:us-east-1:123456789012:" + job_events.EVENTS_NAME
+    with Stubber(clients["sns"]) as sns, Stubber(clients["events"]) as events:
+        events.add_client_error(
+            "remove_targets", service_error_code="ThrottlingException"
+        )
+        events.add_response(
+            "remove_targets",
+            {"FailedEntryCount": 0},
+            {"Rule": job_events.EVENTS_NAME, "Ids": ["Default"]},
+        )
+        events.add_client_error("delete_rule", service_error_code="ThrottlingException")
+        events.add_response("delete_rule", {}, {"Name": job_events.EVENTS_NAME})
+        sns.add_response(
+            "create_topic", {"TopicArn": topic_arn}, {"Name": job_events.EVENTS_NAME}
+        )
+        sns.add_client_error("delete_topic", service_error_code="Throttling")
+        sns.add_response("delete_topic", {}, {"TopicArn": topic_arn})
+
+        job_events.delete_event_topic(session=session)
+        sns.assert_no_pending_responses()
+        events.assert_no_pending_responses()
@@ -0,0 +1,107 @@
+import pytest
+from botocore.stub import Stubber
+
+from sagemaker_run_notebook import lambda_function
+
+JOB_NAME = "workflow-powers-1"
+ARN = "arn:aws:sagemaker:us-east-1:123456789012:processing-job/" + JOB_NAME
+
+
+def api_args(parameters=None):
+    return lambda_function.build_processing_args(
+        image="123456789012.dkr.ecr.us-east-1.amazonaws.com/sagemaker-run-notebook:sandbox-latest",
+        input_path="s3://bucket/papermill_input/powers.ipynb",
+        output_prefix="s3://bucket/papermill_output",
+        notebook="powers.ipynb",
+        parameters=dict(job_id=JOB_NAME, **(parameters or {"n": 1})),
+        role="arn:aws:iam::123456789012:role/BasicExecuteNotebookRole-us-east-1",
+        instance_type="ml.m5.large",
+    )
+
+
+def existing(environment):
+    return {
+        "ProcessingJobName": JOB_NAME,
+        "ProcessingJobArn": ARN,
+        "ProcessingJobStatus": "InProgress",
+        "CreationTime": "2021-03-01T12:00:00Z",
+        "ProcessingResources": {
+            "ClusterConfig": {
+                "InstanceCount": 1,
+                "InstanceType": "ml.m5.large",
+                "VolumeSizeInGB": 30,
+            }
+        },
+        "AppSpecification": {"ImageUri": "sagemaker-run-notebook"},
+        "Environment": environment,
+    }
+
+
+@pytest.fixture
+def sagemaker(session):
+    client = session.client("sagemaker")
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_build_processing_args_records_the_parameters_hash():
+    args = api_args()
+    assert args["ProcessingJobName"] == JOB_NAME
+    env = args["Environment"]
+    assert env[lambda_function.PARAMS_HASH_VAR] == lambda_function.parameters_hash(
+        {"job_id": JOB_NAME, "n": 1}
+    )
+    assert "job_id" not in env["PAPERMILL_PARAMS"]
+    assert (
+        api_args({"n": 2})["Environment"][lambda_function.PARAMS_HASH_VAR]
+        != env[lambda_function.PARAMS_HASH_VAR]
+    )
+
+
+def test_starts_a_new_job(sagemaker):
+    client, stubber = sagemaker
+    args = api_args()
+    stubber.add_response("create_processing_job", {"ProcessingJobArn": ARN}, args)
+    assert lambda_function.start_processing_job(client, args) == JOB_NAME
+
+
+def resubmit(sagemaker, environment):
+    client, stubber = sagemaker
+    args = api_args()
+    stubber.add_client_error(
+        "create_processing_job", service_error_code="ResourceInUse"
+    )
+    stubber.add_response(
+        "describe_processing_job",
+        existing(environment),
+        {"ProcessingJobName": JOB_NAME},
+    )
+    return lambda_function.start_processing_job(client, args)
+
+
+def test_resubmitting_the_same_run_returns_the_job(sagemaker):
+    environment = api_args()["Environment"]
+    assert resubmit(sagemaker, environment) == JOB_NAME
+
+
+def test_resubmitting_different_parameters_raises(sagemaker):
+    environment = api_args({"n": 2})["Environment"]
+    with pytest.raises(ValueError, match="different parameters"):
+        resubmit(sagemaker, environment)
+
+
+def test_a_job_without_a_parameters_hash_is_not_the_same_run(sagemaker):
+    environment = dict(api_args()["Environment"])
+    del environment[lambda_function.PARAMS_HASH_VAR]
+    with pytest.raises(ValueError, match="without a parameters hash"):
+        resubmit(sagemaker, environment)
+
+
+def test_other_errors_are_raised(sagemaker):
+    client, stubber = sagemaker
+    stubber.add_client_error(
+        "create_processing_job", service_error_code="ValidationException"
+    )
+    with pytest.raises(client.exceptions.ClientError):
+        lambda_function.start_processing_job(client, api_args())
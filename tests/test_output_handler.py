@@ -0,0 +1,176 @@
+import gzip
+import io
+import json
+from unittest import mock
+
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+from handler_case import PREFIX, HandlerTestCase
+from sagemaker_run_notebook import retry
+from sagemaker_run_notebook.server_extension import handlers
+
+IMAGE = "iVBORw0KGgo" * 100
+
+NOTEBOOK = {
+    "cells": [
+        {
+            "cell_type": "code",
+            "source": "plot()",
+            "metadata": {},
+            "execution_count": 1,
+            "outputs": [
+                {"output_type": "stream", "name": "stdout", "text": "x" * 300},
+                {
+                    "output_type": "display_data",
+                    "metadata": {},
+                    "data": {"image/png": IMAGE, "text/plain": "<Figure>"},
+                },
+            ],
+        }
+    ],
+    "metadata": {},
+    "nbformat": 4,
+    "nbformat_minor": 4,
+}
+BODY = json.dumps(NOTEBOOK).encode("utf-8")
+RESULT = "s3://bucket/papermill_output/powers-2021-03-01.ipynb"
+
+
+def streaming(data):
+    return StreamingBody(io.BytesIO(data), len(data))
+
+
+def test_strip_outputs():
+    nb = json.loads(BODY)
+    assert handlers.strip_outputs(nb, 100) == 2
+    stream, display = nb["cells"][0]["outputs"]
+    assert stream["text"] == "x" * 100 + "\n[200 characters truncated]\n"
+    assert display["data"] == {"text/plain": "<Figure>"}
+    assert nb["metadata"]["sagemaker_run_notebook"] == {
+        "stripped_outputs": 2,
+        "max_output_bytes": 100,
+    }
+
+    nb = json.loads(BODY)
+    assert handlers.strip_outputs(nb, len(IMAGE)) == 0
+    assert nb == NOTEBOOK
+
+
+class OutputHandlerTest(HandlerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.result = RESULT
+        describe = mock.patch.object(
+            handlers.run,
+            "describe_run",
+            lambda job_name, session=None: {
+                "Notebook": "powers.ipynb",
+                "Result": self.result,
+            },
+        )
+        describe.start()
+        self.addCleanup(describe.stop)
+        self.s3 = retry.client(self.session, "s3")
+        client = mock.patch.object(
+            handlers.retry, "client", lambda session, name: self.s3
+        )
+        client.start()
+        self.addCleanup(client.stop)
+        self.stubber = Stubber(self.s3)
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+
+    def serve(self, body, key="papermill_output/powers-2021-03-01.ipynb", **extra):
+        expected = {"Bucket": "bucket", "Key": key}
+        response = {"Body": streaming(body), "ContentLength": len(body)}
+        if "Range" in extra:
+            expected["Range"] = extra.pop("Range")
+        response.update(extra)
+        self.stubber.add_response("get_object", response, expected)
+
+    def fetch_output(self, query="", **headers):
+        return self.fetch(
+            PREFIX + "output/workflow-powers-1" + query,
+            headers=headers,
+            decompress_response=False,
+        )
+
+    def test_raw_notebook(self):
+        self.serve(BODY)
+        response = self.fetch_output("?format=raw")
+        assert response.code == 200
+        assert response.body == BODY
+        assert response.headers["X-Output-Object"] == RESULT
+        assert response.headers["Accept-Ranges"] == "bytes"
+        assert int(response.headers["Content-Length"]) == len(BODY)
+
+    def test_gzip_encoding(self):
+        self.serve(BODY)
+        response = self.fetch_output("?format=raw", **{"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(response.body) == BODY
+
+    def test_ranges(self):
+        self.serve(
+            BODY[:10],
+            Range="bytes=0-9",
+            ContentRange="bytes 0-9/{}".format(len(BODY)),
+        )
+        response = self.fetch_output("?format=raw", Range="bytes=0-9")
+        assert response.code == 206
+        assert response.body == BODY[:10]
+        assert response.headers["Content-Range"] == "bytes 0-9/{}".format(len(BODY))
+
+    def test_json_wrapper(self):
+        self.serve(BODY)
+        response = self.fetch_output()
+        assert response.headers["Content-Type"] == "application/json"
+        assert json.loads(response.body) == {
+            "notebook": "powers.ipynb",
+            "output_object": RESULT,
+            "data": BODY.decode("utf-8"),
+        }
+
+    def test_compressed_notebooks_are_sent_as_stored(self):
+        self.result = RESULT + ".gz"
+        stored = gzip.compress(BODY)
+        self.serve(stored, key="papermill_output/powers-2021-03-01.ipynb.gz")
+        response = self.fetch_output(
+            "?format=raw", Range="bytes=0-9", **{"Accept-Encoding": "gzip"}
+        )
+        assert response.code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Ranges" not in response.headers
+        assert response.body == stored
+
+        # and decompressed for clients that don't accept gzip
+        self.serve(stored, key="papermill_output/powers-2021-03-01.ipynb.gz")
+        response = self.fetch_output("?format=raw")
+        assert "Content-Encoding" not in response.headers
+        assert response.body == BODY
+
+    def test_strip(self):
+        self.result = RESULT + ".gz"
+        self.serve(
+            gzip.compress(BODY), key="papermill_output/powers-2021-03-01.ipynb.gz"
+        )
+        response = self.fetch_output("?format=raw&strip=100")
+        nb = json.loads(response.body)
+        assert nb["metadata"]["sagemaker_run_notebook"]["stripped_outputs"] == 2
+
+    def test_errors(self):
+        response = self.fetch_output("?strip=-1")
+        assert response.code == 400
+
+        self.result = None
+        response = self.fetch_output()
+        assert response.code == 404
+        assert json.loads(response.body)["error"]["type"] == "NoOutput"
+
+        self.result = RESULT
+        self.stubber.add_client_error(
+            "get_object", service_error_code="NoSuchKey", http_status_code=404
+        )
+        response = self.fetch_output()
+        assert json.loads(response.body)["error"]["type"] == "ClientError"
@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import json
+import sys
+
+import pytest
+from botocore.stub import Stubber
+
+from sagemaker_run_notebook import retry
+
+run_notebook = sys.modules["sagemaker_run_notebook.run_notebook"]
+
+PARAMS = {"dataset": "s3://bucket/data.csv", "fields": ["title"] * 100}
+
+
+def test_encode_json_compresses_deterministically():
+    plain, suffix = run_notebook.encode_json(PARAMS)
+    assert suffix == ".json"
+    assert json.loads(plain) == PARAMS
+
+    body, suffix = run_notebook.encode_json(PARAMS, "gzip")
+    assert suffix == ".json.gz"
+    assert json.loads(gzip.decompress(body)) == PARAMS
+    assert len(body) < len(plain)
+    # no timestamp in the header, so the same parameters have the same digest
+    assert run_notebook.encode_json(PARAMS, "gzip")[0] == body
+
+
+def test_encode_json_zstd():
+    zstandard = pytest.importorskip("zstandard")
+    body, suffix = run_notebook.encode_json(PARAMS, "zstd")
+    assert suffix == ".json.zst"
+    assert json.loads(zstandard.ZstdDecompressor().decompress(body)) == PARAMS
+
+
+def test_encode_json_rejects_unknown_compressions():
+    with pytest.raises(ValueError, match="Unknown compression"):
+        run_notebook.encode_json(PARAMS, "bz2")
+
+
+def test_split_parameters_shares_equal_values():
+    shared, rest = run_notebook.split_parameters(
+        [
+            {"job_id": "job-0", "n": 0, "data": {"a": 1, "b": 2}, "model": "x"},
+            {"job_id": "job-0", "n": 1, "data": {"b": 2, "a": 1}, "model": "y"},
+        ]
+    )
+    assert shared == {"data": {"a": 1, "b": 2}}
+    assert rest == [
+        {"job_id": "job-0", "n": 0, "model": "x"},
+        {"job_id": "job-0", "n": 1, "model": "y"},
+    ]
+    # keys that some runs don't have aren't shared
+    shared, rest = run_notebook.split_parameters([{"a": 1}, {"a": 1}, {}])
+    assert shared == {}
+    assert run_notebook.split_parameters([]) == ({}, [])
+
+
+def test_params_file_name_includes_the_hash():
+    assert run_notebook.params_file_name("job-0", "0123456789abcdef0123") == (
+        "job-0-0123456789abcdef.json"
+    )
+
+
+class FakeS3:
+    def __init__(self):
+        self.puts = []
+
+    def put_object(self, Body, Bucket, Key):
+        self.puts.append((Bucket, Key, Body))
+
+
+@pytest.fixture
+def s3(session, monkeypatch):
+    fake = FakeS3()
+    head = retry.client(session, "s3")
+    monkeypatch.setattr(retry, "client", lambda session, name: head)
+    monkeypatch.setattr(run_notebook, "default_bucket", lambda session: "bucket")
+    monkeypatch.setattr(run_notebook, "_upload_index", None)
+    with Stubber(head) as stubber:
+        yield fake, stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_upload_json_names_the_compressed_file(session, s3):
+    fake, _ = s3
+    s3path = run_notebook.upload_json(
+        PARAMS, "job-0.json", session=session, client=fake, compression="gzip"
+    )
+    assert s3path == "s3://bucket/papermill_input/job-0.json.gz"
+    ((bucket, key, body),) = fake.puts
+    assert key == "papermill_input/job-0.json.gz"
+    assert json.loads(gzip.decompress(body)) == PARAMS
+
+
+def test_shared_parameters_are_uploaded_once(session, s3):
+    fake, stubber = s3
+    body, _ = run_notebook.encode_json(PARAMS, "gzip")
+    key = "papermill_input/params/sha256/{}.json.gz".format(
+        hashlib.sha256(body).hexdigest()
+    )
+    first = run_notebook.upload_shared_json(
+        PARAMS, session=session, client=fake, compression="gzip"
+    )
+    assert first == "s3://bucket/" + key
+    stubber.add_response(
+        "head_object", {"ContentLength": len(body)}, {"Bucket": "bucket", "Key": key}
+    )
+    second = run_notebook.upload_shared_json(
+        PARAMS, session=session, client=fake, compression="gzip"
+    )
+    assert second == first
+    assert [put[1] for put in fake.puts] == [key]
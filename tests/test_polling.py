@@ -0,0 +1,129 @@
+import datetime
+import sys
+
+import pytest
+from botocore.stub import Stubber
+from dateutil.tz import tzlocal
+
+from sagemaker_run_notebook import polling, retry
+
+run_notebook = sys.modules["sagemaker_run_notebook.run_notebook"]
+
+ARN = "arn:aws:sagemaker:us-east-1:123456789012:processing-job/"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def stats():
+    polling.reset_poll_stats()
+    yield
+    polling.reset_poll_stats()
+
+
+def test_unknown_durations_back_off_geometrically():
+    scheduler = polling.PollScheduler(min_interval=5, max_interval=30, backoff=2)
+    assert [scheduler.interval(0, polls) for polls in range(1, 6)] == [
+        5,
+        10,
+        20,
+        30,
+        30,
+    ]
+
+
+def test_known_durations_poll_rarely_then_around_the_end():
+    scheduler = polling.PollScheduler(expected=1000, min_interval=5, max_interval=300)
+    # half of the time left until 900s, capped
+    assert scheduler.interval(0, 1) == 300
+    assert scheduler.interval(500, 2) == 200
+    assert scheduler.interval(880, 3) == 10
+    # 1% of the expected duration around the end, but at least min_interval
+    assert scheduler.interval(950, 4) == 10
+    assert scheduler.interval(1050, 5) == 10
+    # backing off once overdue
+    assert scheduler.interval(1500, 6) == 100
+    assert scheduler.interval(5000, 7) == 300
+
+
+def test_known_durations_need_fewer_polls_than_a_fixed_interval():
+    scheduler = polling.PollScheduler(expected=3600)
+    assert scheduler.planned_polls(3600) < 3600 / polling.FIXED_INTERVAL / 4
+
+
+def test_finish_records_stats_and_durations():
+    clock = FakeClock()
+    scheduler = polling.PollScheduler(expected=100, name="test", clock=clock)
+    for _ in range(3):
+        clock.now += scheduler.next_interval()
+    scheduler.finish("build:project")
+
+    stats = polling.poll_stats()["test"]
+    assert stats["waits"] == 1
+    assert stats["polls"] == 4
+    assert stats["actual_seconds"] == clock.now
+    assert stats["expected_seconds"] == 100
+    assert stats["expected_polls"] == scheduler.planned_polls(100)
+    assert stats["fixed_interval_polls"] == 1 + -(-clock.now // polling.FIXED_INTERVAL)
+    assert polling.expected_duration("build:project") == clock.now
+
+
+def test_expected_duration_is_the_median_of_the_recent_history():
+    assert polling.expected_duration("stack:infra") is None
+    for seconds in [10, 1000, 30]:
+        polling.record_duration("stack:infra", seconds)
+    assert polling.expected_duration("stack:infra") == 30
+    for _ in range(polling.HISTORY_SIZE):
+        polling.record_duration("stack:infra", 60)
+    assert polling.expected_duration("stack:infra") == 60
+
+
+def test_expected_run_duration_scans_earlier_runs(session, monkeypatch):
+    created = datetime.datetime(2021, 3, 1, 12, 0, tzinfo=tzlocal())
+
+    def describe_run(job_name, session=None, client=None):
+        n = int(job_name.rsplit("-", 1)[1])
+        return {
+            "Notebook": "powers.ipynb" if n % 2 else "other.ipynb",
+            "Rule": "",
+            "Created": created,
+            "End": created + datetime.timedelta(minutes=n),
+        }
+
+    monkeypatch.setattr(run_notebook, "describe_run", describe_run)
+    client = retry.client(session, "sagemaker")
+    monkeypatch.setattr(retry, "client", lambda session, name: client)
+    with Stubber(client) as stubber:
+        stubber.add_response(
+            "list_processing_jobs",
+            {
+                "ProcessingJobSummaries": [
+                    {
+                        "ProcessingJobName": f"workflow-powers-{n}",
+                        "ProcessingJobArn": ARN + f"workflow-powers-{n}",
+                        "ProcessingJobStatus": "Completed",
+                        "CreationTime": created,
+                    }
+                    for n in range(1, 6)
+                ]
+            },
+            {
+                "NameContains": "workflow-",
+                "StatusEquals": "Completed",
+                "MaxResults": 20,
+            },
+        )
+        assert (
+            run_notebook.expected_run_duration("powers.ipynb", session=session) == 180
+        )
+        # then from the recorded durations without calling AWS
+        assert (
+            run_notebook.expected_run_duration("powers.ipynb", session=session) == 180
+        )
+    assert run_notebook.expected_run_duration("other.ipynb", scan=0) is None
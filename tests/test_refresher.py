@@ -0,0 +1,65 @@
+import os
+import threading
+from unittest import mock
+
+from tornado.testing import gen_test
+
+from handler_case import HandlerTestCase
+from sagemaker_run_notebook import job_events
+from sagemaker_run_notebook.server_extension import refresher
+
+TOPIC_ARN = "arn:aws:sns:us-east-1:123456789012:sagemaker-run-notebook-events"
+
+
+class RefresherTest(HandlerTestCase):
+    def test_metrics_do_not_start_a_refresher(self):
+        response, metrics = self.get_json("metrics")
+        assert response.code == 200
+        assert metrics["refresher"] == {}
+        assert refresher._refresher is None
+
+    def test_metrics_report_the_refresher(self):
+        self.use_runs([])
+        _, metrics = self.get_json("metrics")
+        assert metrics["refresher"]["refreshes"] == 0
+        assert metrics["refresher"]["runs"] == 0
+
+    @gen_test
+    async def test_subscribes_to_the_events_off_the_io_loop(self):
+        events = job_events.JobEvents(cache=False)
+        threads = []
+
+        def subscribe(topic_arn):
+            threads.append(threading.get_ident())
+            return events
+
+        r = refresher.RunsRefresher(self.session)
+        r._subscribe = subscribe
+        with mock.patch.dict(
+            os.environ, {"SAGEMAKER_RUN_NOTEBOOK_EVENTS_TOPIC": TOPIC_ARN}
+        ):
+            r.start()
+        try:
+            assert r.tracker.events is None
+            await r.subscribing
+        finally:
+            r.stop()
+        assert threads and threads[0] != threading.get_ident()
+        assert r.tracker.events is events
+
+    @gen_test
+    async def test_failed_subscriptions_leave_the_tracker_polling(self):
+        def subscribe(topic_arn):
+            raise RuntimeError("AccessDenied")
+
+        r = refresher.RunsRefresher(self.session)
+        r._subscribe = subscribe
+        with mock.patch.dict(
+            os.environ, {"SAGEMAKER_RUN_NOTEBOOK_EVENTS_TOPIC": TOPIC_ARN}
+        ):
+            r.start()
+        try:
+            await r.subscribing
+        finally:
+            r.stop()
+        assert r.tracker.events is None
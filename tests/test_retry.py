@@ -0,0 +1,132 @@
+import asyncio
+
+import botocore
+import pytest
+
+from sagemaker_run_notebook import retry
+
+
+def client_error(code):
+    return botocore.exceptions.ClientError(
+        {"Error": {"Code": code, "Message": code}}, "CreateProcessingJob"
+    )
+
+
+class Flaky:
+    """Raises the errors in turn, then returns "ok" """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """Record the delays instead of sleeping"""
+    delays = []
+    monkeypatch.setattr(retry.time, "sleep", delays.append)
+    return delays
+
+
+def test_retries_throttles_until_they_succeed(no_sleep):
+    policy = retry.RetryPolicy()
+    fn = Flaky(client_error("ThrottlingException"), client_error("ServiceUnavailable"))
+    assert policy.call("CreateProcessingJob", fn) == "ok"
+    assert fn.calls == 3
+    assert len(no_sleep) == 2
+    assert policy.metrics()["CreateProcessingJob"] == dict(
+        calls=1, retries=2, throttles=1, failures=0, exhausted=0
+    )
+
+
+def test_other_errors_are_not_retried(no_sleep):
+    policy = retry.RetryPolicy()
+    fn = Flaky(client_error("ValidationException"))
+    with pytest.raises(botocore.exceptions.ClientError):
+        policy.call("CreateProcessingJob", fn)
+    assert fn.calls == 1
+    assert no_sleep == []
+    assert policy.metrics()["CreateProcessingJob"]["failures"] == 1
+
+
+def test_gives_up_after_max_attempts(no_sleep):
+    policy = retry.RetryPolicy(max_attempts=3)
+    fn = Flaky(*[client_error("Throttling")] * 5)
+    with pytest.raises(botocore.exceptions.ClientError):
+        policy.call("DescribeProcessingJob", fn)
+    assert fn.calls == 3
+    m = policy.metrics()["DescribeProcessingJob"]
+    assert m["retries"] == 2 and m["throttles"] == 3 and m["exhausted"] == 1
+
+
+def test_a_single_attempt_never_retries(no_sleep):
+    policy = retry.RetryPolicy(max_attempts=1)
+    with pytest.raises(botocore.exceptions.ClientError):
+        policy.call("Invoke", Flaky(client_error("TooManyRequestsException")))
+    assert no_sleep == []
+
+
+def test_the_budget_limits_retries_across_calls(no_sleep):
+    policy = retry.RetryPolicy(budget_ratio=0.5, budget_max=2)
+    fn = Flaky(*[client_error("SlowDown")] * 10)
+    with pytest.raises(botocore.exceptions.ClientError):
+        policy.call("PutObject", fn)
+    # the full budget of 2 allows two retries
+    assert fn.calls == 3
+    assert policy.budget == pytest.approx(0)
+
+    # each call earns half a retry
+    fn = Flaky(*[client_error("SlowDown")] * 10)
+    with pytest.raises(botocore.exceptions.ClientError):
+        policy.call("PutObject", fn)
+    assert fn.calls == 1
+    fn = Flaky(*[client_error("SlowDown")] * 10)
+    with pytest.raises(botocore.exceptions.ClientError):
+        policy.call("PutObject", fn)
+    assert fn.calls == 2
+
+
+def test_delays_are_jittered_and_capped(monkeypatch):
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: high)
+    policy = retry.RetryPolicy(base_delay=0.25, max_delay=1)
+    assert [policy.delay(attempt) for attempt in range(1, 6)] == [
+        0.25,
+        0.5,
+        1,
+        1,
+        1,
+    ]
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: low)
+    assert policy.delay(3) == 0
+
+
+def test_connection_errors_are_retried(no_sleep):
+    policy = retry.RetryPolicy()
+    fn = Flaky(botocore.exceptions.EndpointConnectionError(endpoint_url="https://x"))
+    assert policy.call("ListProcessingJobs", fn) == "ok"
+    assert fn.calls == 2
+
+
+def test_call_async_waits_without_blocking(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(retry.asyncio, "sleep", sleep)
+    policy = retry.RetryPolicy()
+    fn = Flaky(client_error("ThrottlingException"))
+    assert asyncio.run(policy.call_async("ListProcessingJobs", fn)) == "ok"
+    assert fn.calls == 2
+    assert len(delays) == 1
+
+
+def test_clients_have_botocore_retries_off(session):
+    client = retry.client(session, "sagemaker")
+    assert client.meta.config.retries["total_max_attempts"] == 1
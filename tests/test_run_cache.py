@@ -0,0 +1,93 @@
+import datetime
+
+import pytest
+from dateutil.tz import tzutc
+
+from sagemaker_run_notebook import run_cache
+from sagemaker_run_notebook.run_cache import RunCache
+
+CREATED = datetime.datetime(2021, 3, 1, 12, 0, tzinfo=tzutc())
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(run_cache.time, "time", clock)
+    return clock
+
+
+def description(job_name, status="Completed"):
+    return {
+        "ProcessingJobName": job_name,
+        "ProcessingJobStatus": status,
+        "CreationTime": CREATED,
+    }
+
+
+def test_round_trips_descriptions(tmp_path):
+    cache = RunCache(str(tmp_path / "runs.sqlite"))
+    cache.put("a", description("workflow-a"))
+    assert cache.get("a") == description("workflow-a")
+    assert cache.get("a")["CreationTime"] == CREATED
+    assert cache.get("b") is None
+
+    # the cache is shared through the file
+    assert RunCache(str(tmp_path / "runs.sqlite")).get("a") == description("workflow-a")
+    assert cache.stats() == dict(entries=1, hits=2, misses=1)
+
+
+def test_running_jobs_expire(clock):
+    cache = RunCache(":memory:", ttl=10)
+    cache.put("running", description("workflow-a", status="InProgress"))
+    cache.put("done", description("workflow-b"))
+    clock.now += 9
+    assert cache.get("running") is not None
+    clock.now += 1
+    assert cache.get("running") is None
+    clock.now += 1e6
+    assert cache.get("done") is not None
+
+
+def test_evicts_the_least_recently_used(clock):
+    cache = RunCache(":memory:", max_entries=2, touch_interval=0)
+    cache.put("a", description("workflow-a"))
+    clock.now += 1
+    cache.put("b", description("workflow-b"))
+    clock.now += 1
+    assert cache.get("a") is not None  # now "b" is the least recently used
+    for n in range(100):
+        clock.now += 1
+        cache.put("c", description("workflow-c"))
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_hits_only_touch_stale_entries(clock):
+    cache = RunCache(":memory:", max_entries=1, touch_interval=300)
+    cache.put("a", description("workflow-a"))
+
+    def used():
+        return cache.conn.execute("SELECT used FROM runs WHERE key = 'a'").fetchone()[0]
+
+    clock.now += 100
+    cache.get("a")
+    assert used() == 1000.0
+    clock.now += 200
+    cache.get("a")
+    assert used() == 1300.0
+
+
+def test_run_cache_can_be_turned_off(monkeypatch):
+    monkeypatch.setenv("SAGEMAKER_RUN_NOTEBOOK_NO_RUN_CACHE", "1")
+    assert run_cache.run_cache() is None
+    monkeypatch.delenv("SAGEMAKER_RUN_NOTEBOOK_NO_RUN_CACHE")
+    assert run_cache.run_cache() is run_cache.run_cache()
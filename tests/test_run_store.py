@@ -0,0 +1,165 @@
+import pytest
+
+from sagemaker_run_notebook.run_store import RunStore
+
+
+def run_desc(n, status="Completed", notebook="powers.ipynb", rule=""):
+    return {
+        "Job": "workflow-powers-{}".format(n),
+        "Notebook": notebook,
+        "Rule": rule,
+        "Status": status,
+    }
+
+
+def names(runs):
+    return [run["Job"] for run in runs]
+
+
+def test_older_runs_are_not_changes():
+    store = RunStore(10)
+    store.add(run_desc(1))
+    version = store.version
+    assert store.add_oldest(run_desc(0))
+    store.add(run_desc(2))
+
+    assert names(store.query(since=version)) == ["workflow-powers-2"]
+    assert store.added_since(version) == ["workflow-powers-2"]
+    assert names(store) == [
+        "workflow-powers-2",
+        "workflow-powers-1",
+        "workflow-powers-0",
+    ]
+
+    # until they change
+    version = store.version
+    store.update("workflow-powers-0", Status="Failed")
+    assert names(store.query(since=version)) == ["workflow-powers-0"]
+    assert store.added_since(version) == []
+
+
+def test_evicted_runs_are_no_longer_added():
+    store = RunStore(2)
+    for n in range(3):
+        store.add(run_desc(n))
+    assert store.added_since(0) == ["workflow-powers-1", "workflow-powers-2"]
+    assert store.removed_since(0) == ["workflow-powers-0"]
+
+
+def test_query_since_returns_added_and_changed_runs():
+    store = RunStore(10)
+    for n in range(3):
+        store.add(run_desc(n))
+    version = store.version
+    assert store.query(since=version) == []
+
+    store.update("workflow-powers-0", Status="Failed")
+    store.update("workflow-powers-1", Status="Completed")  # no change
+    store.add(run_desc(3, notebook="other.ipynb"))
+    assert names(store.query(since=version)) == [
+        "workflow-powers-3",
+        "workflow-powers-0",
+    ]
+    assert names(store.query(since=version, notebook="powers.ipynb")) == [
+        "workflow-powers-0"
+    ]
+    assert names(store.query(since=version, limit=1)) == ["workflow-powers-3"]
+
+
+def test_removed_since_forgets_old_removals():
+    store = RunStore(2)
+    store.add(run_desc(0))
+    store.add(run_desc(1))
+    start = store.version
+    store.add(run_desc(2))
+    store.add(run_desc(3))
+    assert store.removed_since(start) == ["workflow-powers-0", "workflow-powers-1"]
+
+    # only the last `capacity` removals are remembered
+    store.add(run_desc(4))
+    assert store.removed_since(start) is None
+    assert store.removed_since(start + 1) == ["workflow-powers-1", "workflow-powers-2"]
+
+    store.clear()
+    assert store.removed_since(start + 1) is None
+    assert store.removed_since(store.version) == []
+
+
+def test_ring_buffer_keeps_the_newest_runs():
+    store = RunStore(3)
+    evicted = [store.add(run_desc(n)) for n in range(5)]
+    assert evicted[:3] == [None, None, None]
+    assert names(evicted[3:]) == ["workflow-powers-0", "workflow-powers-1"]
+    assert len(store) == 3
+    assert names(store) == [
+        "workflow-powers-4",
+        "workflow-powers-3",
+        "workflow-powers-2",
+    ]
+    assert store[0]["Job"] == "workflow-powers-4"
+    assert store[-1]["Job"] == "workflow-powers-2"
+    assert names(store[1:]) == ["workflow-powers-3", "workflow-powers-2"]
+    assert "workflow-powers-1" not in store
+    assert store.get("workflow-powers-1") is None
+    with pytest.raises(IndexError):
+        store[3]
+
+
+def test_adding_a_run_again_updates_it():
+    store = RunStore(3)
+    store.add(run_desc(0))
+    store.add(run_desc(1))
+    assert store.add(run_desc(0, status="Failed")) is None
+    assert names(store) == ["workflow-powers-1", "workflow-powers-0"]
+    assert store.get("workflow-powers-0")["Status"] == "Failed"
+
+
+def test_indexes_follow_updates_and_evictions():
+    store = RunStore(3)
+    store.add(run_desc(0, status="InProgress", rule="nightly"))
+    store.add(run_desc(1, status="InProgress", notebook="other.ipynb"))
+    store.add(run_desc(2, status="Failed", rule="nightly"))
+    assert names(store.query(status="InProgress")) == [
+        "workflow-powers-1",
+        "workflow-powers-0",
+    ]
+    assert names(store.query(status="InProgress", rule="nightly")) == [
+        "workflow-powers-0"
+    ]
+    assert store.count(notebook="powers.ipynb") == 2
+
+    store.update("workflow-powers-0", Status="Completed")
+    assert names(store.query(status="InProgress")) == ["workflow-powers-1"]
+    assert store.count(status="Completed") == 1
+
+    store.add(run_desc(3))  # evicts workflow-powers-0
+    assert store.count(status="Completed") == 1
+    assert names(store.query(rule="nightly")) == ["workflow-powers-2"]
+    assert store.query(status="Stopped") == []
+    assert names(store.query(offset=1, limit=1)) == ["workflow-powers-2"]
+
+
+def test_add_oldest_fills_in_without_evicting():
+    store = RunStore(3)
+    assert store.oldest() is None
+    store.add(run_desc(5))
+    assert store.add_oldest(run_desc(4))
+    assert store.add_oldest(run_desc(3, status="Failed"))
+    assert not store.add_oldest(run_desc(2))  # full
+    assert not store.add_oldest(run_desc(4))  # already there
+    assert names(store) == [
+        "workflow-powers-5",
+        "workflow-powers-4",
+        "workflow-powers-3",
+    ]
+    assert store.oldest()["Job"] == "workflow-powers-3"
+    assert names(store.query(status="Failed")) == ["workflow-powers-3"]
+
+    # new runs evict the oldest of the runs filled in
+    assert store.add(run_desc(6))["Job"] == "workflow-powers-3"
+    assert store.count(status="Failed") == 0
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        RunStore(0)
@@ -0,0 +1,129 @@
+import json
+
+from tornado.testing import gen_test
+
+from handler_case import PREFIX, HandlerTestCase, refreshed, run_desc
+from sagemaker_run_notebook.server_extension import handlers
+
+
+def names(runs):
+    return [run["Job"] for run in runs]
+
+
+def parse_events(data):
+    """Parse a server-sent events stream into (event, data) pairs"""
+    events = []
+    for block in data.decode().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1)
+            for line in block.splitlines()
+            if not line.startswith(":")
+        )
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class RunsDeltaTest(HandlerTestCase):
+    def test_since_returns_new_runs_but_not_older_ones_filled_in(self):
+        r = self.use_runs([run_desc(2), run_desc(1)], older=[run_desc(0)])
+        _, first = self.get_json("runs?limit=2")
+        assert names(first["runs"]) == ["workflow-powers-2", "workflow-powers-1"]
+
+        r.runs.add(run_desc(3))
+        r.runs.add_oldest(run_desc(0))
+        _, delta = self.get_json("runs?since={}".format(first["version"]))
+        assert names(delta["runs"]) == ["workflow-powers-3"]
+        assert delta["added"] == ["workflow-powers-3"]
+        assert delta["removed"] == []
+
+    @gen_test
+    async def test_stream_sends_a_reset_then_deltas(self):
+        r = self.use_runs([run_desc(2), run_desc(1)])
+        chunks = []
+        self.http_client.fetch(
+            self.get_url(PREFIX + "runs/stream?limit=2"),
+            streaming_callback=chunks.append,
+            request_timeout=30,
+            raise_error=False,
+        )
+        await self.wait_until(lambda: b"event: reset" in b"".join(chunks))
+
+        r.runs.add(run_desc(3))
+        r.runs.add_oldest(run_desc(0))
+        r.runs.update("workflow-powers-1", Status="Failed")
+        refreshed(r)
+        await self.wait_until(lambda: b"event: delta" in b"".join(chunks))
+
+        (reset, first), (delta, second) = parse_events(b"".join(chunks))
+        assert reset == "reset" and delta == "delta"
+        assert names(first["runs"]) == ["workflow-powers-2", "workflow-powers-1"]
+        assert names(second["runs"]) == ["workflow-powers-3", "workflow-powers-1"]
+        assert second["added"] == ["workflow-powers-3"]
+
+
+class RunsEtagTest(HandlerTestCase):
+    def test_unchanged_runs_are_not_modified(self):
+        r = self.use_runs([run_desc(1), run_desc(0)])
+        response, body = self.get_json("runs")
+        assert response.code == 200
+        assert names(body["runs"]) == ["workflow-powers-1", "workflow-powers-0"]
+        etag = response.headers["Etag"]
+
+        response = self.fetch(PREFIX + "runs", headers={"If-None-Match": etag})
+        assert response.code == 304
+
+        # another query of the same version has another ETag
+        response = self.fetch(
+            PREFIX + "runs?status=Failed", headers={"If-None-Match": etag}
+        )
+        assert response.code == 200
+
+        r.runs.update("workflow-powers-0", Status="Failed")
+        response = self.fetch(PREFIX + "runs", headers={"If-None-Match": etag})
+        assert response.code == 200
+        assert response.headers["Etag"] != etag
+
+    def test_filters_and_pages(self):
+        self.use_runs(
+            [run_desc(3, status="Failed"), run_desc(2), run_desc(1, status="Failed")]
+        )
+        _, body = self.get_json("runs?status=Failed&limit=1")
+        assert names(body["runs"]) == ["workflow-powers-3"]
+        assert body["total"] == 2
+        assert body["more"]
+        _, body = self.get_json("runs?status=Failed&offset=1&limit=1")
+        assert names(body["runs"]) == ["workflow-powers-1"]
+        assert not body["more"]
+
+    def test_since_with_changes_and_removals(self):
+        r = self.use_runs([run_desc(1), run_desc(0)], capacity=2)
+        _, first = self.get_json("runs")
+        r.runs.add(run_desc(2))
+        _, delta = self.get_json("runs?since={}".format(first["version"]))
+        assert names(delta["runs"]) == ["workflow-powers-2"]
+        assert delta["removed"] == ["workflow-powers-0"]
+        assert "reset" not in delta
+
+        _, unchanged = self.get_json("runs?since={}".format(delta["version"]))
+        assert unchanged["runs"] == []
+        assert unchanged["removed"] == []
+
+    def test_since_the_store_cannot_answer_resets(self):
+        r = self.use_runs([run_desc(1), run_desc(0)])
+        # from before a restart of the server, when the versions were higher
+        _, body = self.get_json("runs?since=1000")
+        assert body["reset"]
+        assert names(body["runs"]) == ["workflow-powers-1", "workflow-powers-0"]
+        assert body["limit"] == handlers.RunsHandler.DEFAULT_LIMIT
+
+        r.runs.clear()
+        _, body = self.get_json("runs?since=0")
+        assert body["reset"]
+        assert body["runs"] == []
+
+    def test_bad_arguments(self):
+        self.use_runs([])
+        for query in ["limit=-1", "offset=x", "since=1.5"]:
+            response = self.fetch(PREFIX + "runs?" + query)
+            assert response.code == 400
@@ -0,0 +1,232 @@
+import functools
+import hashlib
+import json
+import sys
+from unittest import mock
+
+import pytest
+from botocore.stub import ANY, Stubber
+from tornado.testing import gen_test
+
+from handler_case import PREFIX, HandlerTestCase
+from sagemaker_run_notebook import retry
+from sagemaker_run_notebook.server_extension import handlers
+
+run_notebook = sys.modules["sagemaker_run_notebook.run_notebook"]
+
+DATA = b"0123456789"
+DIGEST = hashlib.sha256(DATA).hexdigest()
+FINAL_KEY = "papermill_input/sha256/{}.ipynb".format(DIGEST)
+
+
+@pytest.fixture
+def s3(session, monkeypatch):
+    client = retry.client(session, "s3")
+    monkeypatch.setattr(retry, "client", lambda session, name: client)
+    monkeypatch.setattr(run_notebook, "default_bucket", lambda session: "bucket")
+    monkeypatch.setattr(run_notebook, "_upload_index", None)
+    with Stubber(client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def expect_parts(stubber, key, parts, first=1):
+    """Expect `parts` parts to be uploaded to `key`, starting a multipart upload for the first"""
+    if first == 1:
+        stubber.add_response(
+            "create_multipart_upload",
+            {"UploadId": "upload-1"},
+            {"Bucket": "bucket", "Key": key},
+        )
+    for n in range(first, first + parts):
+        stubber.add_response(
+            "upload_part",
+            {"ETag": '"etag-{}"'.format(n)},
+            {
+                "Bucket": "bucket",
+                "Key": key,
+                "UploadId": "upload-1",
+                "PartNumber": n,
+                "Body": ANY,
+            },
+        )
+
+
+def expect_complete(stubber, key, parts):
+    stubber.add_response(
+        "complete_multipart_upload",
+        {},
+        {
+            "Bucket": "bucket",
+            "Key": key,
+            "UploadId": "upload-1",
+            "MultipartUpload": {
+                "Parts": [
+                    {"PartNumber": n, "ETag": '"etag-{}"'.format(n)}
+                    for n in range(1, parts + 1)
+                ]
+            },
+        },
+    )
+
+
+def feed(upload, data, chunk_size):
+    for i in range(0, len(data), chunk_size):
+        part = upload.update(data[i : i + chunk_size])
+        if part is not None:
+            upload.upload_part(part)
+
+
+def not_found(stubber, key):
+    stubber.add_client_error(
+        "head_object",
+        service_error_code="404",
+        http_status_code=404,
+        expected_params={"Bucket": "bucket", "Key": key},
+    )
+
+
+def answered(stubber):
+    """Whether all the responses added to `stubber` have been used"""
+    try:
+        stubber.assert_no_pending_responses()
+    except AssertionError:
+        return False
+    return True
+
+
+def test_small_uploads_are_a_single_put(session, s3):
+    upload = run_notebook.StreamingUpload("powers.ipynb", session=session)
+    s3.add_response(
+        "put_object",
+        {},
+        {"Bucket": "bucket", "Key": "papermill_input/powers.ipynb", "Body": DATA},
+    )
+    feed(upload, DATA, 3)
+    assert upload.complete() == "s3://bucket/papermill_input/powers.ipynb"
+
+
+def test_named_multipart_upload(session, s3):
+    upload = run_notebook.StreamingUpload("powers.ipynb", session=session, part_size=4)
+    expect_parts(s3, "papermill_input/powers.ipynb", 3)
+    expect_complete(s3, "papermill_input/powers.ipynb", 3)
+    feed(upload, DATA, 2)
+    assert upload.complete() == "s3://bucket/papermill_input/powers.ipynb"
+    assert upload.size == len(DATA)
+
+
+def test_new_content_is_copied_to_its_digest(session, s3):
+    upload = run_notebook.StreamingUpload(session=session, part_size=4)
+    expect_parts(s3, upload.key, 2)
+    not_found(s3, FINAL_KEY)
+    expect_parts(s3, upload.key, 1, first=3)
+    expect_complete(s3, upload.key, 3)
+    s3.add_response(
+        "copy_object",
+        {},
+        {
+            "Bucket": "bucket",
+            "Key": FINAL_KEY,
+            "CopySource": {"Bucket": "bucket", "Key": upload.key},
+        },
+    )
+    s3.add_response("delete_object", {}, {"Bucket": "bucket", "Key": upload.key})
+    feed(upload, DATA, 4)
+    assert upload.complete() == "s3://bucket/" + FINAL_KEY
+    assert (
+        run_notebook.upload_index().get("bucket", DIGEST) == "s3://bucket/" + FINAL_KEY
+    )
+
+
+def test_content_already_uploaded_aborts(session, s3):
+    upload = run_notebook.StreamingUpload(session=session, part_size=4)
+    expect_parts(s3, upload.key, 2)
+    s3.add_response(
+        "head_object", {"ContentLength": 10}, {"Bucket": "bucket", "Key": FINAL_KEY}
+    )
+    s3.add_response(
+        "abort_multipart_upload",
+        {},
+        {"Bucket": "bucket", "Key": upload.key, "UploadId": "upload-1"},
+    )
+    feed(upload, DATA, 4)
+    assert upload.complete() == "s3://bucket/" + FINAL_KEY
+
+
+class UploadHandlerTest(HandlerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.s3 = retry.client(self.session, "s3")
+        for patch in [
+            mock.patch.object(retry, "client", lambda session, name: self.s3),
+            mock.patch.object(run_notebook, "default_bucket", lambda session: "bucket"),
+            mock.patch.object(run_notebook, "_upload_index", None),
+            mock.patch.object(
+                handlers.run,
+                "StreamingUpload",
+                functools.partial(run_notebook.StreamingUpload, part_size=4),
+            ),
+            mock.patch.object(handlers.UploadHandler, "max_upload_size", 6),
+        ]:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.stubber = Stubber(self.s3)
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+
+    def test_upload(self):
+        key = "papermill_input/sha256/{}.ipynb".format(
+            hashlib.sha256(b"012").hexdigest()
+        )
+        not_found(self.stubber, key)
+        self.stubber.add_response(
+            "put_object", {}, {"Bucket": "bucket", "Key": key, "Body": b"012"}
+        )
+        response = self.fetch(PREFIX + "upload", method="PUT", body=b"012")
+        assert response.code == 200
+        assert json.loads(response.body) == {"s3Object": "s3://bucket/" + key}
+        self.stubber.assert_no_pending_responses()
+
+    def test_too_large_is_refused_up_front(self):
+        response = self.fetch(PREFIX + "upload", method="PUT", body=DATA)
+        assert response.code == 413
+        self.stubber.assert_no_pending_responses()
+
+    @gen_test
+    async def test_too_large_streamed_aborts_the_upload(self):
+        self.stubber.add_response("create_multipart_upload", {"UploadId": "upload-1"})
+        self.stubber.add_response("upload_part", {"ETag": '"etag-1"'})
+        self.stubber.add_response(
+            "abort_multipart_upload",
+            {},
+            {"Bucket": "bucket", "Key": ANY, "UploadId": "upload-1"},
+        )
+
+        async def body_producer(write):
+            await write(DATA[:5])
+            await write(DATA[5:])
+
+        response = await self.http_client.fetch(
+            self.get_url(PREFIX + "upload"),
+            method="PUT",
+            body_producer=body_producer,
+            raise_error=False,
+        )
+        # tornado cuts the chunked body off at the limit
+        assert response.code == 400
+        await self.wait_until(lambda: answered(self.stubber))
+
+    def test_a_failed_part_aborts_the_upload(self):
+        self.stubber.add_response("create_multipart_upload", {"UploadId": "upload-1"})
+        self.stubber.add_client_error(
+            "upload_part", service_error_code="InternalError", http_status_code=500
+        )
+        self.stubber.add_response(
+            "abort_multipart_upload",
+            {},
+            {"Bucket": "bucket", "Key": ANY, "UploadId": "upload-1"},
+        )
+        response = self.fetch(PREFIX + "upload", method="PUT", body=DATA[:5])
+        assert response.code == 400
+        assert json.loads(response.body)["error"]["type"] == "ClientError"
+        self.stubber.assert_no_pending_responses()
@@ -0,0 +1,191 @@
+import threading
+import time
+
+import boto3
+import botocore
+import pytest
+from botocore.stub import Stubber
+
+import sagemaker_run_notebook.submit_queue as sq
+from sagemaker_run_notebook import retry
+
+
+def throttled():
+    return botocore.exceptions.ClientError(
+        {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+        "CreateProcessingJob",
+    )
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def session():
+    return boto3.Session(
+        region_name="us-east-1", aws_access_key_id="a", aws_secret_access_key="b"
+    )
+
+
+@pytest.fixture
+def prepared(monkeypatch):
+    """Replace prepare_invoke so enqueue doesn't upload anything"""
+    monkeypatch.setattr(
+        sq, "prepare_invoke", lambda session=None, **kwargs: {"parameters": kwargs}
+    )
+
+
+def make_queue(session, submit, **kwargs):
+    kwargs.setdefault("rate", 1000)
+    kwargs.setdefault("burst", 1000)
+    return sq.SubmissionQueue(submit=submit, session=session, **kwargs)
+
+
+def test_token_bucket_limits_the_rate():
+    clock = FakeClock()
+    bucket = sq.TokenBucket(rate=2, burst=2, clock=clock)
+    assert bucket.try_take() == 0
+    assert bucket.try_take() == 0
+    assert bucket.try_take() == pytest.approx(0.5)
+
+    clock.now = 0.5
+    assert bucket.try_take() == 0
+    assert bucket.try_take() > 0
+
+    clock.now = 10  # the bucket only fills up to the burst size
+    assert bucket.try_take() == 0
+    assert bucket.try_take() == 0
+    assert bucket.try_take() > 0
+
+
+def test_token_bucket_put_back():
+    clock = FakeClock()
+    bucket = sq.TokenBucket(rate=1, burst=1, clock=clock)
+    assert bucket.try_take() == 0
+    bucket.put_back()
+    assert bucket.try_take() == 0
+    bucket.put_back()
+    bucket.put_back()
+    assert bucket.tokens == 1
+
+
+def test_store_takes_in_order_and_rejects_duplicates():
+    store = sq.SqliteJobQueue()
+    store.put("job-1", {"n": 1})
+    store.put("job-2", {"n": 2})
+    with pytest.raises(ValueError):
+        store.put("job-1", {"n": 3})
+
+    assert store.take()["job_name"] == "job-1"
+    assert store.take()["job_name"] == "job-2"
+    assert store.take() is None
+    assert store.counts() == {sq.SUBMITTING: 2}
+
+
+def test_store_waits_for_not_before():
+    store = sq.SqliteJobQueue()
+    store.put("job-1", {})
+    item = store.take()
+    store.update("job-1", sq.QUEUED, not_before=time.time() + 60)
+    assert store.take() is None
+    assert store.take(now=time.time() + 61)["attempts"] == item["attempts"] + 1
+
+
+def test_enqueue_and_drain(session, prepared):
+    started = []
+    queue = make_queue(session, lambda args: started.append(args["parameters"]))
+    for n in range(3):
+        queue.enqueue(notebook="a.ipynb", job_id=f"job-{n}")
+    assert queue.status("job-0")["State"] == sq.QUEUED
+
+    queue.drain(timeout=5)
+    assert [p["job_id"] for p in started] == ["job-0", "job-1", "job-2"]
+    assert queue.store.counts() == {sq.SUBMITTED: 3}
+
+
+def test_drain_respects_the_rate(session, prepared):
+    started = []
+    queue = make_queue(session, started.append, rate=1, burst=1)
+    queue.enqueue(job_id="job-0")
+    queue.enqueue(job_id="job-1")
+    assert queue.drain_once() == 0
+    assert queue.drain_once() > 0
+    assert len(started) == 1
+
+
+def test_throttled_runs_are_retried_later(session, prepared):
+    calls = []
+
+    def submit(args):
+        calls.append(args)
+        raise throttled()
+
+    queue = make_queue(session, submit, max_attempts=2)
+    queue.enqueue(job_id="job-0")
+    queue.drain(timeout=5)
+    status = queue.status("job-0")
+    assert status["State"] == sq.QUEUED
+    assert "ThrottlingException" in status["Error"]
+    assert len(calls) == 1
+
+    queue.store.update("job-0", sq.QUEUED)  # ready again now
+    queue.drain(timeout=5)
+    assert queue.status("job-0")["State"] == sq.FAILED
+    assert len(calls) == 2
+
+
+def test_other_errors_fail_the_run(session, prepared):
+    def submit(args):
+        raise ValueError("bad notebook")
+
+    queue = make_queue(session, submit)
+    queue.enqueue(job_id="job-0")
+    queue.drain(timeout=5)
+    assert queue.status("job-0")["State"] == sq.FAILED
+    assert queue.status("job-0")["Error"] == "bad notebook"
+
+
+def test_drainer_survives_unexpected_errors(session, prepared):
+    started = threading.Event()
+    queue = make_queue(session, lambda args: started.set(), in_flight_interval=0.01)
+    take = queue.store.take
+    failures = []
+
+    def flaky_take(now=None):
+        if not failures:
+            failures.append(1)
+            raise RuntimeError("database is locked")
+        return take(now)
+
+    queue.store.take = flaky_take
+    queue.enqueue(job_id="job-0")
+    queue.start()
+    try:
+        assert started.wait(5)
+    finally:
+        queue.stop(5)
+    assert failures
+    assert queue.status("job-0")["State"] == sq.SUBMITTED
+
+
+def test_queue_submissions_are_not_retried_inside(session, prepared, monkeypatch):
+    client = retry.client(session, "lambda")
+    monkeypatch.setattr(retry, "client", lambda session, name: client)
+    queue = sq.SubmissionQueue(session=session, rate=1000, burst=1000)
+    with Stubber(client) as stubber:
+        stubber.add_client_error(
+            "invoke",
+            service_error_code="TooManyRequestsException",
+            http_status_code=429,
+        )
+        queue.enqueue(job_id="job-0")
+        queue.drain(timeout=5)
+        stubber.assert_no_pending_responses()
+    status = queue.status("job-0")
+    assert status["State"] == sq.QUEUED
+    assert "TooManyRequestsException" in status["Error"]
@@ -0,0 +1,102 @@
+import hashlib
+import io
+import sys
+
+import pytest
+from botocore.stub import Stubber
+
+from sagemaker_run_notebook import retry
+
+run_notebook = sys.modules["sagemaker_run_notebook.run_notebook"]
+
+NOTEBOOK = b'{"cells": [], "metadata": {}, "nbformat": 4, "nbformat_minor": 4}'
+DIGEST = hashlib.sha256(NOTEBOOK).hexdigest()
+KEY = "papermill_input/sha256/{}.ipynb".format(DIGEST)
+HEAD = {"ContentLength": len(NOTEBOOK), "ETag": '"etag"'}
+
+
+class FakeS3:
+    """Records the uploads made through the transfer manager"""
+
+    def __init__(self):
+        self.uploads = []
+
+    def upload_fileobj(self, fobj, bucket, key):
+        self.uploads.append((bucket, key, fobj.read()))
+
+
+@pytest.fixture
+def s3(session, monkeypatch):
+    """A FakeS3 for the uploads and a stubbed client for the HEAD requests"""
+    fake = FakeS3()
+    head = retry.client(session, "s3")
+    monkeypatch.setattr(session, "client", lambda name, **kwargs: fake)
+    monkeypatch.setattr(retry, "client", lambda session, name: head)
+    monkeypatch.setattr(run_notebook, "default_bucket", lambda session: "bucket")
+    monkeypatch.setattr(run_notebook, "_upload_index", None)
+    with Stubber(head) as stubber:
+        yield fake, stubber
+        stubber.assert_no_pending_responses()
+
+
+def not_found(stubber):
+    stubber.add_client_error(
+        "head_object", service_error_code="404", http_status_code=404
+    )
+
+
+def test_uploads_by_digest_once(session, s3):
+    fake, stubber = s3
+    not_found(stubber)
+    s3path = run_notebook.upload_fileobj(io.BytesIO(NOTEBOOK), session=session)
+    assert s3path == "s3://bucket/" + KEY
+    assert fake.uploads == [("bucket", KEY, NOTEBOOK)]
+
+    # the index has it, and a HEAD shows that it's still there
+    stubber.add_response("head_object", HEAD, {"Bucket": "bucket", "Key": KEY})
+    assert run_notebook.upload_fileobj(io.BytesIO(NOTEBOOK), session=session) == s3path
+    assert len(fake.uploads) == 1
+
+
+def test_uploads_again_when_the_object_has_gone(session, s3):
+    fake, stubber = s3
+    run_notebook.upload_index().add("bucket", DIGEST, "s3://bucket/" + KEY)
+    not_found(stubber)
+    not_found(stubber)
+    run_notebook.upload_fileobj(io.BytesIO(NOTEBOOK), session=session)
+    assert fake.uploads == [("bucket", KEY, NOTEBOOK)]
+    assert run_notebook.upload_index().get("bucket", DIGEST) == "s3://bucket/" + KEY
+
+
+def test_objects_already_in_s3_are_not_uploaded(session, s3):
+    fake, stubber = s3
+    stubber.add_response("head_object", HEAD, {"Bucket": "bucket", "Key": KEY})
+    run_notebook.upload_fileobj(io.BytesIO(NOTEBOOK), session=session)
+    assert fake.uploads == []
+    assert run_notebook.upload_index().get("bucket", DIGEST) == "s3://bucket/" + KEY
+
+
+def test_named_uploads_are_always_made(session, s3):
+    fake, _ = s3
+    s3path = run_notebook.upload_fileobj(
+        io.BytesIO(NOTEBOOK), "powers.ipynb", session=session
+    )
+    assert s3path == "s3://bucket/papermill_input/powers.ipynb"
+    assert fake.uploads == [("bucket", "papermill_input/powers.ipynb", NOTEBOOK)]
+
+
+def test_upload_index_is_saved(tmp_path):
+    path = str(tmp_path / "uploads.json")
+    index = run_notebook.UploadIndex(path)
+    index.add("bucket", DIGEST, "s3://bucket/" + KEY)
+    assert run_notebook.UploadIndex(path).get("bucket", DIGEST) == "s3://bucket/" + KEY
+    assert run_notebook.UploadIndex(path).get("other-bucket", DIGEST) is None
+    index.remove("bucket", DIGEST)
+    assert run_notebook.UploadIndex(path).get("bucket", DIGEST) is None
+
+
+def test_file_digest_leaves_the_position():
+    f = io.BytesIO(b"skip" + NOTEBOOK)
+    f.seek(4)
+    assert run_notebook.file_digest(f) == DIGEST
+    assert f.tell() == 4
@@ -0,0 +1,100 @@
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from sagemaker_run_notebook import retry, utils
+
+ACCOUNT = "123456789012"
+
+
+def identity(arn):
+    return {"UserId": "AIDEXAMPLE", "Account": ACCOUNT, "Arn": arn}
+
+
+@pytest.fixture
+def aws(session, monkeypatch):
+    """Stubbers for the STS and IAM clients that retry.client hands out"""
+    utils.clear_identity_cache()
+    clients = {name: retry.client(session, name) for name in ["sts", "iam"]}
+    monkeypatch.setattr(retry, "client", lambda session, name, **kwargs: clients[name])
+    with Stubber(clients["sts"]) as sts, Stubber(clients["iam"]) as iam:
+        yield sts, iam
+        sts.assert_no_pending_responses()
+        iam.assert_no_pending_responses()
+    utils.clear_identity_cache()
+
+
+def test_caller_identity_is_cached(session, aws):
+    sts, _ = aws
+    sts.add_response(
+        "get_caller_identity", identity(f"arn:aws:iam::{ACCOUNT}:user/alice")
+    )
+    assert utils.get_account(session) == ACCOUNT
+    assert utils.get_caller_identity(session)["Arn"].endswith(":user/alice")
+    assert utils.resolve_image("runner", session) == (
+        f"{ACCOUNT}.dkr.ecr.us-east-1.amazonaws.com/runner:latest"
+    )
+    assert utils.resolve_role("BasicRole", session) == (
+        f"arn:aws:iam::{ACCOUNT}:role/BasicRole"
+    )
+
+
+def test_caller_identity_is_cached_per_credentials_and_region(session, aws):
+    sts, _ = aws
+    for _ in range(3):
+        sts.add_response(
+            "get_caller_identity", identity(f"arn:aws:iam::{ACCOUNT}:user/alice")
+        )
+    utils.get_caller_identity(session)
+    other_region = boto3.Session(
+        region_name="us-west-2", aws_access_key_id="a", aws_secret_access_key="b"
+    )
+    utils.get_caller_identity(other_region)
+    other_key = boto3.Session(
+        region_name="us-east-1", aws_access_key_id="c", aws_secret_access_key="d"
+    )
+    utils.get_caller_identity(other_key)
+    utils.get_caller_identity(session)
+
+
+def test_caller_identity_expires(session, aws):
+    sts, _ = aws
+    for _ in range(2):
+        sts.add_response(
+            "get_caller_identity", identity(f"arn:aws:iam::{ACCOUNT}:user/alice")
+        )
+    utils.get_caller_identity(session, ttl=0)
+    utils.get_caller_identity(session, ttl=0)
+
+
+def test_execution_role_is_looked_up_once(session, aws):
+    sts, iam = aws
+    sts.add_response(
+        "get_caller_identity",
+        identity(f"arn:aws:sts::{ACCOUNT}:assumed-role/NotebookRole/session"),
+    )
+    role_arn = f"arn:aws:iam::{ACCOUNT}:role/notebooks/NotebookRole"
+    iam.add_response(
+        "get_role",
+        {
+            "Role": {
+                "Path": "/notebooks/",
+                "RoleName": "NotebookRole",
+                "RoleId": "AROAEXAMPLEEXAMPLEEX",
+                "Arn": role_arn,
+                "CreateDate": "2021-03-01T12:00:00Z",
+            }
+        },
+        {"RoleName": "NotebookRole"},
+    )
+    assert utils.get_execution_role(session) == role_arn
+    assert utils.get_execution_role(session) == role_arn
+
+
+def test_users_have_no_execution_role(session, aws):
+    sts, _ = aws
+    sts.add_response(
+        "get_caller_identity", identity(f"arn:aws:iam::{ACCOUNT}:user/alice")
+    )
+    with pytest.raises(ValueError, match="IAM user 'alice'"):
+        utils.get_execution_role(session)
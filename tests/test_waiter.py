@@ -0,0 +1,184 @@
+import asyncio
+import datetime
+
+import pytest
+from botocore.stub import Stubber
+from dateutil.tz import tzlocal
+
+from sagemaker_run_notebook import retry, waiter
+
+START = datetime.datetime(2021, 3, 1, 12, 0, tzinfo=tzlocal())
+ARN = "arn:aws:sagemaker:us-east-1:123456789012:processing-job/"
+
+
+def summary(job_name, status):
+    item = {
+        "ProcessingJobName": job_name,
+        "ProcessingJobArn": ARN + job_name,
+        "ProcessingJobStatus": status,
+        "CreationTime": START,
+    }
+    if status == "Failed":
+        item["FailureReason"] = "The notebook raised an exception"
+    return item
+
+
+def description(job_name, status):
+    return dict(
+        summary(job_name, status),
+        ProcessingResources={
+            "ClusterConfig": {
+                "InstanceCount": 1,
+                "InstanceType": "ml.m5.large",
+                "VolumeSizeInGB": 30,
+            }
+        },
+        AppSpecification={"ImageUri": "notebook-runner"},
+    )
+
+
+@pytest.fixture
+def sagemaker(session, monkeypatch):
+    """A stubbed SageMaker client that retry.client hands out"""
+    client = retry.client(session, "sagemaker")
+    monkeypatch.setattr(retry, "client", lambda session, name: client)
+    with Stubber(client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def describes(stubber, job_name, status=None):
+    if status is None:
+        stubber.add_client_error(
+            "describe_processing_job",
+            service_error_code="ValidationException",
+            expected_params={"ProcessingJobName": job_name},
+        )
+    else:
+        stubber.add_response(
+            "describe_processing_job",
+            description(job_name, status),
+            {"ProcessingJobName": job_name},
+        )
+
+
+def lists(stubber, summaries, **params):
+    stubber.add_response(
+        "list_processing_jobs",
+        {"ProcessingJobSummaries": summaries},
+        dict(MaxResults=100, **params),
+    )
+
+
+def test_common_prefix():
+    assert waiter.common_prefix(["workflow-a-1", "workflow-a-2"]) == "workflow-a-"
+    assert waiter.common_prefix([]) == ""
+
+
+def test_describes_first_then_lists_from_the_oldest_job(session, sagemaker):
+    jobs = waiter.JobWaiter(
+        ["workflow-a", "workflow-b"], interval=0, max_workers=1, session=session
+    )
+    try:
+        # "workflow-" would match every run, so the first poll describes the jobs
+        describes(sagemaker, "workflow-a", "InProgress")
+        describes(sagemaker, "workflow-b", "InProgress")
+        # and later polls list the runs created since the oldest of them
+        lists(
+            sagemaker,
+            [summary("workflow-a", "Completed"), summary("workflow-b", "Failed")],
+            NameContains="workflow-",
+            CreationTimeAfter=START - datetime.timedelta(seconds=1),
+        )
+        assert jobs.poll() == []
+        finished = sorted(jobs.poll())
+    finally:
+        jobs.close()
+    assert finished == [
+        ("workflow-a", "Completed", None),
+        ("workflow-b", "Failed", "The notebook raised an exception"),
+    ]
+    assert not jobs.pending
+
+
+def test_lists_by_a_specific_prefix(session, sagemaker):
+    names = ["workflow-powers-1", "workflow-powers-2"]
+    jobs = waiter.JobWaiter(names, interval=0, session=session)
+    try:
+        lists(
+            sagemaker,
+            [summary(name, "Completed") for name in names],
+            NameContains="workflow-powers-",
+        )
+        assert len(jobs.poll()) == 2
+    finally:
+        jobs.close()
+
+
+def test_bounds_listings_before_every_job_is_found(session, sagemaker):
+    jobs = waiter.JobWaiter(
+        ["workflow-a", "workflow-b"], interval=0, max_workers=1, session=session
+    )
+    try:
+        describes(sagemaker, "workflow-a", "InProgress")
+        describes(sagemaker, "workflow-b")  # not created yet
+        lists(
+            sagemaker,
+            [summary("workflow-a", "InProgress"), summary("workflow-b", "Completed")],
+            NameContains="workflow-",
+            CreationTimeAfter=START - datetime.timedelta(seconds=1),
+        )
+        assert jobs.poll() == []
+        assert jobs.poll() == [("workflow-b", "Completed", None)]
+    finally:
+        jobs.close()
+
+
+def test_reports_jobs_that_are_never_created(session, sagemaker):
+    jobs = waiter.JobWaiter(
+        ["workflow-typo"], interval=0, not_found_timeout=0, session=session
+    )
+    try:
+        lists(sagemaker, [], NameContains="workflow-typo")
+        describes(sagemaker, "workflow-typo")
+        ((name, status, reason),) = jobs.poll()
+    finally:
+        jobs.close()
+    assert (name, status) == ("workflow-typo", waiter.NOT_FOUND)
+    assert "never created" in reason
+    assert not jobs.pending
+
+
+def test_as_completed_finishes_with_missing_jobs(session, sagemaker):
+    lists(
+        sagemaker,
+        [summary("workflow-powers-1", "Completed")],
+        NameContains="workflow-powers-",
+    )
+    describes(sagemaker, "workflow-powers-2")
+    results = waiter.wait_for_all(
+        ["workflow-powers-1", "workflow-powers-2"],
+        interval=0,
+        not_found_timeout=0,
+        session=session,
+    )
+    assert [r["Status"] for r in results] == ["Completed", waiter.NOT_FOUND]
+
+
+def test_as_completed_async_times_out(session, sagemaker):
+    lists(
+        sagemaker,
+        [summary("workflow-powers-1", "InProgress")],
+        NameContains="workflow-powers-1",
+    )
+
+    async def wait():
+        return [
+            r
+            async for r in waiter.as_completed_async(
+                ["workflow-powers-1"], interval=60, timeout=0.1, session=session
+            )
+        ]
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(wait())